@@ -0,0 +1,342 @@
+import asyncio
+import base64
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import aiohttp
+from dotenv import load_dotenv
+
+from cdr_handler import CDRHandler
+from excel_reader import Invoice
+from submission_ledger import SubmissionLedger
+from run_journal import RunJournal
+from sunat_api import SunatDocumentBuilder
+from token_manager import TokenManager, TokenError
+from validation_cache import ValidationCache
+from zip_archiver import ZipArchiver
+
+
+class AsyncSunatAPI(SunatDocumentBuilder):
+    """
+    Cliente asyncio del API de SUNAT.
+
+    Ofrece las mismas operaciones que SunatAPI (token, create_invoice,
+    validar_comprobante, consultar_ticket, test_connection) y comparte con él
+    la generación de XML/ZIP; solo cambia el transporte. Las peticiones en
+    vuelo se limitan con un semáforo y el token se guarda en la misma caché
+    que el cliente síncrono.
+    """
+
+    def __init__(self, ruc: str = None, client_id: str = None, client_secret: str = None,
+                 max_in_flight: int = 1000, max_connections: int = 100,
+                 token_manager: Optional[TokenManager] = None,
+                 cdr_handler: Optional[CDRHandler] = None,
+                 archive_dir: Optional[str] = None,
+                 validation_cache: Optional[ValidationCache] = None,
+                 ledger: Optional[SubmissionLedger] = None):
+        """
+        Inicializa el cliente asíncrono
+
+        Args:
+            max_in_flight: Operaciones simultáneas permitidas (semáforo)
+            max_connections: Conexiones TCP máximas del pool de aiohttp
+            token_manager: Caché de token compartida. Por defecto se usa la
+                caché en disco asociada al client_id.
+            cdr_handler: Si se indica, los CDR recibidos se procesan con él
+            archive_dir: Directorio donde guardar en segundo plano los ZIP
+                enviados. Por defecto no se guardan.
+            validation_cache: Caché de resultados de validarcomprobante
+            ledger: Registro de envíos; create_invoices omite los
+                comprobantes ya aceptados cuyo contenido no cambió
+        """
+        load_dotenv()
+        self.ruc = ruc or os.getenv("SUNAT_RUC")
+        self.client_id = client_id or os.getenv("SUNAT_CLIENT_ID")
+        self.client_secret = client_secret or os.getenv("SUNAT_CLIENT_SECRET")
+        self.logger = logging.getLogger('async_sunat_api')
+        self.max_in_flight = max_in_flight
+        self.max_connections = max_connections
+        self.token_manager = token_manager or TokenManager(None, self.client_id, background_refresh=False)
+        self.cdr_handler = cdr_handler
+        self.archiver = ZipArchiver(archive_dir) if archive_dir else None
+        self.validation_cache = validation_cache
+        self.ledger = ledger
+
+        # URLs del API
+        self.token_url = "https://api-seguridad.sunat.gob.pe/v1/clientesextranet/{}/oauth2/token/"
+        self.base_url = "https://api.sunat.gob.pe/v1/contribuyente/contribuyentes"
+
+        # Se crean dentro del event loop en el primer uso
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._token_lock: Optional[asyncio.Lock] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+        self.logger.info(f"AsyncSunatAPI inicializado para RUC: {self.ruc}")
+
+    async def __aenter__(self) -> "AsyncSunatAPI":
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.close()
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_connections, keepalive_timeout=30)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=60)
+            )
+            self._semaphore = asyncio.Semaphore(self.max_in_flight)
+            self._token_lock = asyncio.Lock()
+        return self._session
+
+    async def close(self) -> None:
+        """Cierra la sesión HTTP y el registro de envíos, cancela la renovación del
+        token, termina el archivo de ZIP y guarda la caché de validación"""
+        if self.archiver:
+            await asyncio.to_thread(self.archiver.close)
+        if self.validation_cache:
+            await asyncio.to_thread(self.validation_cache.save)
+        if self.ledger:
+            await asyncio.to_thread(self.ledger.close)
+        if self._refresh_task:
+            self._refresh_task.cancel()
+            self._refresh_task = None
+        if self._session and not self._session.closed:
+            await self._session.close()
+
+    @property
+    def token(self) -> Optional[str]:
+        """Token vigente en caché (None si no hay o expiró)"""
+        return self.token_manager.token
+
+    async def get_token(self, force: bool = False) -> bool:
+        """
+        Obtener token de autenticación
+
+        Reutiliza el token en caché mientras siga vigente; force=True
+        solicita uno nuevo.
+        """
+        try:
+            await self._ensure_token(reject=self.token_manager.token if force else None, force=force)
+            return True
+        except Exception as e:
+            self.logger.error(f"Error en autenticación: {str(e)}")
+            return False
+
+    async def _ensure_token(self, reject: Optional[str] = None, force: bool = False) -> str:
+        """
+        Devuelve un token vigente; una sola renovación a la vez (single-flight)
+
+        Args:
+            reject: Token rechazado (401 o renovación forzada). Si otra tarea
+                ya lo reemplazó se usa el nuevo sin pedir otro.
+        """
+        token = self.token_manager.token
+        if token and token != reject and not force:
+            return token
+
+        await self._get_session()
+        async with self._token_lock:
+            token = self.token_manager.token
+            if token and token != reject:
+                return token
+
+            token = await asyncio.to_thread(self.token_manager.load_cached, reject)
+            if not token:
+                token = await asyncio.to_thread(self.token_manager.update, await self._request_token())
+
+            self._schedule_refresh()
+            return token
+
+    async def _request_token(self) -> Dict[str, Any]:
+        """Solicita un token nuevo al endpoint de api-seguridad"""
+        url, data, headers = self._token_request()
+        session = await self._get_session()
+
+        self.logger.debug(f"Solicitando token a: {url}")
+        async with session.post(url, data=data, headers=headers) as response:
+            body = await response.read()
+            if response.status != 200:
+                raise TokenError(f"Error obteniendo token: {body.decode(errors='replace')}")
+
+        self.logger.info("Token obtenido exitosamente")
+        return json.loads(body)
+
+    def _schedule_refresh(self) -> None:
+        """Programa la renovación anticipada del token en el event loop"""
+        if self._refresh_task and not self._refresh_task.done():
+            self._refresh_task.cancel()
+        self._refresh_task = asyncio.get_running_loop().create_task(self._background_refresh())
+
+    async def _background_refresh(self) -> None:
+        await asyncio.sleep(max(self.token_manager.refresh_at - time.time(), 0))
+        # La tarea se desvincula para que _ensure_token no se cancele a sí misma
+        self._refresh_task = None
+        try:
+            await self._ensure_token(reject=self.token_manager.token, force=True)
+            self.logger.debug("Token renovado en segundo plano")
+        except Exception as e:
+            self.logger.error(f"Error renovando token en segundo plano: {str(e)}")
+
+    async def _post_authorized(self, url: str, headers: Dict[str, str], **kwargs) -> Tuple[int, bytes]:
+        """POST con token Bearer; ante un 401 renueva el token y reintenta una vez"""
+        return await self._request_authorized("POST", url, headers, **kwargs)
+
+    async def _request_authorized(self, method: str, url: str, headers: Dict[str, str],
+                                  **kwargs) -> Tuple[int, bytes]:
+        session = await self._get_session()
+        token = await self._ensure_token()
+
+        for attempt in range(2):
+            async with session.request(method, url, headers=dict(headers, Authorization=f"Bearer {token}"),
+                                       **kwargs) as response:
+                body = await response.read()
+                if response.status != 401 or attempt:
+                    return response.status, body
+
+            self.logger.warning("Token rechazado por SUNAT (401), renovando...")
+            await asyncio.to_thread(self.token_manager.invalidate, token)
+            token = await self._ensure_token(reject=token)
+
+    async def create_invoice(self, invoice: Invoice) -> Dict[str, Any]:
+        """Crea y envía una factura a SUNAT"""
+        await self._get_session()
+        async with self._semaphore:
+            try:
+                # La generación de XML/ZIP es CPU; se saca del event loop
+                filename, xml_content, body = await asyncio.to_thread(self._build_invoice_package, invoice)
+                self._journal_mark(filename, RunJournal.SENDING, **self._sending_info(invoice))
+
+                status, response_body = await self._post_authorized(
+                    f"{self.base_url}{self.ENVIO_PATH}",
+                    headers={"Content-Type": "application/zip"},
+                    data=body
+                )
+
+                result = self._invoice_result(filename, xml_content, status,
+                                              lambda: json.loads(response_body),
+                                              response_body.decode(errors='replace'))
+                self._journal_sent(filename, result)
+                if self.ledger:
+                    await asyncio.to_thread(self._record_submission, filename,
+                                            self._document_fingerprint(invoice), result)
+            except Exception as e:
+                self.logger.error(f"Error en create_invoice: {str(e)}")
+                return {
+                    "success": False,
+                    "error": str(e)
+                }
+
+        cdr_zip = result.get("cdr", {}).get("arcCdr") if result["success"] else None
+        if cdr_zip and self.cdr_handler:
+            result["cdr_status"] = await self.process_cdr(base64.b64decode(cdr_zip), filename)
+        return result
+
+    async def create_invoices(self, invoices: Iterable[Invoice]) -> List[Dict[str, Any]]:
+        """
+        Envía varios comprobantes a la vez (limitados por max_in_flight)
+
+        Con registro de envíos, los ya aceptados sin cambios no se envían y
+        su resultado llega con skipped=True; con diario de ejecución, tampoco
+        los terminados en la ejecución que se reanuda.
+
+        Returns:
+            List con el resultado de cada comprobante en el orden de entrada
+        """
+        invoices = list(invoices)
+        self._loop = asyncio.get_running_loop()
+        presets = await asyncio.to_thread(self._skip_finished, invoices)
+
+        async def send(invoice: Invoice, preset: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+            return preset if preset is not None else await self.create_invoice(invoice)
+
+        return await asyncio.gather(*(send(invoice, preset) for invoice, preset in zip(invoices, presets)))
+
+    def _confirm_in_flight(self, doc_id: str, info: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        # _skip_finished corre en un hilo aparte; las consultas se hacen en el event loop
+        ticket = info.get("ticket")
+        if ticket:
+            check = asyncio.run_coroutine_threadsafe(self.consultar_ticket(ticket), self._loop)
+            return self._in_flight_result(doc_id, check.result(), ticket)
+        query = self._in_flight_query(doc_id, info)
+        if query is None:
+            return self._in_flight_result(doc_id, None)
+        check = asyncio.run_coroutine_threadsafe(self.validar_comprobante(*query, use_cache=False), self._loop)
+        return self._in_flight_result(doc_id, check.result())
+
+    async def consultar_ticket(self, ticket: str) -> Dict[str, Any]:
+        """
+        Consulta el estado de un envío asíncrono (resumen, baja o envío diferido)
+
+        Returns:
+            Dict con success y, si la consulta respondió, status (pending,
+            accepted o rejected), cdr_code y cdr (bytes del ZIP o None)
+        """
+        await self._get_session()
+        async with self._semaphore:
+            try:
+                status, body = await self._request_authorized(
+                    "GET", f"{self.base_url}{self.TICKET_PATH.format(ticket)}", {})
+                return self._ticket_result(ticket, status, lambda: json.loads(body),
+                                           body.decode(errors='replace'))
+            except Exception as e:
+                self.logger.error(f"Error consultando ticket {ticket}: {str(e)}")
+                return {"success": False, "error": str(e)}
+
+    async def process_cdr(self, cdr_content: bytes, invoice_number: str) -> Dict[str, Any]:
+        """Procesa un CDR con CDRHandler sin bloquear el event loop"""
+        handler = self.cdr_handler or CDRHandler()
+        return await asyncio.to_thread(handler.process_cdr, cdr_content, invoice_number)
+
+    async def test_connection(self) -> bool:
+        """Prueba la conexión y las credenciales"""
+        try:
+            self.logger.info("Probando conexión con SUNAT...")
+            if await self.get_token(force=True):
+                self.logger.info("Conexión exitosa - Token obtenido")
+                return True
+            return False
+        except Exception as e:
+            self.logger.error(f"Error probando conexión: {str(e)}")
+            return False
+
+    async def validar_comprobante(self, tipo: str, serie: str, numero: str, fecha: str,
+                                  monto: float, use_cache: bool = True) -> Dict[str, Any]:
+        """Validar un comprobante de pago (consulta primero la caché de validación, salvo use_cache=False)"""
+        cache_key = ValidationCache.make_key(tipo, serie, numero, fecha, monto)
+        cached = self._validation_from_cache(cache_key) if use_cache else None
+        if cached is not None:
+            return cached
+
+        if not self.token and not await self.get_token():
+            return {"success": False, "message": "No se pudo obtener el token"}
+
+        await self._get_session()
+        async with self._semaphore:
+            try:
+                url = f"{self.base_url}/{self.ruc}/validarcomprobante"
+                data = self._validation_payload(tipo, serie, numero, fecha, monto)
+
+                self.logger.debug(f"Validando comprobante: {data}")
+                status, body = await self._post_authorized(url, json=data,
+                                                           headers={"Content-Type": "application/json"})
+
+                if status == 200:
+                    result = self._validation_result(json.loads(body))
+                    await asyncio.to_thread(self._store_validation, cache_key, result)
+                    return result
+                else:
+                    return {
+                        "success": False,
+                        "message": body.decode(errors='replace')
+                    }
+
+            except Exception as e:
+                self.logger.error(f"Error validando comprobante: {str(e)}")
+                return {"success": False, "message": str(e)}
@@ -0,0 +1,239 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from itertools import islice
+from typing import Callable, Dict, Any, Iterable, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class InvoiceResult:
+    """Resultado del envío de un comprobante dentro de un lote"""
+
+    def __init__(self, index: int, invoice: Any, result: Optional[Dict[str, Any]] = None,
+                 cancelled: bool = False, elapsed: float = 0.0, skipped: bool = False):
+        self.index = index
+        self.invoice = invoice
+        self.result = result or {}
+        self.cancelled = cancelled
+        self.elapsed = elapsed
+        self.skipped = skipped
+
+    @property
+    def success(self) -> bool:
+        return not self.cancelled and bool(self.result.get("success"))
+
+    @property
+    def error(self) -> Optional[str]:
+        if self.cancelled:
+            return "Cancelado"
+        if self.success:
+            return None
+        return self.result.get("error") or self.result.get("message")
+
+    @property
+    def cdr(self) -> Optional[Dict[str, Any]]:
+        return self.result.get("cdr")
+
+    @property
+    def xml_hash(self) -> Optional[str]:
+        return self.result.get("xml_hash")
+
+    def __str__(self):
+        number = getattr(self.invoice, "invoice_number", self.index)
+        status = "OMITIDO" if self.skipped else "OK" if self.success else f"ERROR: {self.error}"
+        return f"#{number} {status} ({self.elapsed * 1000:.0f} ms)"
+
+
+class BatchSubmission:
+    """
+    Envío concurrente de un lote de comprobantes con un pool acotado de hilos.
+
+    Los comprobantes se leen del iterable de entrada a medida que hay hilos
+    libres (como máximo 2 por hilo en espera), por lo que acepta generadores.
+    Los resultados pueden recorrerse en el orden original (results) o según
+    van terminando (as_completed). cancel() detiene el lote entre peticiones:
+    los envíos en curso terminan, los ya encolados se marcan como cancelados
+    y no se leen más comprobantes de la entrada.
+
+    Si se indica skip, la entrada se lee en bloques de skip_chunk y skip
+    decide en una sola llamada por bloque qué comprobantes no se envían:
+    devuelve por cada uno None (enviar) o el resultado a usar en su lugar.
+
+    Con retain_results=False el lote no guarda los resultados ya
+    entregados: solo admite as_completed, pero la memoria no crece con el
+    tamaño de la entrada (lectura en streaming de archivos grandes).
+    """
+
+    def __init__(self, send: Callable[[Any], Dict[str, Any]], invoices: Iterable[Any],
+                 workers: int = 4, cancel_event: Optional[threading.Event] = None,
+                 skip: Optional[Callable[[List[Any]], List[Optional[Dict[str, Any]]]]] = None,
+                 skip_chunk: int = 500, retain_results: bool = True):
+        self.workers = max(1, workers)
+        self.cancel_event = cancel_event or threading.Event()
+        self.feed_error: Optional[Exception] = None
+        self._send = send
+        self._skip = skip
+        self._skip_chunk = skip_chunk if skip else 1
+        self._started_at = time.perf_counter()
+        self._finished_at: Optional[float] = None
+
+        self._retain = retain_results
+        self._futures: List[Future] = []
+        self._submitted = 0
+        self._tally = {"finished": 0, "succeeded": 0, "skipped": 0, "failed": 0, "cancelled": 0}
+        self._completed: "queue.Queue[Optional[Future]]" = queue.Queue()
+        self._cond = threading.Condition()
+        self._fed_all = False
+        self._slots = threading.Semaphore(self.workers * 2)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="sunat-batch")
+
+        self._feeder = threading.Thread(target=self._feed, args=(invoices,), daemon=True)
+        self._feeder.start()
+
+        logger.info(f"Lote iniciado con {self.workers} hilos")
+
+    def _feed(self, invoices: Iterable[Any]) -> None:
+        try:
+            source = iter(invoices)
+            index = 0
+            while not self.cancel_event.is_set():
+                chunk = list(islice(source, self._skip_chunk))
+                if not chunk:
+                    break
+                presets = self._skip(chunk) if self._skip else [None] * len(chunk)
+
+                for invoice, preset in zip(chunk, presets):
+                    if preset is not None:
+                        self._add_skipped(index, invoice, preset)
+                    else:
+                        self._slots.acquire()
+                        if self.cancel_event.is_set():
+                            self._slots.release()
+                            break
+
+                        future = self._executor.submit(self._run_one, index, invoice)
+                        self._track(future)
+                        future.add_done_callback(self._on_done)
+                    index += 1
+        except Exception as e:
+            logger.error(f"Error leyendo comprobantes del lote: {str(e)}")
+            self.feed_error = e
+        finally:
+            with self._cond:
+                self._fed_all = True
+                self._cond.notify_all()
+            self._completed.put(None)
+            self._executor.shutdown(wait=False)
+
+    def _add_skipped(self, index: int, invoice: Any, result: Dict[str, Any]) -> None:
+        future: Future = Future()
+        # Un resultado con skipped=False (envío anterior sin confirmar) cuenta como fallo
+        future.set_result(InvoiceResult(index, invoice, result, skipped=result.get("skipped", True)))
+        self._track(future)
+        self._count(future.result())
+        self._completed.put(future)
+
+    def _track(self, future: Future) -> None:
+        with self._cond:
+            self._submitted += 1
+            if self._retain:
+                self._futures.append(future)
+            self._cond.notify_all()
+
+    def _count(self, result: InvoiceResult) -> None:
+        with self._cond:
+            self._tally["finished"] += 1
+            if result.skipped:
+                self._tally["skipped"] += 1
+            elif result.cancelled:
+                self._tally["cancelled"] += 1
+            elif result.success:
+                self._tally["succeeded"] += 1
+            else:
+                self._tally["failed"] += 1
+
+    def _on_done(self, future: Future) -> None:
+        self._count(future.result())
+        self._slots.release()
+        self._completed.put(future)
+
+    def _run_one(self, index: int, invoice: Any) -> InvoiceResult:
+        if self.cancel_event.is_set():
+            return InvoiceResult(index, invoice, cancelled=True)
+
+        start = time.perf_counter()
+        try:
+            result = self._send(invoice)
+        except Exception as e:
+            logger.error(f"Error enviando comprobante {index}: {str(e)}")
+            result = {"success": False, "error": str(e)}
+        return InvoiceResult(index, invoice, result, elapsed=time.perf_counter() - start)
+
+    def cancel(self) -> None:
+        """Solicita la cancelación; los envíos en curso no se interrumpen"""
+        logger.info("Cancelación del lote solicitada")
+        self.cancel_event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self.cancel_event.is_set()
+
+    def results(self) -> Iterator[InvoiceResult]:
+        """Itera los resultados en el orden de los comprobantes de entrada"""
+        if not self._retain:
+            raise RuntimeError("Lote sin resultados guardados (retain_results=False): use as_completed")
+        index = 0
+        while True:
+            with self._cond:
+                while index >= len(self._futures) and not self._fed_all:
+                    self._cond.wait()
+                if index >= len(self._futures):
+                    break
+                future = self._futures[index]
+            yield future.result()
+            index += 1
+        self._mark_finished()
+
+    def as_completed(self) -> Iterator[InvoiceResult]:
+        """
+        Itera los resultados a medida que se completan
+
+        Solo debe haber un consumidor de as_completed por lote.
+        """
+        yielded = 0
+        while True:
+            with self._cond:
+                if self._fed_all and yielded >= self._submitted:
+                    break
+            future = self._completed.get()
+            if future is None:
+                continue
+            yield future.result()
+            yielded += 1
+        self._mark_finished()
+
+    __iter__ = results
+
+    def wait(self) -> List[InvoiceResult]:
+        """Espera el fin del lote y devuelve los resultados en orden"""
+        return list(self.results())
+
+    def done(self) -> bool:
+        with self._cond:
+            return self._fed_all and self._tally["finished"] >= self._submitted
+
+    def summary(self) -> Dict[str, Any]:
+        """Resumen del lote (solo cuenta los comprobantes ya terminados)"""
+        with self._cond:
+            summary = dict(self._tally, total=self._submitted)
+        elapsed = (self._finished_at or time.perf_counter()) - self._started_at
+        summary["elapsed"] = elapsed
+        summary["throughput"] = summary["finished"] / elapsed if elapsed else 0.0
+        return summary
+
+    def _mark_finished(self) -> None:
+        if self._finished_at is None:
+            self._finished_at = time.perf_counter()
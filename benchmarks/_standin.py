@@ -0,0 +1,24 @@
+"""Servidor HTTP local que imita los endpoints de SUNAT para los benchmarks"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sunat_mock import MockConfig, MockSunatServer  # noqa: E402
+
+
+class StandInServer(MockSunatServer):
+    """Token inmediato; envío y validación con una latencia fija y sin CDR"""
+
+    def __init__(self, latency: float = 0.0):
+        super().__init__(MockConfig(
+            latency={"token": 0.0, "envio": latency, "validarcomprobante": latency},
+            generate_cdr=False
+        ))
+        self.latency = latency
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(int(round(pct / 100 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
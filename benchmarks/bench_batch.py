@@ -0,0 +1,76 @@
+"""
+Benchmark de SunatAPI.submit_batch contra un endpoint de envío local.
+
+El servidor responde con una latencia fija por comprobante, de modo que el
+rendimiento ideal crece linealmente con el número de hilos.
+
+Uso:
+    python benchmarks/bench_batch.py [--invoices 400] [--latency 0.05]
+"""
+import argparse
+import os
+import sys
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from excel_reader import compute_line_amounts  # noqa: E402
+from sunat_api import SunatAPI  # noqa: E402
+from sunat_http import SunatHTTPSession  # noqa: E402
+from token_manager import TokenManager  # noqa: E402
+from _standin import StandInServer  # noqa: E402
+
+
+def make_invoice(number: int, lines: int = 5) -> SimpleNamespace:
+    """Comprobante mínimo con los atributos que usa SunatAPI._generate_xml"""
+    products = []
+    for i in range(lines):
+        quantity, unit_value = 10 + i, 1.44 + i
+        line_cents, igv_cents, total_cents = compute_line_amounts(quantity, unit_value)
+        products.append(SimpleNamespace(
+            code=f"P{i}", description=f"PRODUCTO {i}", unit_measure="NIU",
+            quantity=quantity, unit_value=unit_value,
+            line_amount_cents=line_cents, igv_cents=igv_cents, line_total_cents=total_cents
+        ))
+    return SimpleNamespace(
+        invoice_number=number, serie="F001", is_factura=True, currency="USD",
+        emisor_name="EMISOR SAC", customer_ruc="20100070970", customer_name="CLIENTE SAC",
+        products=products,
+        subtotal_cents=sum(p.line_amount_cents for p in products),
+        igv_cents=sum(p.igv_cents for p in products),
+        total_cents=sum(p.line_total_cents for p in products)
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--invoices", type=int, default=400)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    args = parser.parse_args()
+
+    server = StandInServer(latency=args.latency).start()
+    invoices = [make_invoice(n) for n in range(1, args.invoices + 1)]
+
+    print(f"{'hilos':>6}{'facturas/s':>12}{'speedup':>10}{'errores':>9}")
+    baseline = None
+    for workers in args.workers:
+        api = SunatAPI(ruc="20000000001", client_id="bench", client_secret="bench",
+                       session=SunatHTTPSession(pool_maxsize=workers))
+        api.token_manager = TokenManager(api._request_token, api.client_id, cache_dir=None)
+        server.point(api)
+
+        batch = api.submit_batch(invoices, workers=workers)
+        batch.wait()
+        summary = batch.summary()
+        api.close()
+
+        baseline = baseline or summary["throughput"]
+        print(f"{workers:>6}{summary['throughput']:>12.1f}"
+              f"{summary['throughput'] / baseline:>10.2f}{summary['failed']:>9}")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Benchmark de ExcelReader._process_data: corte vectorizado frente a iterrows.
+
+Genera la hoja en memoria (sin pasar por Excel) para medir solo el reparto
+en facturas y la construcción de productos, y compara con el recorrido
+fila a fila anterior. Comprueba además que ambos den los mismos totales.
+
+Uso:
+    python benchmarks/bench_excel_reader.py [--rows 1000 50000 500000]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from excel_reader import ExcelReader, Invoice  # noqa: E402
+
+
+def make_sheet(rows: int, seed: int = 0) -> pd.DataFrame:
+    """Hoja sintética con las columnas que lee ExcelReader"""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'Invoice_Number': np.arange(rows) // 7 + 1,
+        'Customer_RUC': '20100070970',
+        'Customer_Name': [f"CLIENTE {n % 97}" for n in range(rows)],
+        'Port': 'CALLAO',
+        'PO': [f"PO-{n // 13}" for n in range(rows)],
+        'Item': np.arange(rows) % 50 + 1,
+        'Product': [f"PRODUCTO {n % 500}" for n in range(rows)],
+        'Unit': 'NIU',
+        'Quantity': rng.integers(1, 500, rows).astype(float),
+        'Unit_Price': np.round(rng.uniform(0.5, 250.0, rows), 4),
+    })
+
+
+def legacy_process(reader: ExcelReader, df: pd.DataFrame) -> None:
+    """Recorrido fila a fila previo (iterrows y dos to_dict por fila)"""
+    df = reader._compute_amounts(df).fillna('')
+    current_invoice = None
+    item_count = 0
+    for _, row in df.iterrows():
+        if current_invoice is None or item_count >= reader.MAX_PRODUCTS_PER_INVOICE:
+            if current_invoice:
+                reader.invoices[current_invoice.invoice_number] = current_invoice
+            current_invoice = Invoice(len(reader.invoices) + 1, row.to_dict())
+            item_count = 0
+        current_invoice.add_product(row.to_dict())
+        item_count += 1
+    if current_invoice:
+        reader.invoices[current_invoice.invoice_number] = current_invoice
+
+
+def timed(process, df: pd.DataFrame):
+    # Sin agrupar por cliente, para comparar el mismo corte cada 20 filas
+    reader = ExcelReader(pack=False)
+    start = time.perf_counter()
+    process(reader, df)
+    return time.perf_counter() - start, reader
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 50000, 500000])
+    parser.add_argument("--skip-legacy-above", type=int, default=10 ** 7,
+                        help="No medir iterrows por encima de estas filas")
+    args = parser.parse_args()
+
+    print(f"{'filas':>9}{'iterrows s':>12}{'vectorizado s':>15}{'speedup':>10}{'facturas':>10}")
+    for rows in args.rows:
+        df = make_sheet(rows)
+        new_time, new_reader = timed(ExcelReader._process_data, df)
+        assert not new_reader.errors, new_reader.errors
+
+        if rows > args.skip_legacy_above:
+            print(f"{rows:>9}{'-':>12}{new_time:>15.3f}{'-':>10}{len(new_reader.invoices):>10}")
+            continue
+
+        old_time, old_reader = timed(legacy_process, df)
+        assert [(i.subtotal_cents, i.igv_cents, i.total_cents, i.customer_name, len(i.products))
+                for i in old_reader.get_invoices()] == \
+               [(i.subtotal_cents, i.igv_cents, i.total_cents, i.customer_name, len(i.products))
+                for i in new_reader.get_invoices()], "resultados distintos"
+        print(f"{rows:>9}{old_time:>12.3f}{new_time:>15.3f}{old_time / new_time:>9.1f}x"
+              f"{len(new_reader.invoices):>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Benchmark del pool de conexiones de SunatAPI contra un servidor local.
+
+Compara una sesión sin keep-alive (un handshake por petición, equivalente a
+usar requests.post) con la sesión con pool, en serie y con varios hilos
+compartiendo la misma instancia de SunatAPI.
+
+Uso:
+    python benchmarks/bench_http_pool.py [--requests 500] [--workers 8]
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sunat_api import SunatAPI  # noqa: E402
+from sunat_http import SunatHTTPSession  # noqa: E402
+from _standin import StandInServer, percentile  # noqa: E402
+
+
+def _run(server: StandInServer, api: SunatAPI, total: int, workers: int) -> dict:
+    latencies = []
+    lock = threading.Lock()
+
+    def _one(_):
+        start = time.perf_counter()
+        api._request_token()
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+
+    server.connections = 0
+    start = time.perf_counter()
+    if workers == 1:
+        for i in range(total):
+            _one(i)
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(_one, range(total)))
+    wall = time.perf_counter() - start
+
+    return {
+        "handshakes": server.connections,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "req_s": total / wall
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args()
+
+    server = StandInServer().start()
+
+    scenarios = [
+        ("sin keep-alive", dict(keep_alive=False), 1),
+        ("pool", dict(), 1),
+        ("sin keep-alive", dict(keep_alive=False), args.workers),
+        ("pool", dict(pool_maxsize=args.workers), args.workers),
+    ]
+
+    print(f"{'escenario':<16}{'hilos':>6}{'handshakes':>12}{'p50 ms':>10}{'p95 ms':>10}{'req/s':>10}")
+    for name, session_kwargs, workers in scenarios:
+        api = SunatAPI(ruc="20000000001", client_id="bench", client_secret="bench",
+                       session=SunatHTTPSession(**session_kwargs))
+        server.point(api)
+        result = _run(server, api, args.requests, workers)
+        api.close()
+        print(f"{name:<16}{workers:>6}{result['handshakes']:>12}"
+              f"{result['p50_ms']:>10.2f}{result['p95_ms']:>10.2f}{result['req_s']:>10.0f}")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Benchmark de los backends de entrada de ExcelReader sobre el mismo dataset.
+
+Escribe la misma hoja en cada formato disponible, la carga con load_excel
+(lectura completa) y con iter_invoices (por bloques) y comprueba que todos
+los backends den las mismas facturas. Los backends cuya dependencia
+opcional no esté instalada aparecen como no disponibles.
+
+Uso:
+    python benchmarks/bench_input_backends.py [--rows 50000]
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from excel_reader import ExcelReader  # noqa: E402
+from input_backends import BACKENDS  # noqa: E402
+from bench_excel_reader import make_sheet  # noqa: E402
+
+# Archivo de cada backend y cómo escribirlo
+WRITERS = {
+    "openpyxl": ("data.xlsx", lambda df, path: df.to_excel(path, index=False)),
+    "calamine": ("data.xlsx", None),
+    "csv": ("data.csv", lambda df, path: df.to_csv(path, index=False)),
+    "parquet": ("data.parquet", lambda df, path: df.to_parquet(path, index=False)),
+    "jsonl": ("data.jsonl", lambda df, path: df.to_json(path, orient="records", lines=True, force_ascii=False)),
+}
+
+
+def signature(invoices):
+    return [(i.invoice_number, i.customer_name, i.po, i.total_cents, len(i.products)) for i in invoices]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=50000)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    df = make_sheet(args.rows)
+    df['Product_Service'] = df['Product']
+    df['Description'] = df['Product']
+    df['Unit_Measure'] = df['Unit']
+    df['Unit_Value'] = df['Unit_Price']
+
+    directory = tempfile.mkdtemp(prefix="bench_backends_")
+    reference = None
+    print(f"{args.rows} filas")
+    print(f"{'backend':<10}{'archivo MB':>11}{'escritura s':>13}{'load_excel s':>14}{'streaming s':>13}{'filas/s':>11}")
+    for backend in BACKENDS:
+        filename, write = WRITERS[backend.name]
+        if not backend.available():
+            print(f"{backend.name:<10}{'no disponible (falta la dependencia opcional)':>62}")
+            continue
+
+        path = os.path.join(directory, filename)
+        written = 0.0
+        if not os.path.exists(path):
+            start = time.perf_counter()
+            write(df, path)
+            written = time.perf_counter() - start
+
+        reader = ExcelReader(backend=backend.name)
+        start = time.perf_counter()
+        if not reader.load_excel(path):
+            print(f"{backend.name:<10} error: {reader.get_errors()}")
+            continue
+        loaded = time.perf_counter() - start
+
+        start = time.perf_counter()
+        streamed = signature(ExcelReader(backend=backend.name).iter_invoices(path))
+        streaming = time.perf_counter() - start
+
+        result = signature(reader.get_invoices())
+        reference = reference or result
+        assert result == reference == streamed, f"{backend.name}: facturas distintas"
+        print(f"{backend.name:<10}{os.path.getsize(path) / 1e6:>11.1f}{written:>13.2f}{loaded:>14.2f}"
+              f"{streaming:>13.2f}{args.rows / loaded:>11.0f}")
+
+
+if __name__ == "__main__":
+    main()
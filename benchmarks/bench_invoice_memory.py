@@ -0,0 +1,102 @@
+"""
+Memoria por línea de las representaciones de facturas.
+
+Compara, para el mismo número de líneas:
+  - objetos con __dict__ y cadenas sin compartir (representación anterior)
+  - Invoice/InvoiceProduct con __slots__ y cadenas internadas
+  - InvoiceBatch columnar
+
+Cada representación se construye desde una hoja nueva y se mide con
+tracemalloc lo que queda retenido después de liberar la hoja.
+
+Uso:
+    python benchmarks/bench_invoice_memory.py [--lines 1000000]
+"""
+import argparse
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from excel_reader import ExcelReader, InvoiceBatch  # noqa: E402
+from bench_excel_reader import make_sheet  # noqa: E402
+
+
+class _DictObject:
+    """Objeto con __dict__ como los Invoice/InvoiceProduct anteriores"""
+
+    def __init__(self, **attributes):
+        self.__dict__.update(attributes)
+
+
+def build_dict_objects(reader: ExcelReader, df):
+    df = reader._compute_amounts(df)
+    size = reader.MAX_PRODUCTS_PER_INVOICE
+    columns = [reader._column(df, name) for name in ('Item', 'Product', 'Unit')]
+    columns += [reader._numeric_column(df, name) for name in ('Quantity', 'Unit_Price')]
+    columns += [df[name].tolist() for name in ('Line_Amount_Cents', 'IGV_Cents', 'Line_Total_Cents')]
+    # Cada celda leída del Excel es una cadena nueva
+    copy = lambda value: (value + '.')[:-1] if isinstance(value, str) else value  # noqa: E731
+    products = [
+        _DictObject(item=copy(item), product=copy(product), unit=copy(unit), quantity=quantity,
+                    unit_price=price, line_amount_cents=line, igv_cents=igv, line_total_cents=total,
+                    total=line / 100)
+        for item, product, unit, quantity, price, line, igv, total in zip(*columns)
+    ]
+    names = reader._column(df, 'Customer_Name')
+    invoices = []
+    for number, start in enumerate(range(0, len(products), size), 1):
+        chunk = products[start:start + size]
+        subtotal = sum(p.line_amount_cents for p in chunk)
+        invoices.append(_DictObject(
+            invoice_number=number, serie=f"F{str(number).zfill(3)}", customer_name=copy(names[start]),
+            port=copy('CALLAO'), po=copy(f"PO-{start}"), products=chunk, is_export=True,
+            total_amount=subtotal / 100, subtotal_cents=subtotal,
+            igv_cents=sum(p.igv_cents for p in chunk), total_cents=sum(p.line_total_cents for p in chunk)
+        ))
+    return invoices
+
+
+def build_slots(reader: ExcelReader, df):
+    return reader._split_invoices(df, 1)
+
+
+def build_batch(reader: ExcelReader, df):
+    return InvoiceBatch(reader._compute_amounts(df), reader.MAX_PRODUCTS_PER_INVOICE)
+
+
+def measure(build, lines: int):
+    """Bytes retenidos por la representación y segundos de construcción"""
+    gc.collect()
+    tracemalloc.start()
+    df = make_sheet(lines)
+    start = time.perf_counter()
+    result = build(ExcelReader(), df)
+    elapsed = time.perf_counter() - start
+    del df
+    gc.collect()
+    retained = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return retained, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--lines", type=int, default=1000000)
+    args = parser.parse_args()
+
+    print(f"{args.lines} líneas")
+    print(f"{'representación':<26}{'MB':>9}{'bytes/línea':>13}{'construcción s':>16}")
+    for name, build in (("__dict__ (anterior)", build_dict_objects),
+                        ("__slots__ + intern", build_slots),
+                        ("InvoiceBatch columnar", build_batch)):
+        retained, elapsed = measure(build, args.lines)
+        print(f"{name:<26}{retained / 1e6:>9.1f}{retained / args.lines:>13.0f}{elapsed:>16.2f}")
+
+
+if __name__ == "__main__":
+    main()
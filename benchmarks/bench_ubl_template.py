@@ -0,0 +1,61 @@
+"""
+Benchmark de la plantilla UBL precompilada frente al generador ElementTree.
+
+Verifica que ambas rutas producen los mismos bytes y mide comprobantes por
+segundo para documentos de 1, 20 y 500 líneas.
+
+Uso:
+    python benchmarks/bench_ubl_template.py [--seconds 1.0]
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from sunat_api import SunatAPI  # noqa: E402
+from bench_batch import make_invoice  # noqa: E402
+
+
+def _rate(fn, seconds: float) -> float:
+    count = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        fn()
+        count += 1
+    return count / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--seconds", type=float, default=1.0)
+    args = parser.parse_args()
+
+    api = SunatAPI(ruc="20000000001", client_id="bench", client_secret="bench")
+    template = api._get_ubl_template()
+    issued_at = datetime(2025, 1, 31, 12, 30, 0)
+
+    # Caracteres que requieren escape o referencias en ISO-8859-1
+    special = make_invoice(7, 3)
+    special.emisor_name = "ÑANDÚ & HIJOS <SAC>"
+    special.products[0].description = "ARROZ \"EXTRA\" 5% € ☃"
+    special.products[1].description = ""
+    assert template.render(special, issued_at) == api._build_xml_tree(special, issued_at)
+
+    print(f"{'líneas':>7}{'ElementTree/s':>15}{'plantilla/s':>13}{'speedup':>9}")
+    for lines in (1, 20, 500):
+        invoice = make_invoice(1, lines)
+        assert template.render(invoice, issued_at) == api._build_xml_tree(invoice, issued_at)
+
+        tree_rate = _rate(lambda: api._build_xml_tree(invoice, issued_at), args.seconds)
+        template_rate = _rate(lambda: template.render(invoice, issued_at), args.seconds)
+        print(f"{lines:>7}{tree_rate:>15.0f}{template_rate:>13.0f}{template_rate / tree_rate:>9.2f}")
+
+    api.close()
+
+
+if __name__ == "__main__":
+    main()
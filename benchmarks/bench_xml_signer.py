@@ -0,0 +1,104 @@
+"""
+Benchmark de firma XML: firmador por llamada frente a sign_many.
+
+Genera un certificado autofirmado RSA 2048 temporal, firma comprobantes de
+20 líneas con el método anterior (un XMLSigner nuevo por documento y
+conversión a str) y con sign_many en 1, 4 y 8 procesos, verifica una firma
+de cada variante y muestra firmas por segundo.
+
+Uso:
+    python benchmarks/bench_xml_signer.py [--documents 400] [--workers 1 4 8]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from cryptography import x509  # noqa: E402
+from cryptography.hazmat.primitives import hashes, serialization  # noqa: E402
+from cryptography.hazmat.primitives.asymmetric import rsa  # noqa: E402
+from cryptography.x509.oid import NameOID  # noqa: E402
+from lxml import etree  # noqa: E402
+from signxml import XMLSigner, XMLVerifier, methods  # noqa: E402
+
+from sunat_api import SunatAPI  # noqa: E402
+from xml_signer import SunatXMLSigner  # noqa: E402
+from bench_batch import make_invoice  # noqa: E402
+
+
+def write_certificate(directory: str):
+    """Llave y certificado autofirmado en PEM; devuelve sus rutas"""
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "20000000001 BENCH")])
+    now = datetime.now(timezone.utc)
+    cert = (x509.CertificateBuilder().subject_name(name).issuer_name(name)
+            .public_key(key.public_key()).serial_number(x509.random_serial_number())
+            .not_valid_before(now - timedelta(days=1)).not_valid_after(now + timedelta(days=30))
+            .sign(key, hashes.SHA256()))
+    cert_path = os.path.join(directory, "cert.pem")
+    key_path = os.path.join(directory, "key.pem")
+    with open(cert_path, "wb") as f:
+        f.write(cert.public_bytes(serialization.Encoding.PEM))
+    with open(key_path, "wb") as f:
+        f.write(key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                  serialization.NoEncryption()))
+    return cert_path, key_path
+
+
+def legacy_sign(signer: SunatXMLSigner, xml: bytes) -> bytes:
+    """Firma previa: XMLSigner nuevo, fromstring propio y vuelta a str"""
+    root = etree.fromstring(xml)
+    xml_signer = XMLSigner(method=methods.enveloped, signature_algorithm="rsa-sha256",
+                           digest_algorithm="sha256",
+                           c14n_algorithm="http://www.w3.org/2001/10/xml-exc-c14n#")
+    signed = xml_signer.sign(root, key=signer.private_key, cert=[signer.certificate])
+    return etree.tostring(signed, encoding='UTF-8', xml_declaration=True).decode().encode("utf-8")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--documents", type=int, default=400)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8])
+    args = parser.parse_args()
+
+    api = SunatAPI(ruc="20000000001", client_id="bench", client_secret="bench")
+    documents = [api._generate_xml(make_invoice(n, 20)) for n in range(1, args.documents + 1)]
+    api.close()
+
+    with tempfile.TemporaryDirectory() as directory:
+        cert_path, key_path = write_certificate(directory)
+        signer = SunatXMLSigner(cert_path, key_path)
+        with open(cert_path, "rb") as f:
+            cert_pem = f.read()
+
+        def check(xml: bytes) -> None:
+            XMLVerifier().verify(xml, x509_cert=cert_pem)
+
+        print(f"{os.cpu_count()} CPU disponibles, {args.documents} comprobantes de 20 líneas")
+        print(f"{'variante':<24}{'firmas/s':>10}{'speedup':>9}")
+
+        start = time.perf_counter()
+        signed = [legacy_sign(signer, xml) for xml in documents]
+        base = len(documents) / (time.perf_counter() - start)
+        check(signed[-1])
+        print(f"{'XMLSigner por llamada':<24}{base:>10.1f}{1.0:>8.2f}x")
+
+        for workers in args.workers:
+            # El arranque del pool (y la carga de la llave) no se mide
+            signer.sign_many(documents[:workers * 16], workers=workers)
+            start = time.perf_counter()
+            signed = signer.sign_many(documents, workers=workers)
+            rate = len(documents) / (time.perf_counter() - start)
+            check(signed[-1])
+            print(f"{f'sign_many {workers} proc.':<24}{rate:>10.1f}{rate / base:>8.2f}x")
+
+        signer.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Prueba de carga de SunatAPI contra el servidor simulado (sunat_mock.py).
+
+Lanza comprobantes a un ritmo fijo (carga abierta: cada envío tiene su hora
+programada y la latencia se mide desde ella, así que las colas del cliente
+también cuentan) y reporta rendimiento, percentiles de latencia y desglose
+de errores del cliente y del servidor.
+
+Uso:
+    python benchmarks/load_test.py --rate 200 --duration 10 --latency lognormal:0.05:0.5
+    python benchmarks/load_test.py --rate 100 --error-rate 0.02 --rate-limit 80
+    python benchmarks/load_test.py --url http://127.0.0.1:8080 --operation validar
+"""
+import argparse
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sunat_api import SunatAPI  # noqa: E402
+from sunat_http import SunatHTTPSession  # noqa: E402
+from sunat_mock import MockConfig, MockSunatServer  # noqa: E402
+from token_manager import TokenManager  # noqa: E402
+from bench_batch import make_invoice  # noqa: E402
+from _standin import percentile  # noqa: E402
+
+
+def classify(result) -> str:
+    """Categoría del resultado para el desglose"""
+    if result.get("success"):
+        code = (result.get("cdr") or {}).get("codRespuesta")
+        if code not in (None, "0"):
+            return f"cdr {code}"
+        return "ok"
+    message = str(result.get("error") or result.get("message") or "error")
+    return message.splitlines()[0][:60]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rate", type=float, default=100, help="Comprobantes por segundo")
+    parser.add_argument("--duration", type=float, default=10, help="Segundos de carga")
+    parser.add_argument("--workers", type=int, default=32)
+    parser.add_argument("--operation", choices=("envio", "validar"), default="envio")
+    parser.add_argument("--url", help="Servidor simulado externo (por defecto se lanza uno)")
+    parser.add_argument("--latency", default="lognormal:0.05:0.5")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=float, default=0.0)
+    parser.add_argument("--reject-rate", type=float, default=0.0)
+    parser.add_argument("--no-flow-control", action="store_true")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+
+    server = None
+    if not args.url:
+        server = MockSunatServer(MockConfig(
+            latency={"token": 0.0, "envio": args.latency, "validarcomprobante": args.latency},
+            error_rate=args.error_rate, rate_limit=args.rate_limit,
+            reject_rate=args.reject_rate, seed=args.seed
+        )).start()
+
+    api = SunatAPI(ruc="20000000001", client_id="load", client_secret="load",
+                   session=SunatHTTPSession(pool_maxsize=args.workers,
+                                            flow_control=not args.no_flow_control))
+    api.token_manager = TokenManager(api._request_token, api.client_id, cache_dir=None)
+    if server:
+        server.point(api)
+    else:
+        api.token_url = f"{args.url}/v1/clientesextranet/{{}}/oauth2/token/"
+        api.base_url = f"{args.url}/v1/contribuyente/contribuyentes"
+    api.get_token()
+
+    total = int(args.rate * args.duration)
+    invoices = [make_invoice(n, lines=3) for n in range(1, total + 1)]
+    samples = []
+    lock = threading.Lock()
+
+    def run(invoice, scheduled):
+        started = time.perf_counter()
+        if args.operation == "envio":
+            result = api.create_invoice(invoice)
+        else:
+            result = api.validar_comprobante("FACTURA", invoice.serie, str(invoice.invoice_number),
+                                             "01/01/2025", invoice.total_cents / 100)
+        finished = time.perf_counter()
+        with lock:
+            samples.append((finished - scheduled, finished - started, classify(result)))
+
+    print(f"Carga: {args.rate:.0f}/s durante {args.duration:.0f}s ({total} {args.operation}), "
+          f"{args.workers} hilos")
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        begin = time.perf_counter()
+        for i, invoice in enumerate(invoices):
+            scheduled = begin + i / args.rate
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(run, invoice, scheduled)
+    elapsed = time.perf_counter() - begin
+
+    latencies = [s[0] * 1000 for s in samples]
+    service = [s[1] * 1000 for s in samples]
+    outcomes = Counter(s[2] for s in samples)
+
+    print(f"\nRendimiento: {len(samples) / elapsed:.1f}/s ({outcomes['ok']} ok de {len(samples)} en {elapsed:.1f}s)")
+    print(f"{'ms':>10}{'p50':>9}{'p90':>9}{'p99':>9}{'max':>9}")
+    for name, values in (("latencia", latencies), ("servicio", service)):
+        print(f"{name:>10}" + "".join(f"{percentile(values, p):>9.1f}" for p in (50, 90, 99)) +
+              f"{max(values):>9.1f}")
+
+    print("\nResultados del cliente:")
+    for outcome, count in outcomes.most_common():
+        print(f"  {count:>7}  {outcome}")
+
+    if server:
+        print("\nRespuestas del servidor:")
+        for endpoint, statuses in server.stats().items():
+            detail = ", ".join(f"{status}: {count}" for status, count in statuses.items())
+            print(f"  {endpoint:<20} {detail}")
+
+    for endpoint, state in api.transport_state().items():
+        print(f"  control de flujo {endpoint}: límite {state['limit']}, circuito {state['breaker']}, "
+              f"{state['retries']} reintentos")
+    stats = api.connection_stats()
+    print(f"  conexiones: {stats['connections']} para {stats['requests']} peticiones")
+
+    api.close()
+    if server:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+import xml.etree.ElementTree as ET
+from datetime import date, datetime
+from typing import Any, Iterable, List, Optional
+
+from excel_reader import document_serie, format_cents
+from row_validation import identity_document_type
+
+
+def boleta_id(invoice: Any) -> str:
+    """Serie-número de la boleta; la serie siempre lleva el prefijo B (tipo 03)"""
+    return f"{document_serie('03', invoice.invoice_number)}-{invoice.invoice_number}"
+
+
+class SummaryDocument:
+    """Un Resumen Diario (RC) con sus líneas de boletas"""
+
+    def __init__(self, summary_id: str, reference_date: date, invoices: List[Any]):
+        self.summary_id = summary_id
+        self.reference_date = reference_date
+        self.invoices = invoices
+
+    @property
+    def document_ids(self) -> List[str]:
+        return [boleta_id(invoice) for invoice in self.invoices]
+
+    def __len__(self):
+        return len(self.invoices)
+
+    def __str__(self):
+        return f"{self.summary_id} ({len(self.invoices)} boletas del {self.reference_date:%d/%m/%Y})"
+
+
+class DailySummaryBuilder:
+    """
+    Agrupa las boletas de un día en Resúmenes Diarios (SummaryDocuments-1).
+
+    SUNAT acepta hasta 500 líneas por resumen; cada resumen se envía como un
+    único documento y devuelve un ticket, en lugar de una petición por
+    boleta. El identificador es RC-<fecha de emisión>-<correlativo>.
+    """
+
+    MAX_LINES = 500
+
+    XML_NAMESPACES = {
+        'xmlns': "urn:sunat:names:specification:ubl:peru:schema:xsd:SummaryDocuments-1",
+        'xmlns:cac': "urn:oasis:names:specification:ubl:schema:xsd:CommonAggregateComponents-2",
+        'xmlns:cbc': "urn:oasis:names:specification:ubl:schema:xsd:CommonBasicComponents-2",
+        'xmlns:ds': "http://www.w3.org/2000/09/xmldsig#",
+        'xmlns:ext': "urn:oasis:names:specification:ubl:schema:xsd:CommonExtensionComponents-2",
+        'xmlns:sac': "urn:sunat:names:specification:ubl:peru:schema:xsd:SunatAggregateComponents-1"
+    }
+
+    # Estado de la línea: 1 adicionar, 2 modificar, 3 anular
+    CONDITION_ADD = "1"
+
+    def __init__(self, ruc: str, emisor_name: str = "", max_lines: int = MAX_LINES):
+        """
+        Args:
+            ruc: RUC del emisor
+            emisor_name: Razón social del emisor
+            max_lines: Boletas por resumen (máximo 500)
+        """
+        self.ruc = ruc
+        self.emisor_name = emisor_name
+        self.max_lines = min(max_lines, self.MAX_LINES)
+
+    def group(self, invoices: Iterable[Any], reference_date: date,
+              issue_date: Optional[date] = None, first_sequence: int = 1) -> List[SummaryDocument]:
+        """
+        Reparte las boletas en resúmenes de hasta max_lines líneas
+
+        Args:
+            invoices: Boletas emitidas en reference_date
+            reference_date: Fecha de emisión de las boletas
+            issue_date: Fecha de generación del resumen (por defecto hoy)
+            first_sequence: Primer correlativo libre del día de generación
+
+        Returns:
+            List[SummaryDocument] en orden de correlativo
+        """
+        issue_date = issue_date or date.today()
+        invoices = list(invoices)
+        summaries = []
+        for offset, start in enumerate(range(0, len(invoices), self.max_lines)):
+            summary_id = f"RC-{issue_date:%Y%m%d}-{first_sequence + offset}"
+            summaries.append(SummaryDocument(summary_id, reference_date, invoices[start:start + self.max_lines]))
+        return summaries
+
+    def build_xml(self, summary: SummaryDocument, issued_at: Optional[datetime] = None) -> bytes:
+        """Genera el XML SummaryDocuments-1 del resumen"""
+        issued_at = issued_at or datetime.now()
+        root = ET.Element("SummaryDocuments", self.XML_NAMESPACES)
+
+        # Espacio para la firma digital
+        extensions = ET.SubElement(root, "ext:UBLExtensions")
+        extension = ET.SubElement(extensions, "ext:UBLExtension")
+        ET.SubElement(extension, "ext:ExtensionContent")
+
+        ET.SubElement(root, "cbc:UBLVersionID").text = "2.0"
+        ET.SubElement(root, "cbc:CustomizationID").text = "1.1"
+        ET.SubElement(root, "cbc:ID").text = summary.summary_id
+        ET.SubElement(root, "cbc:ReferenceDate").text = summary.reference_date.strftime("%Y-%m-%d")
+        ET.SubElement(root, "cbc:IssueDate").text = issued_at.strftime("%Y-%m-%d")
+
+        # Emisor
+        supplier = ET.SubElement(root, "cac:AccountingSupplierParty")
+        ET.SubElement(supplier, "cbc:CustomerAssignedAccountID").text = self.ruc
+        ET.SubElement(supplier, "cbc:AdditionalAccountID").text = "6"
+        party = ET.SubElement(supplier, "cac:Party")
+        legal_entity = ET.SubElement(party, "cac:PartyLegalEntity")
+        ET.SubElement(legal_entity, "cbc:RegistrationName").text = self.emisor_name
+
+        for line_id, invoice in enumerate(summary.invoices, 1):
+            self._add_summary_line(root, line_id, invoice)
+
+        return ET.tostring(root, encoding="ISO-8859-1")
+
+    def _add_summary_line(self, root: ET.Element, line_id: int, invoice: Any) -> None:
+        """Agrega la línea de una boleta al resumen"""
+        currency = "PEN" if getattr(invoice, "currency", "SOL") == "SOL" else "USD"
+        line = ET.SubElement(root, "sac:SummaryDocumentsLine")
+        ET.SubElement(line, "cbc:LineID").text = str(line_id)
+        ET.SubElement(line, "cbc:DocumentTypeCode").text = "03"
+        ET.SubElement(line, "cbc:ID").text = boleta_id(invoice)
+
+        # Cliente (DNI, RUC o sin documento)
+        customer_id = str(getattr(invoice, "customer_ruc", "") or "")
+        customer = ET.SubElement(line, "cac:AccountingCustomerParty")
+        ET.SubElement(customer, "cbc:CustomerAssignedAccountID").text = customer_id or "-"
+        ET.SubElement(customer, "cbc:AdditionalAccountID").text = identity_document_type(customer_id)
+
+        status = ET.SubElement(line, "cac:Status")
+        ET.SubElement(status, "cbc:ConditionCode").text = self.CONDITION_ADD
+
+        ET.SubElement(line, "sac:TotalAmount", currencyID=currency).text = format_cents(invoice.total_cents)
+
+        # Operaciones gravadas
+        payment = ET.SubElement(line, "sac:BillingPayment")
+        ET.SubElement(payment, "cbc:PaidAmount", currencyID=currency).text = format_cents(invoice.subtotal_cents)
+        ET.SubElement(payment, "cbc:InstructionID").text = "01"
+
+        # IGV
+        tax_total = ET.SubElement(line, "cac:TaxTotal")
+        ET.SubElement(tax_total, "cbc:TaxAmount", currencyID=currency).text = format_cents(invoice.igv_cents)
+        subtotal = ET.SubElement(tax_total, "cac:TaxSubtotal")
+        ET.SubElement(subtotal, "cbc:TaxAmount", currencyID=currency).text = format_cents(invoice.igv_cents)
+        category = ET.SubElement(subtotal, "cac:TaxCategory")
+        scheme = ET.SubElement(category, "cac:TaxScheme")
+        ET.SubElement(scheme, "cbc:ID").text = "1000"
+        ET.SubElement(scheme, "cbc:Name").text = "IGV"
+        ET.SubElement(scheme, "cbc:TaxTypeCode").text = "VAT"
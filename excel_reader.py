@@ -1,7 +1,18 @@
 import pandas as pd
+import numpy as np
 import os
+import sys
+import glob
+import heapq
+import json
 import logging
-from typing import List, Dict, Any, Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Dict, Any, Optional, Tuple
+from input_backends import get_backend, supported_extensions
+from workbook_cache import WorkbookCache
+from row_validation import RowValidator, ValidationReport, identity_document_type
+from invoice_packing import InvoicePacker, PACKING_KEY
+from parse_delta import ParseDelta, ParseSnapshot, ParseTracker, UNCHANGED, invoice_fingerprints, row_hashes
 
 # Set up logging
 logging.basicConfig(
@@ -15,16 +26,102 @@ logging.basicConfig(
 
 logger = logging.getLogger('excel_reader')
 
+# Tasa del IGV en porcentaje
+IGV_RATE = 18
+
+# Escalas de punto fijo: cantidades en milésimas, precios en millonésimas
+QUANTITY_SCALE = 1000
+PRICE_SCALE = 1000000
+_CENTS_DIVISOR = QUANTITY_SCALE * PRICE_SCALE // 100
+
+
+def compute_line_amounts(quantity: float, unit_price: float) -> Tuple[int, int, int]:
+    """
+    Calcula los importes de una línea en céntimos (valor, IGV y total)
+
+    Usa la misma aritmética de punto fijo que ExcelReader aplica por columnas,
+    para productos creados fuera de la lectura del Excel.
+    """
+    scaled = round(quantity * QUANTITY_SCALE) * round(unit_price * PRICE_SCALE)
+    line_cents = (scaled + _CENTS_DIVISOR // 2) // _CENTS_DIVISOR
+    igv_cents = (line_cents * IGV_RATE + 50) // 100
+    return line_cents, igv_cents, line_cents + igv_cents
+
+
+def format_cents(cents: int) -> str:
+    """Formatea un importe en céntimos con dos decimales (1234 -> '12.34')"""
+    sign = '-' if cents < 0 else ''
+    cents = abs(int(cents))
+    return f"{sign}{cents // 100}.{cents % 100:02d}"
+
+def _intern(value: Any) -> Any:
+    """Intern repeated strings (units, products, customers) so rows share one copy"""
+    return sys.intern(value) if type(value) is str else value
+
+
+# Prefijo de serie por tipo de comprobante (catálogo 01): F factura, B boleta
+SERIE_PREFIX = {'01': 'F', '03': 'B'}
+
+
+def document_serie(document_type: str, invoice_number: int) -> str:
+    """Serie of a document: F003 for factura (01) number 3, B003 for boleta (03)"""
+    return f"{SERIE_PREFIX[document_type]}{str(invoice_number).zfill(3)}"
+
+
+def _is_factura(customer_ruc: Any) -> bool:
+    """Factura unless the customer is identified by DNI; exports to foreign customers are facturas too"""
+    return identity_document_type(customer_ruc) != "1"
+
+
 class InvoiceProduct:
     """Class representing a product in an invoice"""
     
+    __slots__ = ('item', 'product', 'unit', 'quantity', 'unit_price',
+                 'line_amount_cents', 'igv_cents', 'line_total_cents')
+    
     def __init__(self, product_data: Dict[str, Any]):
-        self.item = product_data.get('Item', '')
-        self.product = product_data.get('Product', '')
-        self.unit = product_data.get('Unit', '')
+        self.item = _intern(product_data.get('Item', ''))
+        self.product = _intern(product_data.get('Product', ''))
+        self.unit = _intern(product_data.get('Unit', ''))
         self.quantity = float(product_data.get('Quantity', 0))
         self.unit_price = float(product_data.get('Unit_Price', 0))
-        self.total = self.quantity * self.unit_price
+        
+        # Importes en céntimos; ExcelReader los precalcula por columnas
+        if 'Line_Amount_Cents' in product_data:
+            self.line_amount_cents = int(product_data['Line_Amount_Cents'])
+            self.igv_cents = int(product_data['IGV_Cents'])
+            self.line_total_cents = int(product_data['Line_Total_Cents'])
+        else:
+            self.line_amount_cents, self.igv_cents, self.line_total_cents = \
+                compute_line_amounts(self.quantity, self.unit_price)
+    
+    @property
+    def total(self) -> float:
+        return self.line_amount_cents / 100
+    
+    @classmethod
+    def from_columns(cls, item: List[Any], product: List[Any], unit: List[Any],
+                     quantity: List[float], unit_price: List[float], line_amount_cents: List[int],
+                     igv_cents: List[int], line_total_cents: List[int]) -> List['InvoiceProduct']:
+        """
+        Build many products at once from column lists, without a dict per row
+        
+        Args:
+            Parallel lists of item, product, unit, quantity, unit price and
+            precomputed amounts in cents, one entry per product
+            
+        Returns:
+            List[InvoiceProduct]: Products in row order
+        """
+        products = []
+        new = cls.__new__
+        for values in zip(map(_intern, item), map(_intern, product), map(_intern, unit), quantity,
+                          unit_price, line_amount_cents, igv_cents, line_total_cents):
+            obj = new(cls)
+            (obj.item, obj.product, obj.unit, obj.quantity, obj.unit_price,
+             obj.line_amount_cents, obj.igv_cents, obj.line_total_cents) = values
+            products.append(obj)
+        return products
     
     def __str__(self):
         return f"{self.quantity} {self.unit} of {self.product} - {self.item} @ {self.unit_price}"
@@ -32,21 +129,55 @@ class InvoiceProduct:
 class Invoice:
     """Class representing an invoice with multiple products"""
     
+    __slots__ = ('invoice_number', 'serie', 'customer_ruc', 'customer_name', 'currency', 'port', 'po',
+                 'products', 'subtotal_cents', 'igv_cents', 'total_cents',
+                 'is_factura', 'emisor_name', 'transaction_type')
+    
+    is_export = True  # Siempre es exportación
+    
     def __init__(self, invoice_number: int, header_data: Dict[str, Any]):
-        self.invoice_number = invoice_number
-        self.serie = f"F{str(invoice_number).zfill(3)}"  # Automático F001, F002, etc
-        self.customer_name = header_data.get('Customer_Name', '')
-        self.port = header_data.get('Port', '')
-        self.po = header_data.get('PO', '')
+        self.customer_ruc = _intern(header_data.get('Customer_RUC', ''))
+        self.customer_name = _intern(header_data.get('Customer_Name', ''))
+        self.currency = _intern(header_data.get('Currency', ''))
+        self.port = _intern(header_data.get('Port', ''))
+        self.po = _intern(header_data.get('PO', ''))
+        self.is_factura = _is_factura(self.customer_ruc)
+        self.emisor_name = ''
+        self.transaction_type = 'CASH'
+        self.renumber(invoice_number)
         self.products: List[InvoiceProduct] = []
-        self.is_export = True  # Siempre es exportación
-        self.total_amount = 0.0
+        self.subtotal_cents = 0
+        self.igv_cents = 0
+        self.total_cents = 0
+        
+    def renumber(self, invoice_number: int) -> None:
+        self.invoice_number = invoice_number
+        self.serie = document_serie(self.document_type, invoice_number)  # Automático F001/B001, F002...
+    
+    @property
+    def document_type(self) -> str:
+        """Catálogo 01: '01' factura, '03' boleta"""
+        return '01' if self.is_factura else '03'
         
     def add_product(self, product_data: Dict[str, Any]) -> None:
         """Añade un producto y actualiza el total"""
         product = InvoiceProduct(product_data)
         self.products.append(product)
-        self.total_amount += product.total
+        self.subtotal_cents += product.line_amount_cents
+        self.igv_cents += product.igv_cents
+        self.total_cents += product.line_total_cents
+
+    def set_products(self, products: List[InvoiceProduct], subtotal_cents: int, igv_cents: int,
+                     total_cents: int) -> None:
+        """Asigna productos con sus totales ya sumados (carga por columnas)"""
+        self.products = products
+        self.subtotal_cents = subtotal_cents
+        self.igv_cents = igv_cents
+        self.total_cents = total_cents
+
+    @property
+    def total_amount(self) -> float:
+        return self.subtotal_cents / 100
 
     def get_observation(self) -> str:
         """Genera la observación en formato estandarizado"""
@@ -61,6 +192,265 @@ class Invoice:
                 f"Transaction: {self.transaction_type} | Currency: {self.currency} | Export: {self.is_export}\n"
                 f"Products: {len(self.products)}")
 
+class _ProductView:
+    """Read-only InvoiceProduct over one row of an InvoiceBatch"""
+    
+    __slots__ = ('_batch', '_row')
+    
+    def __init__(self, batch: 'InvoiceBatch', row: int):
+        self._batch = batch
+        self._row = row
+    
+    item = property(lambda self: self._batch._text('item', self._row))
+    product = property(lambda self: self._batch._text('product', self._row))
+    unit = property(lambda self: self._batch._text('unit', self._row))
+    quantity = property(lambda self: float(self._batch.quantity[self._row]))
+    unit_price = property(lambda self: float(self._batch.unit_price[self._row]))
+    line_amount_cents = property(lambda self: int(self._batch.line_amount_cents[self._row]))
+    igv_cents = property(lambda self: int(self._batch.igv_cents[self._row]))
+    line_total_cents = property(lambda self: int(self._batch.line_total_cents[self._row]))
+    total = property(lambda self: self.line_amount_cents / 100)
+    
+    __str__ = InvoiceProduct.__str__
+
+
+class _InvoiceView:
+    """Read-only Invoice over one invoice of an InvoiceBatch"""
+    
+    __slots__ = ('_batch', '_index')
+    
+    is_export = True
+    emisor_name = ''
+    transaction_type = 'CASH'
+    
+    def __init__(self, batch: 'InvoiceBatch', index: int):
+        self._batch = batch
+        self._index = index
+    
+    invoice_number = property(lambda self: self._batch.first_number + self._index)
+    serie = property(lambda self: document_serie(self.document_type, self.invoice_number))
+    customer_ruc = property(lambda self: self._batch._text('customer_ruc', self._index))
+    is_factura = property(lambda self: _is_factura(self.customer_ruc))
+    document_type = Invoice.document_type
+    customer_name = property(lambda self: self._batch._text('customer_name', self._index))
+    currency = property(lambda self: self._batch._text('currency', self._index))
+    port = property(lambda self: self._batch._text('port', self._index))
+    po = property(lambda self: self._batch._text('po', self._index))
+    subtotal_cents = property(lambda self: int(self._batch.subtotal_cents[self._index]))
+    igv_cents = property(lambda self: int(self._batch.invoice_igv_cents[self._index]))
+    total_cents = property(lambda self: int(self._batch.total_cents[self._index]))
+    total_amount = property(lambda self: self.subtotal_cents / 100)
+    
+    @property
+    def products(self) -> List[_ProductView]:
+        start, end = self._batch._rows(self._index)
+        return [_ProductView(self._batch, row) for row in range(start, end)]
+    
+    def get_product_count(self) -> int:
+        start, end = self._batch._rows(self._index)
+        return end - start
+    
+    get_observation = Invoice.get_observation
+    __str__ = Invoice.__str__
+
+
+class InvoiceBatch:
+    """
+    Columnar storage for many invoices
+    
+    Line items live in NumPy arrays (quantities, prices, amounts in cents)
+    and repeated strings as integer codes into a table of unique values, so
+    a line costs a few dozen bytes instead of a Python object per field.
+    Indexing or iterating returns lightweight views with the same attributes
+    as Invoice and InvoiceProduct (read-only), built on demand.
+    """
+    
+    # Versión del formato de to_arrays (forma parte de la clave de WorkbookCache)
+    FORMAT_VERSION = 3
+    
+    _NUMERIC_ARRAYS = ('starts', 'quantity', 'unit_price', 'line_amount_cents', 'igv_cents',
+                       'line_total_cents', 'subtotal_cents', 'invoice_igv_cents', 'total_cents', 'row_hash')
+    _TEXT_COLUMNS = {'item': 'Item', 'product': 'Product', 'unit': 'Unit'}
+    _HEADER_COLUMNS = {'customer_ruc': 'Customer_RUC', 'customer_name': 'Customer_Name',
+                       'currency': 'Currency', 'port': 'Port', 'po': 'PO'}
+    
+    def __init__(self, df: pd.DataFrame, max_products: int, first_number: int = 1,
+                 starts: Optional[np.ndarray] = None, packing: Optional[Dict[str, int]] = None):
+        """
+        Build the batch from a DataFrame with precomputed cent columns
+        
+        Args:
+            df: Rows as returned by ExcelReader._compute_amounts
+            max_products: Products per invoice
+            first_number: Number of the first invoice
+            starts: First row of each invoice (from InvoicePacker); by
+                default a new invoice every max_products rows
+            packing: Packing statistics kept with the batch
+        """
+        rows = len(df)
+        self.first_number = first_number
+        self.starts = (np.asarray(starts, dtype=np.int64) if starts is not None
+                       else np.arange(0, rows, max_products, dtype=np.int64))
+        self.rows = rows
+        self.packing: Dict[str, int] = dict(packing or {})
+        
+        self.quantity = np.array(ExcelReader._numeric_column(df, 'Quantity'), dtype=np.float64)
+        self.unit_price = np.array(ExcelReader._numeric_column(df, 'Unit_Price'), dtype=np.float64)
+        self.line_amount_cents = self._int_array(df['Line_Amount_Cents'])
+        self.igv_cents = self._int_array(df['IGV_Cents'])
+        self.line_total_cents = self._int_array(df['Line_Total_Cents'])
+        self.row_hash = df['Row_Hash'].to_numpy(dtype=np.uint64)
+        
+        reduce = (lambda values: np.add.reduceat(values, self.starts)) if rows else (lambda values: values[:0])
+        self.subtotal_cents = reduce(self.line_amount_cents)
+        self.invoice_igv_cents = reduce(self.igv_cents)
+        self.total_cents = reduce(self.line_total_cents)
+        
+        # Texto repetido: códigos int32 + tabla de valores únicos
+        self._codes: Dict[str, np.ndarray] = {}
+        self._values: Dict[str, List[Any]] = {}
+        headers = df.iloc[self.starts]
+        for name, column in self._TEXT_COLUMNS.items():
+            self._encode(name, ExcelReader._column(df, column))
+        for name, column in self._HEADER_COLUMNS.items():
+            self._encode(name, ExcelReader._column(headers, column))
+    
+    @staticmethod
+    def _int_array(column: pd.Series) -> np.ndarray:
+        """int64 when the amounts fit, Python ints otherwise"""
+        values = column.to_numpy()
+        return values.astype(np.int64) if values.dtype != object else values.copy()
+    
+    def _encode(self, name: str, values: List[Any]) -> None:
+        codes, uniques = pd.factorize(pd.Series(values, dtype=object), sort=False)
+        self._codes[name] = codes.astype(np.int32)
+        self._values[name] = [_intern(value) for value in uniques]
+    
+    def _text(self, name: str, row: int) -> Any:
+        """Value of a text column (row index, or invoice index for headers)"""
+        return self._values[name][self._codes[name][row]]
+    
+    def _rows(self, index: int) -> Tuple[int, int]:
+        start = int(self.starts[index])
+        end = int(self.starts[index + 1]) if index + 1 < len(self.starts) else self.rows
+        return start, end
+    
+    def __len__(self) -> int:
+        return len(self.starts)
+    
+    def __getitem__(self, index: int) -> _InvoiceView:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return _InvoiceView(self, index)
+    
+    def __iter__(self) -> Iterator[_InvoiceView]:
+        return (_InvoiceView(self, index) for index in range(len(self)))
+    
+    def nbytes(self) -> int:
+        """Approximate size of the arrays (excluding the unique strings)"""
+        arrays = [getattr(self, name) for name in self._NUMERIC_ARRAYS]
+        return sum(array.nbytes for array in arrays) + sum(codes.nbytes for codes in self._codes.values())
+    
+    def header_keys(self, columns: List[str]) -> List[Tuple[Any, ...]]:
+        """Header values of each invoice for the given sheet columns ('' if not stored)"""
+        names = {column: name for name, column in self._HEADER_COLUMNS.items()}
+        values = [self._decode(names[column], 0, len(self)) if column in names else [''] * len(self)
+                  for column in columns]
+        return list(zip(*values)) if values else [()] * len(self)
+    
+    def fingerprints(self) -> List[str]:
+        """Content fingerprint of each invoice (see parse_delta)"""
+        return invoice_fingerprints(self.row_hash, self.starts)
+    
+    def iter_invoices(self, block_invoices: int = 250, indices: Optional[List[int]] = None) -> Iterator[Invoice]:
+        """
+        Materialise the batch as Invoice objects, block_invoices at a time
+        
+        Args:
+            block_invoices: Invoices built per block
+            indices: Build only these invoices (ascending)
+        
+        Yields:
+            Invoice: Regular (mutable) invoices, equal to what load_excel builds
+        """
+        if indices is None:
+            ranges = ((first, min(first + block_invoices, len(self))) for first in range(0, len(self), block_invoices))
+        else:
+            ranges = self._runs(indices, block_invoices)
+        for first, last in ranges:
+            start, end = self._rows(first)[0], self._rows(last - 1)[1]
+            products = InvoiceProduct.from_columns(
+                self._decode('item', start, end), self._decode('product', start, end),
+                self._decode('unit', start, end),
+                self.quantity[start:end].tolist(), self.unit_price[start:end].tolist(),
+                self.line_amount_cents[start:end].tolist(), self.igv_cents[start:end].tolist(),
+                self.line_total_cents[start:end].tolist()
+            )
+            headers = {column: self._decode(name, first, last) for name, column in self._HEADER_COLUMNS.items()}
+            for offset, index in enumerate(range(first, last)):
+                row_start, row_end = self._rows(index)
+                invoice = Invoice(self.first_number + index,
+                                  {column: values[offset] for column, values in headers.items()})
+                invoice.set_products(products[row_start - start:row_end - start],
+                                     int(self.subtotal_cents[index]), int(self.invoice_igv_cents[index]),
+                                     int(self.total_cents[index]))
+                yield invoice
+    
+    @staticmethod
+    def _runs(indices: List[int], size: int) -> Iterator[Tuple[int, int]]:
+        """Contiguous (first, last) ranges of ascending indices, at most size long"""
+        first = last = None
+        for index in indices:
+            if first is not None and index == last and last - first < size:
+                last += 1
+                continue
+            if first is not None:
+                yield first, last
+            first, last = index, index + 1
+        if first is not None:
+            yield first, last
+    
+    def to_invoices(self) -> List[Invoice]:
+        return list(self.iter_invoices())
+    
+    def _decode(self, name: str, start: int, end: int) -> List[Any]:
+        values = self._values[name]
+        return [values[code] for code in self._codes[name][start:end].tolist()]
+    
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        """
+        Plain arrays for np.savez (no pickled objects)
+        
+        Raises:
+            TypeError: If amounts exceed int64 or a text value is not
+            JSON-serialisable (e.g. dates), so the batch cannot be stored
+        """
+        arrays = {name: getattr(self, name) for name in self._NUMERIC_ARRAYS}
+        if any(array.dtype == object for array in arrays.values()):
+            raise TypeError("Importes fuera del rango de int64")
+        arrays.update({f"codes_{name}": codes for name, codes in self._codes.items()})
+        meta = {"rows": self.rows, "first_number": self.first_number, "values": self._values,
+                "packing": self.packing}
+        arrays["meta"] = np.frombuffer(json.dumps(meta, ensure_ascii=False).encode('utf-8'), dtype=np.uint8)
+        return arrays
+    
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray]) -> 'InvoiceBatch':
+        """Rebuild a batch saved with to_arrays"""
+        batch = cls.__new__(cls)
+        meta = json.loads(arrays["meta"].tobytes().decode('utf-8'))
+        batch.rows = meta["rows"]
+        batch.first_number = meta["first_number"]
+        batch.packing = meta.get("packing", {})
+        for name in cls._NUMERIC_ARRAYS:
+            setattr(batch, name, arrays[name])
+        batch._values = {name: [_intern(value) for value in values] for name, values in meta["values"].items()}
+        batch._codes = {name: arrays[f"codes_{name}"] for name in batch._values}
+        return batch
+
+
 class ExcelReader:
     """Class to read and parse invoice data from Excel files"""
     
@@ -69,26 +459,67 @@ class ExcelReader:
         'Product_Service', 'Quantity', 'Unit_Measure', 'Description', 'Unit_Value'
     ]
     
+    # Other columns read when present
+    OPTIONAL_COLUMNS = ['Item', 'Product', 'Unit', 'Unit_Price', 'Currency', 'Port', 'PO']
+    
+    # Explicit dtypes: identifiers and names stay text (RUC keeps leading zeros)
+    INPUT_DTYPES = {
+        'Customer_RUC': str, 'Customer_Name': str, 'Product_Service': str, 'Unit_Measure': str,
+        'Description': str, 'Product': str, 'Unit': str, 'Currency': str, 'Port': str, 'PO': str
+    }
+    
     MAX_PRODUCTS_PER_INVOICE = 20
     
-    def __init__(self):
+    def __init__(self, cache: Optional[WorkbookCache] = None, backend: Optional[str] = None,
+                 validate: bool = True, pack: bool = True):
+        """
+        Args:
+            cache: Optional cache of parsed workbooks; unchanged files are
+                loaded from it instead of being parsed again
+            backend: Input backend name (see input_backends); by default it
+                is chosen from the file extension
+            validate: Check every row (RUC/DNI, numbers, units) before
+                building invoices; any error rejects the file
+            pack: Group rows by customer, currency, port and PO (see
+                InvoicePacker) instead of cutting every MAX_PRODUCTS_PER_INVOICE
+                rows regardless of customer
+        """
         self.invoices: Dict[int, Invoice] = {}
         self.file_path: Optional[str] = None
         self.errors: List[str] = []
+        self.file_errors: Dict[str, List[str]] = {}
+        self.cache = cache
+        self.backend = backend
+        self.validator = RowValidator(self.REQUIRED_COLUMNS) if validate else None
+        self.validation_report: Optional[ValidationReport] = None
+        self.packer = InvoicePacker(self.MAX_PRODUCTS_PER_INVOICE) if pack else None
+        self.packing_stats: Dict[str, int] = {}
+        # Diferencias con la lectura anterior del mismo archivo (load_excel, iter_invoices)
+        self.delta: Optional[ParseDelta] = None
+        self._snapshot: Optional[ParseSnapshot] = None
     
     def load_excel(self, file_path: str) -> bool:
         """
         Load invoice data from an Excel file
         
+        Loading the same file again diffs it against the previous parse:
+        invoices keep their numbers, unchanged ones are reused instead of
+        rebuilt, and delta lists the new, changed, unchanged and removed
+        invoice numbers (delta.pending is what must be regenerated and sent).
+        
         Args:
             file_path: Path to the Excel file
             
         Returns:
             bool: True if file was loaded successfully, False otherwise
         """
+        tracker = self._tracker(file_path)
         self.file_path = file_path
         self.invoices = {}
         self.errors = []
+        self.validation_report = None
+        self.packing_stats = {}
+        self.delta = None
         
         if not os.path.exists(file_path):
             self.errors.append(f"File not found: {file_path}")
@@ -96,15 +527,30 @@ class ExcelReader:
             return False
         
         try:
-            # Try to read the Excel file
-            df = pd.read_excel(file_path)
+            batch = self._cached_batch(file_path)
+            if batch is None:
+                # Try to read the Excel file
+                df = self._read_frame(file_path)
+                
+                # Check if the required columns exist
+                if not self._validate_columns(df) or not self._validate_rows(df):
+                    return False
+                
+                if self.cache is not None:
+                    # Amounts and packing are computed once, for the cached
+                    # batch, and the invoices are built from it
+                    batch = self._store_batch(file_path, df)
+                elif not self._process_data(df, tracker):
+                    return False
             
-            # Check if the required columns exist
-            if not self._validate_columns(df):
-                return False
+            if batch is not None:
+                self.packing_stats = dict(batch.packing)
+                for invoice in self._batch_invoices(batch, tracker):
+                    self.invoices[invoice.invoice_number] = invoice
             
-            # Process the data
-            return self._process_data(df)
+            self.invoices = dict(sorted(self.invoices.items()))
+            self._finish_tracking(tracker, self.invoices)
+            return True
             
         except Exception as e:
             self.errors.append(f"Error reading Excel file: {str(e)}")
@@ -131,37 +577,524 @@ class ExcelReader:
         
         return True
     
-    def _process_data(self, df: pd.DataFrame) -> bool:
-        """Procesa los datos y separa en facturas de máximo 20 items"""
+    def load_batch(self, file_path: str) -> Optional[InvoiceBatch]:
+        """
+        Load an Excel file into a columnar InvoiceBatch
+        
+        Same split as load_excel, but invoices are not materialised as
+        objects; use it to hold large files in memory.
+        
+        Args:
+            file_path: Path to the Excel file
+            
+        Returns:
+            Optional[InvoiceBatch]: The batch, or None on error (see get_errors())
+        """
+        self.file_path = file_path
+        self.invoices = {}
+        self.errors = []
+        self.validation_report = None
+        self.packing_stats = {}
+        
+        if not os.path.exists(file_path):
+            self.errors.append(f"File not found: {file_path}")
+            logger.error(f"File not found: {file_path}")
+            return None
+        
         try:
-            df = df.fillna('')
-            current_invoice = None
-            item_count = 0
-            
-            for _, row in df.iterrows():
-                # Si no hay factura actual o ya tiene 20 items
-                if current_invoice is None or item_count >= 20:
-                    if current_invoice:
-                        self.invoices[current_invoice.invoice_number] = current_invoice
-                    
-                    # Crear nueva factura con número secuencial
-                    invoice_number = len(self.invoices) + 1
-                    current_invoice = Invoice(invoice_number, row.to_dict())
-                    item_count = 0
-                
-                # Agregar producto
-                current_invoice.add_product(row.to_dict())
-                item_count += 1
+            batch = self._cached_batch(file_path)
+            if batch is not None:
+                self.packing_stats = dict(batch.packing)
+                return batch
+            df = self._read_frame(file_path)
+            if not self._validate_columns(df) or not self._validate_rows(df):
+                return None
+            batch = self._store_batch(file_path, df)
+            self.packing_stats = dict(batch.packing)
+            return batch
+        except Exception as e:
+            self.errors.append(f"Error reading Excel file: {str(e)}")
+            logger.error(f"Error reading Excel file: {str(e)}", exc_info=True)
+            return None
+    
+    @classmethod
+    def expand_paths(cls, source: str) -> List[str]:
+        """
+        Excel files named by source, in sorted order
+        
+        Args:
+            source: A directory (every supported file directly inside it), a glob
+                pattern or a single file path
+        """
+        if os.path.isdir(source):
+            pattern = os.path.join(source, '*')
+        elif any(char in source for char in '*?['):
+            pattern = source
+        else:
+            return [source]
+        return sorted(
+            path for path in glob.glob(pattern)
+            if path.lower().endswith(tuple(supported_extensions())) and os.path.isfile(path)
+            and not os.path.basename(path).startswith('~$')  # Excel lock files
+        )
+    
+    def iter_many(self, source: str, workers: Optional[int] = None) -> Iterator[Invoice]:
+        """
+        Parse several workbooks in a process pool and stream their invoices
+        
+        Each file is parsed into an InvoiceBatch in a worker process (with
+        the same cache, if any); the batches come back in path order and
+        their invoices are numbered consecutively across files.
+        
+        Args:
+            source: Directory, glob pattern or file (see expand_paths)
+            workers: Worker processes (default: CPU count, at most one per file)
             
-            # Agregar última factura
-            if current_invoice:
-                self.invoices[current_invoice.invoice_number] = current_invoice
-                
+        Yields:
+            Invoice: Invoices of every readable file, in path order
+            
+        Raises:
+            ValueError: If source matches no files
+        
+        Files that cannot be read are skipped: their messages are kept in
+        file_errors (by path) and, prefixed with the file name, in get_errors().
+        """
+        self.file_path = source
+        self.invoices = {}
+        self.errors = []
+        self.validation_report = None
+        self.packing_stats = {}
+        self.file_errors = {}
+        
+        paths = self.expand_paths(source)
+        if not paths:
+            self._fail(f"No Excel files found: {source}")
+        
+        workers = max(1, min(workers or os.cpu_count() or 1, len(paths)))
+        options = self._worker_options()
+        pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+        try:
+            if pool is not None:
+                futures = [pool.submit(_parse_workbook, path, options) for path in paths]
+                results = (self._parse_result(future.result) for future in futures)
+            else:
+                results = (self._parse_result(lambda path=path: _parse_workbook(path, options)) for path in paths)
+            
+            next_number = 1
+            for path, (batch, errors) in zip(paths, results):
+                if errors:
+                    self.file_errors[path] = errors
+                    self.errors.extend(f"{os.path.basename(path)}: {error}" for error in errors)
+                    logger.error(f"Skipping {path}: {'; '.join(errors)}")
+                    continue
+                batch.first_number = next_number
+                next_number += len(batch)
+                self.packing_stats = InvoicePacker.merge_stats(self.packing_stats, batch.packing)
+                logger.info(f"Loaded {len(batch)} invoices from {path}")
+                yield from batch.iter_invoices()
+        finally:
+            if pool is not None:
+                pool.shutdown(wait=False, cancel_futures=True)
+    
+    def _worker_options(self) -> Dict[str, Any]:
+        """Picklable settings that rebuild this reader in a worker process (see _parse_workbook)"""
+        options: Dict[str, Any] = {
+            'backend': self.backend,
+            'validate': self.validator is not None,
+            'pack': self.packer is not None
+        }
+        if self.cache is not None:
+            options.update(cache_dir=self.cache.directory, cache_max_bytes=self.cache.max_bytes)
+        return options
+    
+    @staticmethod
+    def _parse_result(get_result) -> Tuple[Optional['InvoiceBatch'], List[str]]:
+        try:
+            return get_result()
+        except Exception as e:
+            return None, [f"Error parsing file: {str(e)}"]
+    
+    def load_many(self, source: str, workers: Optional[int] = None) -> bool:
+        """
+        Load several workbooks in parallel into self.invoices
+        
+        Args:
+            source: Directory, glob pattern or file (see expand_paths)
+            workers: Worker processes
+            
+        Returns:
+            bool: True if every file was loaded; on partial failure the
+            invoices of the readable files are still available
+        """
+        try:
+            invoices = {invoice.invoice_number: invoice for invoice in self.iter_many(source, workers)}
+        except ValueError:
+            return False
+        self.invoices = invoices
+        return not self.errors
+    
+    def iter_invoices(self, file_path: str, block_invoices: int = 250,
+                      changed_only: bool = False) -> Iterator[Invoice]:
+        """
+        Stream invoices from an Excel file with bounded memory
+        
+        Rows are read by the input backend in blocks of
+        block_invoices * MAX_PRODUCTS_PER_INVOICE (openpyxl's read-only
+        iterator for xlsx, chunked readers for CSV and JSONL) and each block is split
+        into invoices as in load_excel (customer packing is done within
+        each block, see packing_stats). Invoices are yielded as soon as
+        their block is processed and are not kept in self.invoices, so
+        memory depends on the block size, not on the file size. Empty rows
+        are skipped. With a cache, an unchanged file already stored by
+        load_excel or load_batch is streamed from it; streaming never
+        writes to the cache.
+        
+        As with load_excel, streaming the same file again keeps invoice
+        numbers from the previous parse and sets delta once the stream is
+        exhausted; invoices of a customer group that spans blocks may
+        report as changed if the previous parse was not streamed.
+        
+        Args:
+            file_path: Path to the Excel file
+            block_invoices: Invoices parsed per block
+            changed_only: Yield only new and changed invoices (delta.pending)
+            
+        Yields:
+            Invoice: Invoices in sheet order, numbered from 1 (or as in the
+            previous parse)
+            
+        Raises:
+            ValueError: If the file is missing, unreadable, lacks required
+            columns or a block fails validation (the messages are also added
+            to get_errors()). Blocks are validated as they are read, so
+            invoices of earlier blocks may already have been yielded.
+        """
+        tracker = self._tracker(file_path)
+        self.file_path = file_path
+        self.invoices = {}
+        self.errors = []
+        self.validation_report = None
+        self.packing_stats = {}
+        self.delta = None
+        
+        if not os.path.exists(file_path):
+            self._fail(f"File not found: {file_path}")
+        
+        try:
+            batch = self._cached_batch(file_path)
+        except OSError as e:
+            self._fail(f"Error reading Excel file: {str(e)}")
+        if batch is not None:
+            self.packing_stats = dict(batch.packing)
+            yield from self._batch_invoices(batch, tracker, changed_only, block_invoices)
+            self._finish_tracking(tracker)
+            return
+        
+        try:
+            backend = get_backend(file_path, self.backend)
+        except ValueError as e:
+            self._fail(str(e))
+        
+        try:
+            block_rows = block_invoices * self.MAX_PRODUCTS_PER_INVOICE
+            first_row = 2
+            for df in backend.iter_frames(file_path, self._input_columns(), self.INPUT_DTYPES, block_rows):
+                if first_row == 2 and not self._validate_columns(df):
+                    raise ValueError(self.errors[-1])
+                if not self._validate_rows(df, first_row):
+                    raise ValueError(self.errors[0])
+                first_row += len(df)
+                yield from self._split_invoices(df, 1, tracker, changed_only)
+        except Exception as e:
+            if not self.errors:
+                self._fail(f"Error processing rows: {str(e)}")
+            raise
+        self._finish_tracking(tracker)
+    
+    def _input_columns(self) -> List[str]:
+        return self.REQUIRED_COLUMNS + [column for column in self.OPTIONAL_COLUMNS
+                                        if column not in self.REQUIRED_COLUMNS]
+    
+    def _read_frame(self, file_path: str) -> pd.DataFrame:
+        """Read the needed columns of a file with its input backend"""
+        backend = get_backend(file_path, self.backend)
+        return backend.read(file_path, self._input_columns(), self.INPUT_DTYPES)
+    
+    def _cache_key(self, file_path: str) -> str:
+        settings = {
+            "max_products": self.MAX_PRODUCTS_PER_INVOICE,
+            "igv_rate": IGV_RATE,
+            "format": InvoiceBatch.FORMAT_VERSION,
+            "packing": list(self.packer.key_columns) if self.packer is not None else None,
+            "backend": get_backend(file_path, self.backend).name,
+            # Un lote guardado sin validar no debe servirse a un lector que valida
+            "validate": self.validator is not None
+        }
+        return self.cache.key(file_path, settings)
+    
+    def _cached_batch(self, file_path: str) -> Optional[InvoiceBatch]:
+        """Parsed workbook from the cache, or None (no cache, miss or changed file)"""
+        if self.cache is None:
+            return None
+        arrays = self.cache.get(self._cache_key(file_path))
+        if arrays is None:
+            return None
+        logger.info(f"Loaded {file_path} from the workbook cache")
+        return InvoiceBatch.from_arrays(arrays)
+    
+    def _store_batch(self, file_path: str, df: pd.DataFrame) -> InvoiceBatch:
+        """Build the columnar batch of a parsed sheet and store it in the cache"""
+        df, starts, stats = self._pack(self._compute_amounts(df))
+        batch = InvoiceBatch(df, self.MAX_PRODUCTS_PER_INVOICE, starts=starts, packing=stats)
+        if self.cache is not None:
+            try:
+                self.cache.put(self._cache_key(file_path), batch.to_arrays())
+            except TypeError as e:
+                logger.info(f"Workbook not cached: {str(e)}")
+        return batch
+    
+    def _fail(self, message: str) -> None:
+        """Record an error and abort streaming"""
+        self.errors.append(message)
+        logger.error(message)
+        raise ValueError(message)
+    
+    def _validate_rows(self, df: pd.DataFrame, first_row: int = 2) -> bool:
+        """
+        Validate all rows in one vectorized pass before any invoice is built
+        
+        Args:
+            df: Rows as read
+            first_row: Sheet row number of the first row of df
+            
+        Returns:
+            bool: True if no row has errors; otherwise the row-indexed report
+            is in validation_report and its first messages in get_errors()
+        """
+        if self.validator is None:
+            return True
+        
+        report = self.validator.validate(df, first_row)
+        if self.validation_report is None or first_row == 2:
+            self.validation_report = report
+        else:
+            self.validation_report.extend(report)
+        
+        if report.ok:
+            return True
+        messages = report.messages(limit=50)
+        self.errors.append(f"Invalid rows: {report}")
+        self.errors.extend(messages)
+        logger.error(f"Validation failed for {self.file_path}: {report}")
+        return False
+    
+    def _process_data(self, df: pd.DataFrame, tracker: Optional[ParseTracker] = None) -> bool:
+        """Procesa los datos y separa en facturas de máximo MAX_PRODUCTS_PER_INVOICE items"""
+        try:
+            for invoice in self._split_invoices(df, 1, tracker):
+                self.invoices[invoice.invoice_number] = invoice
             return True
         except Exception as e:
             self.errors.append(f"Error procesando datos: {str(e)}")
             return False
     
+    def _split_invoices(self, df: pd.DataFrame, first_number: int, tracker: Optional[ParseTracker] = None,
+                        changed_only: bool = False) -> List[Invoice]:
+        """
+        Separa las filas en facturas numeradas desde first_number
+        
+        Con packer las filas se agrupan por cliente, moneda, puerto y PO
+        (InvoicePacker) y cada grupo se corta en el mínimo de facturas; las
+        estadísticas se acumulan en packing_stats. Los productos se
+        construyen desde las columnas, sin recorrer filas con iterrows.
+        
+        Con tracker la numeración la da la lectura anterior y solo se
+        construyen las facturas nuevas o modificadas; las que no cambiaron
+        se reutilizan o, con changed_only, se omiten.
+        """
+        df, starts, stats = self._pack(self._compute_amounts(df))
+        self.packing_stats = InvoicePacker.merge_stats(self.packing_stats, stats)
+        if not len(df):
+            return []
+        
+        if tracker is None:
+            indices = list(range(len(starts)))
+            return self._build_invoices(df, starts, indices, [first_number + i for i in indices])
+        
+        headers = df.iloc[starts]
+        keys = list(zip(*(self._column(headers, column) for column in self._key_columns())))
+        fingerprints = invoice_fingerprints(df['Row_Hash'].to_numpy(dtype=np.uint64), starts)
+        numbers, build, reused = self._plan(tracker, keys, fingerprints, changed_only)
+        built = self._build_invoices(df, starts, build, [numbers[i] for i in build])
+        return self._assemble(build, built, reused)
+    
+    def _build_invoices(self, df: pd.DataFrame, all_starts: np.ndarray, indices: List[int],
+                        numbers: List[int]) -> List[Invoice]:
+        """Construye las facturas indices (ascendentes) de un DataFrame ya repartido"""
+        if not indices:
+            return []
+        if len(indices) < len(all_starts):
+            # Solo las filas de las facturas pedidas
+            all_ends = np.append(all_starts[1:], len(df))
+            rows = np.concatenate([np.arange(all_starts[i], all_ends[i]) for i in indices])
+            df = df.iloc[rows]
+            lengths = all_ends[indices] - all_starts[indices]
+            starts = np.cumsum(lengths) - lengths
+        else:
+            starts = all_starts
+        rows = len(df)
+        
+        # Totales por factura (starts es la fila inicial de cada una)
+        ends = np.append(starts[1:], rows).tolist()
+        subtotals = np.add.reduceat(df['Line_Amount_Cents'].to_numpy(), starts).tolist()
+        igvs = np.add.reduceat(df['IGV_Cents'].to_numpy(), starts).tolist()
+        totals = np.add.reduceat(df['Line_Total_Cents'].to_numpy(), starts).tolist()
+        
+        products = InvoiceProduct.from_columns(
+            self._column(df, 'Item'), self._column(df, 'Product'), self._column(df, 'Unit'),
+            self._numeric_column(df, 'Quantity'), self._numeric_column(df, 'Unit_Price'),
+            df['Line_Amount_Cents'].tolist(), df['IGV_Cents'].tolist(), df['Line_Total_Cents'].tolist()
+        )
+        
+        headers = df.iloc[starts]
+        columns = {column: self._column(headers, column) for column in InvoiceBatch._HEADER_COLUMNS.values()}
+        
+        invoices = []
+        for i, (start, end) in enumerate(zip(starts.tolist(), ends)):
+            invoice = Invoice(numbers[i], {column: values[i] for column, values in columns.items()})
+            invoice.set_products(products[start:end], int(subtotals[i]), int(igvs[i]), int(totals[i]))
+            invoices.append(invoice)
+        return invoices
+    
+    def _key_columns(self) -> List[str]:
+        """Columnas que identifican el grupo de una factura entre lecturas"""
+        return list(self.packer.key_columns if self.packer is not None else PACKING_KEY)
+    
+    def _tracker(self, file_path: str) -> ParseTracker:
+        """Comparación con la lectura anterior del mismo archivo (o con ninguna)"""
+        path = os.path.abspath(file_path)
+        if self._snapshot is not None and self._snapshot.path == path:
+            return self._snapshot.tracker()
+        return ParseSnapshot(path).tracker()
+    
+    def _finish_tracking(self, tracker: ParseTracker, invoices: Optional[Dict[int, Invoice]] = None) -> None:
+        reloaded = bool(tracker.previous.entries)
+        self.delta, self._snapshot = tracker.finish(invoices)
+        if reloaded:
+            logger.info(f"Reloaded {self.file_path}: {self.delta}")
+    
+    @staticmethod
+    def _plan(tracker: ParseTracker, keys: List[Tuple[Any, ...]], fingerprints: List[str],
+              changed_only: bool) -> Tuple[List[int], List[int], Dict[int, Invoice]]:
+        """
+        Numera las facturas según la lectura anterior
+        
+        Returns:
+            (número de cada factura, índices a construir, facturas reutilizadas por índice)
+        """
+        results = tracker.add(keys, fingerprints)
+        build: List[int] = []
+        reused: Dict[int, Invoice] = {}
+        for index, (number, status) in enumerate(results):
+            if status == UNCHANGED:
+                if changed_only:
+                    continue
+                previous = tracker.previous.invoices.get(number)
+                if previous is not None:
+                    reused[index] = previous
+                    continue
+            build.append(index)
+        return [number for number, _ in results], build, reused
+    
+    @staticmethod
+    def _assemble(build: List[int], built: List[Invoice], reused: Dict[int, Invoice]) -> List[Invoice]:
+        """Facturas construidas y reutilizadas, en orden de lectura"""
+        invoices = dict(zip(build, built))
+        invoices.update(reused)
+        return [invoices[index] for index in sorted(invoices)]
+    
+    def _batch_invoices(self, batch: InvoiceBatch, tracker: ParseTracker, changed_only: bool = False,
+                        block_invoices: int = 250) -> Iterator[Invoice]:
+        """Facturas de un libro en caché, numeradas y filtradas como en _split_invoices"""
+        numbers, build, reused = self._plan(tracker, batch.header_keys(self._key_columns()),
+                                            batch.fingerprints(), changed_only)
+        built = zip(build, batch.iter_invoices(block_invoices, indices=build))
+        for index, invoice in heapq.merge(built, sorted(reused.items()), key=lambda pair: pair[0]):
+            if index not in reused:
+                invoice.renumber(numbers[index])
+            yield invoice
+    
+    def _pack(self, df: pd.DataFrame) -> Tuple[pd.DataFrame, np.ndarray, Dict[str, int]]:
+        """
+        Order rows into invoices
+        
+        Returns:
+            (rows in invoice order, first row of each invoice, packing stats;
+            empty without packing)
+        """
+        if self.packer is None:
+            return df, np.arange(0, len(df), self.MAX_PRODUCTS_PER_INVOICE, dtype=np.int64), {}
+        df, starts, stats = self.packer.pack(df)
+        if stats["documents_saved"] > 0 or stats["mixed_documents"]:
+            logger.debug(
+                f"Packed {stats['rows']} rows of {stats['groups']} customer groups into "
+                f"{stats['documents']} invoices ({stats['documents_saved']} saved, "
+                f"{stats['mixed_documents']} mixed invoices avoided)"
+            )
+        return df, starts, stats
+    
+    @staticmethod
+    def _column(df: pd.DataFrame, name: str) -> List[Any]:
+        """Column values as a list, with blanks as '' (missing column -> all '')"""
+        if name not in df.columns:
+            return [''] * len(df)
+        return df[name].fillna('').tolist()
+    
+    @staticmethod
+    def _numeric_column(df: pd.DataFrame, name: str) -> List[float]:
+        """Numeric column as a list of floats, with blanks as 0"""
+        if name not in df.columns:
+            return [0.0] * len(df)
+        values = pd.to_numeric(df[name], errors='coerce')
+        return np.nan_to_num(values.to_numpy(dtype=float)).tolist()
+    
+    def _compute_amounts(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Calculate line amounts, IGV and line totals in integer cents for the
+        whole sheet at once
+        
+        Args:
+            df: DataFrame with Quantity and Unit_Price columns
+            
+        Returns:
+            pd.DataFrame: Copy with Row_Hash (content hash of the input
+            columns), Line_Amount_Cents, IGV_Cents and Line_Total_Cents columns
+        """
+        quantity = pd.to_numeric(df.get('Quantity', 0), errors='coerce')
+        unit_price = pd.to_numeric(df.get('Unit_Price', 0), errors='coerce')
+        quantity = np.nan_to_num(np.asarray(quantity, dtype=float).reshape(-1))
+        unit_price = np.nan_to_num(np.asarray(unit_price, dtype=float).reshape(-1))
+        quantity = np.broadcast_to(quantity, len(df))
+        unit_price = np.broadcast_to(unit_price, len(df))
+        
+        qty_fixed = np.rint(quantity * QUANTITY_SCALE).astype(np.int64)
+        price_fixed = np.rint(unit_price * PRICE_SCALE).astype(np.int64)
+        
+        # Con importes muy grandes el producto no cabe en int64: enteros de Python
+        if len(df) and float(np.max(np.abs(quantity) * np.abs(unit_price))) * QUANTITY_SCALE * PRICE_SCALE >= 2 ** 62:
+            qty_fixed = qty_fixed.astype(object)
+            price_fixed = price_fixed.astype(object)
+        
+        line_cents = (qty_fixed * price_fixed + _CENTS_DIVISOR // 2) // _CENTS_DIVISOR
+        igv_cents = (line_cents * IGV_RATE + 50) // 100
+        
+        df = df.copy()
+        df['Row_Hash'] = row_hashes(df, self._input_columns())
+        df['Line_Amount_Cents'] = line_cents
+        df['IGV_Cents'] = igv_cents
+        df['Line_Total_Cents'] = line_cents + igv_cents
+        return df
+    
     def get_invoices(self) -> List[Invoice]:
         """
         Get the list of all invoices
@@ -192,6 +1125,19 @@ class ExcelReader:
         """
         return self.errors
 
+def _parse_workbook(path: str, options: Dict[str, Any]) -> Tuple[Optional[InvoiceBatch], List[str]]:
+    """Worker for ExcelReader.iter_many: parse one file into a batch, or return its errors
+    
+    options comes from ExcelReader._worker_options, so the worker reads with
+    the same backend, validation, packing and cache as the calling reader.
+    """
+    options = dict(options)
+    cache_dir = options.pop('cache_dir', None)
+    cache = WorkbookCache(cache_dir, options.pop('cache_max_bytes', 0)) if cache_dir else None
+    reader = ExcelReader(cache=cache, **options)
+    batch = reader.load_batch(path)
+    return batch, ([] if batch is not None else reader.get_errors())
+
 # Example usage
 if __name__ == "__main__":
     # Create an instance of the ExcelReader
@@ -214,4 +1160,3 @@ if __name__ == "__main__":
         print("Failed to load invoices:")
         for error in reader.get_errors():
             print(f"- {error}")
-
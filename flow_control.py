@@ -0,0 +1,187 @@
+import logging
+import random
+import threading
+import time
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(Exception):
+    """El circuito de un endpoint sigue abierto y no se puede esperar más"""
+    pass
+
+
+class AdaptiveLimiter:
+    """
+    Límite de peticiones simultáneas por endpoint con control AIMD.
+
+    Cada respuesta correcta sube el límite en 1/limit (≈ +1 por ventana
+    completa); cada señal de saturación (429, 5xx, timeout) lo reduce a la
+    mitad, como máximo una vez por decrease_interval para no castigar varias
+    veces la misma ráfaga.
+    """
+
+    def __init__(self, name: str, initial: float = 4, minimum: float = 1, maximum: float = 10,
+                 decrease_factor: float = 0.5, decrease_interval: float = 1.0):
+        self.name = name
+        self.limit = float(min(max(initial, minimum), maximum))
+        self.minimum = minimum
+        self.maximum = maximum
+        self.decrease_factor = decrease_factor
+        self.decrease_interval = decrease_interval
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self) -> None:
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+
+    def release(self) -> None:
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+
+    def on_success(self) -> None:
+        with self._cond:
+            if self.limit < self.maximum:
+                self.limit = min(self.limit + 1 / self.limit, self.maximum)
+                self._cond.notify()
+
+    def on_overload(self) -> None:
+        with self._cond:
+            now = time.monotonic()
+            if now - self._last_decrease < self.decrease_interval:
+                return
+            self._last_decrease = now
+            previous = self.limit
+            self.limit = max(self.limit * self.decrease_factor, self.minimum)
+        if int(previous) != int(self.limit):
+            logger.info(f"Concurrencia de {self.name} reducida de {int(previous)} a {int(self.limit)}")
+
+    def state(self) -> Dict[str, Any]:
+        with self._cond:
+            return {"limit": int(self.limit), "in_flight": self.in_flight}
+
+
+class CircuitBreaker:
+    """
+    Circuito por endpoint: tras varios fallos de saturación seguidos se abre
+    y las peticiones esperan (pausan el lote) en lugar de fallar.
+
+    Al terminar la pausa pasa a semiabierto y deja pasar una sola petición de
+    prueba; si falla, vuelve a abrirse con una pausa el doble de larga.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 10.0,
+                 max_reset_timeout: float = 300.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.base_reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self.reset_timeout = reset_timeout
+        self.status = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+        self._cond = threading.Condition()
+
+    def wait_until_allowed(self, max_wait: Optional[float] = None,
+                           cancel_event: Optional[threading.Event] = None) -> None:
+        """
+        Bloquea mientras el circuito está abierto
+
+        Raises:
+            CircuitOpenError: Si se supera max_wait o se activa cancel_event
+        """
+        deadline = time.monotonic() + max_wait if max_wait is not None else None
+        with self._cond:
+            while True:
+                if self.status == self.CLOSED:
+                    return
+                if self.status == self.OPEN and time.monotonic() >= self.opened_at + self.reset_timeout:
+                    self.status = self.HALF_OPEN
+                    logger.info(f"Circuito de {self.name} semiabierto: enviando petición de prueba")
+                if self.status == self.HALF_OPEN and not self._probe_in_flight:
+                    self._probe_in_flight = True
+                    return
+                if cancel_event is not None and cancel_event.is_set():
+                    raise CircuitOpenError(f"Circuito de {self.name} abierto: espera cancelada")
+                if deadline is not None and time.monotonic() >= deadline:
+                    raise CircuitOpenError(f"Circuito de {self.name} abierto tras {max_wait:.0f}s de espera")
+
+                wait = 0.5
+                if self.status == self.OPEN:
+                    wait = min(wait, max(self.opened_at + self.reset_timeout - time.monotonic(), 0.01))
+                self._cond.wait(wait)
+
+    def on_success(self) -> None:
+        with self._cond:
+            if self.status != self.CLOSED:
+                logger.warning(f"Circuito de {self.name} cerrado: el servicio responde de nuevo")
+            self.status = self.CLOSED
+            self.failures = 0
+            self.reset_timeout = self.base_reset_timeout
+            self._probe_in_flight = False
+            self._cond.notify_all()
+
+    def on_failure(self) -> None:
+        with self._cond:
+            self.failures += 1
+            if self.status == self.HALF_OPEN:
+                self.reset_timeout = min(self.reset_timeout * 2, self.max_reset_timeout)
+                self._open()
+            elif self.status == self.CLOSED and self.failures >= self.failure_threshold:
+                self._open()
+
+    def release_probe(self) -> None:
+        """Libera la petición de prueba cuando terminó sin señal de éxito ni de saturación"""
+        with self._cond:
+            self._probe_in_flight = False
+            self._cond.notify_all()
+
+    def _open(self) -> None:
+        self.status = self.OPEN
+        self.opened_at = time.monotonic()
+        self._probe_in_flight = False
+        logger.warning(
+            f"Circuito de {self.name} abierto tras {self.failures} fallos: "
+            f"pausa de {self.reset_timeout:.0f}s"
+        )
+        self._cond.notify_all()
+
+    def state(self) -> Dict[str, Any]:
+        with self._cond:
+            remaining = 0.0
+            if self.status == self.OPEN:
+                remaining = max(self.opened_at + self.reset_timeout - time.monotonic(), 0.0)
+            return {"breaker": self.status, "failures": self.failures, "reopens_in": round(remaining, 1)}
+
+
+def backoff_delay(attempt: int, base: float = 0.5, cap: float = 30.0,
+                  retry_after: Optional[float] = None) -> float:
+    """
+    Espera antes del reintento (backoff exponencial con jitter completo)
+
+    Args:
+        attempt: Número de reintento empezando en 0
+        retry_after: Valor de la cabecera Retry-After, si la hubo
+    """
+    delay = random.uniform(0, min(cap, base * (2 ** attempt)))
+    if retry_after is not None:
+        delay = max(delay, min(retry_after, cap))
+    return delay
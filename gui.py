@@ -5,9 +5,14 @@ from tkinter.scrolledtext import ScrolledText
 import threading
 import logging
 from typing import Callable, Dict, Any, Optional
-from excel_reader import ExcelReader
+from excel_reader import ExcelReader, format_cents
 from sunat_automation import SunatAutomation
 from sunat_api import SunatAPI
+from zip_archiver import ZipArchiver
+from run_journal import RunJournal
+from workbook_cache import WorkbookCache
+from ticket_poller import TicketPoller
+from xml_signer import SunatXMLSigner
 import json
 
 # Configure logger
@@ -28,10 +33,22 @@ class AutomationError(Exception):
 class SunatInvoiceAutomationGUI(tk.Tk):
     """Main GUI class for the SUNAT Invoice Automation application"""
     
-    def __init__(self, sunat_api: SunatAPI):
+    def __init__(self, sunat_api: SunatAPI, ticket_poller: Optional[TicketPoller] = None,
+                 signer: Optional[SunatXMLSigner] = None):
         super().__init__()
         
         self.sunat_api = sunat_api
+        self.ticket_poller = ticket_poller
+        # Firma de los resúmenes diarios (SUNAT rechaza los que no van firmados)
+        self.signer = signer
+        
+        # Libros ya leídos: reabrir un Excel sin cambios no lo vuelve a interpretar
+        self.workbook_cache = WorkbookCache()
+        
+        # El lector se conserva entre ejecuciones: al volver a procesar el mismo
+        # Excel solo se regeneran y envían los comprobantes nuevos o modificados
+        self.excel_reader = ExcelReader(cache=self.workbook_cache)
+        self._clean_run_path: Optional[str] = None
         
         self.title("SUNAT Facturación Electrónica")
         self.geometry("1000x800")
@@ -51,6 +68,7 @@ class SunatInvoiceAutomationGUI(tk.Tk):
         
         # Variables de control
         self.cancel_requested = False
+        self.cancel_event = threading.Event()
         self.processing = False
         
         # Barra de estado
@@ -188,6 +206,7 @@ class SunatInvoiceAutomationGUI(tk.Tk):
         excel_path_entry = ttk.Entry(file_frame, textvariable=self.excel_path_var)
         excel_path_entry.grid(row=0, column=1, sticky=tk.EW, padx=5, pady=5)
         ttk.Button(file_frame, text="Browse...", command=self._browse_excel_file).grid(row=0, column=2, padx=5, pady=5)
+        ttk.Button(file_frame, text="Carpeta...", command=self._browse_excel_dir).grid(row=0, column=3, padx=5, pady=5)
         
         # Output Directory Selection
         ttk.Label(file_frame, text="Output Directory:").grid(row=1, column=0, sticky=tk.W, padx=5, pady=5)
@@ -200,11 +219,18 @@ class SunatInvoiceAutomationGUI(tk.Tk):
         """Open file dialog to select Excel file"""
         filename = filedialog.askopenfilename(
             title="Select Excel File",
-            filetypes=[("Excel Files", "*.xlsx *.xls"), ("All Files", "*.*")]
+            filetypes=[("Excel Files", "*.xlsx *.xls"), ("CSV / Parquet / JSONL", "*.csv *.parquet *.jsonl"),
+                       ("All Files", "*.*")]
         )
         if filename:
             self.excel_path_var.set(filename)
     
+    def _browse_excel_dir(self):
+        """Seleccionar una carpeta: se cargan todos sus libros Excel"""
+        dirname = filedialog.askdirectory(title="Seleccionar carpeta de libros Excel")
+        if dirname:
+            self.excel_path_var.set(dirname)
+    
     def _browse_output_dir(self):
         """Open directory dialog to select output directory"""
         dirname = filedialog.askdirectory(title="Select Output Directory")
@@ -216,6 +242,14 @@ class SunatInvoiceAutomationGUI(tk.Tk):
         button_frame = ttk.Frame(self)
         button_frame.grid(row=3, column=0, sticky=tk.EW, padx=10, pady=10)
         
+        # Reanudar desde el diario de la última ejecución sobre el mismo Excel
+        self.resume_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            button_frame,
+            text="Reanudar última ejecución",
+            variable=self.resume_var
+        ).grid(row=0, column=0, padx=5, pady=5)
+        
         # Start button
         self.start_button = ttk.Button(
             button_frame, 
@@ -283,32 +317,64 @@ class SunatInvoiceAutomationGUI(tk.Tk):
         """Ejecutar el procesamiento de documentos"""
         try:
             self._update_progress("Cargando archivo Excel...")
-            reader = ExcelReader()
-            if not reader.load_excel(input_data['excel_path']):
-                raise AutomationError("Error cargando archivo Excel:\n" + 
-                              "\n".join(reader.get_errors()))
+            reader = self.excel_reader
+            doc_type = "factura" if input_data['document_type'] == "FACTURA" else "boleta"
+            if doc_type == "boleta" and self.signer is None:
+                raise AutomationError("Los resúmenes diarios de boletas deben ir firmados: "
+                                      "falta el certificado digital (certs/cert.pem y certs/key.pem)")
+            
+            # Una carpeta o patrón (*.xlsx) carga varios libros en paralelo
+            excel_path = input_data['excel_path']
+            multiple = os.path.isdir(excel_path) or any(char in excel_path for char in '*?[')
+            
+            # Solo si la ejecución anterior de este archivo terminó sin errores
+            # se pueden omitir los comprobantes que no cambiaron
+            changed_only = not multiple and excel_path == self._clean_run_path
+            self._clean_run_path = None
+            
+            # Las facturas se leen en streaming y se envían a medida que se leen;
+            # los resúmenes diarios necesitan todas las boletas agrupadas por fecha
+            if doc_type == "boleta":
+                loaded = reader.load_many(excel_path) if multiple else reader.load_excel(excel_path)
+                if not loaded and not reader.get_invoices():
+                    raise AutomationError("Error cargando archivo Excel:\n" + 
+                                  "\n".join(reader.get_errors()))
+                documents = reader.get_invoices()
+                if changed_only and reader.delta is not None:
+                    documents = [reader.invoices[number] for number in reader.delta.pending]
+            elif multiple:
+                documents = reader.iter_many(excel_path)
+            else:
+                documents = reader.iter_invoices(excel_path, changed_only=changed_only)
             
             if self.cancel_requested:
                 raise AutomationError("Proceso cancelado por el usuario")
                 
             self._update_progress("Iniciando proceso con SUNAT API...")
             
-            # Obtener token primero
+            # Guardar los ZIP enviados en el directorio de salida (en segundo plano)
+            if input_data.get('output_dir'):
+                self.sunat_api.archiver = ZipArchiver(input_data['output_dir'])
+            
+            # Diario de avance: al reanudar se omiten los comprobantes ya terminados
+            self.sunat_api.journal = RunJournal(
+                RunJournal.path_for(input_data['excel_path']),
+                resume=input_data.get('resume', self.resume_var.get())
+            )
+            
+            # Cancelar también interrumpe las pausas por circuito abierto y los reintentos
+            self.sunat_api.session.cancel_event = self.cancel_event
+            
+            # Obtener token primero (se reutiliza el de la caché si sigue vigente)
             if not self.sunat_api.get_token():
                 raise AutomationError("No se pudo obtener token de SUNAT")
             
-            documents = reader.get_documents()
-            total_docs = len(documents)
+            total_docs = len(documents) if doc_type == "boleta" else 0
             processed = 0
+            skipped = 0
             errors = []
             
-            for idx, doc in enumerate(documents, 1):
-                if self.cancel_requested:
-                    raise AutomationError("Proceso cancelado por el usuario")
-                    
-                doc_type = "factura" if input_data['document_type'] == "FACTURA" else "boleta"
-                self._update_progress(f"Procesando {doc_type} {idx}/{total_docs} - #{doc.number}")
-                
+            def process_document(doc) -> Dict[str, Any]:
                 # Validar comprobante primero
                 validacion = self.sunat_api.validar_comprobante(
                     tipo=doc_type.upper(),
@@ -319,18 +385,92 @@ class SunatInvoiceAutomationGUI(tk.Tk):
                 )
                 
                 if not validacion['success']:
-                    errors.append(f"Error validando {doc_type} #{doc.number}: {validacion['message']}")
-                    continue
+                    return {"success": False, "error": f"validando: {validacion['message']}"}
                 
                 # Si la validación es exitosa, crear el comprobante
                 result = self.sunat_api.create_invoice(doc)
-                if result['success']:
-                    processed += 1
-                else:
-                    errors.append(f"Error creando {doc_type} #{doc.number}: {result['error']}")
+                if not result['success']:
+                    result['error'] = f"creando: {result['error']}"
+                return result
+            
+            if doc_type == "boleta":
+                # Las boletas se declaran en Resúmenes Diarios (un envío por cada 500)
+                self._update_progress(f"Enviando {total_docs} boletas en resúmenes diarios...")
+                failed = 0
+                for summary in self.sunat_api.send_daily_summary(documents, signer=self.signer):
+                    if summary['success']:
+                        processed += len(summary['documents'])
+                        logger.info(f"Resumen {summary['summary_id']}: ticket {summary['ticket']}")
+                    else:
+                        failed += len(summary['documents'])
+                        errors.append(f"Error {summary['error']} "
+                                      f"(resumen {summary['summary_id'] or ', '.join(summary['documents'])})")
+                if self.ticket_poller:
+                    self.ticket_poller.notify()
+                # Las boletas que no entraron en ningún resumen ya estaban enviadas
+                skipped = total_docs - processed - failed
+                processed += skipped
+            else:
+                batch = self.sunat_api.submit_batch(
+                    documents,
+                    workers=input_data.get('workers', 4),
+                    send=process_document,
+                    cancel_event=self.cancel_event,
+                    retain_results=False
+                )
+            
+                for idx, item in enumerate(batch.as_completed(), 1):
+                    total_docs = idx
+                    self._update_progress(
+                        f"Procesando {doc_type} {idx} - #{item.invoice.invoice_number}"
+                        f"{self._transport_status()}"
+                    )
+                    if item.skipped:
+                        skipped += 1
+                        processed += 1
+                    elif item.success:
+                        processed += 1
+                    elif not item.cancelled:
+                        errors.append(f"Error {item.error} ({doc_type} #{item.invoice.invoice_number})")
+                
+                if batch.feed_error:
+                    raise AutomationError("Error leyendo archivo Excel:\n" + 
+                                  "\n".join(reader.get_errors() or [str(batch.feed_error)]))
+            
+            if skipped:
+                logger.info(f"{skipped} documentos omitidos: ya enviados a SUNAT sin cambios")
+
+            if reader.delta is not None and changed_only:
+                logger.info(f"Cambios desde la ejecución anterior: {reader.delta}")
+            
+            packing = reader.packing_stats
+            if packing.get("documents_saved", 0) > 0:
+                logger.info(
+                    f"Agrupación por cliente: {packing['documents']} comprobantes en lugar de "
+                    f"{packing['sequential_documents']} ({packing['documents_saved']} ahorrados)"
+                )
+            
+            for endpoint, state in self.sunat_api.transport_state().items():
+                logger.info(
+                    f"Endpoint {endpoint}: concurrencia {state['limit']}, "
+                    f"circuito {state['breaker']}, {state['retries']} reintentos"
+                )
+            
+            if self.sunat_api.validation_cache:
+                stats = self.sunat_api.validation_cache.stats()
+                logger.info(f"Caché de validación: {stats['hits']} aciertos, {stats['misses']} consultas a SUNAT")
+                self.sunat_api.validation_cache.save()
+            
+            # Libros de la carpeta que no se pudieron leer
+            for path, file_errors in reader.file_errors.items():
+                errors.append(f"Archivo {os.path.basename(path)} omitido: {'; '.join(file_errors)}")
+            
+            if self.cancel_requested:
+                raise AutomationError("Proceso cancelado por el usuario")
             
             # Mostrar resumen
-            if processed == total_docs:
+            if processed == total_docs and not reader.file_errors:
+                self._clean_run_path = excel_path
                 self._update_progress("Proceso completado exitosamente")
                 messagebox.showinfo("Éxito", f"Se procesaron {total_docs} documentos correctamente")
             else:
@@ -341,8 +481,16 @@ class SunatInvoiceAutomationGUI(tk.Tk):
         except Exception as e:
             self._handle_error(e, "procesamiento")
         finally:
+            if self.sunat_api.archiver:
+                self.sunat_api.archiver.close()
+                self.sunat_api.archiver = None
+            if self.sunat_api.journal:
+                self.sunat_api.journal.close()
+                self.sunat_api.journal = None
+            self.sunat_api.session.cancel_event = None
             self.processing = False
             self.cancel_requested = False
+            self.cancel_event.clear()
             self.start_button.config(state=tk.NORMAL)
             self.cancel_button.config(state=tk.DISABLED)
             self.status_var.set("Listo")
@@ -382,6 +530,18 @@ class SunatInvoiceAutomationGUI(tk.Tk):
         self.status_var.set(message)
         logger.info(message)
 
+    def _transport_status(self) -> str:
+        """Texto de estado cuando algún endpoint está pausado o limitado"""
+        notes = []
+        for endpoint, state in self.sunat_api.transport_state().items():
+            if state['breaker'] == "open":
+                notes.append(f"{endpoint} en pausa ({state['reopens_in']:.0f}s)")
+            elif state['breaker'] == "half_open":
+                notes.append(f"{endpoint} probando reconexión")
+            elif state['limit'] < self.sunat_api.session.pool_maxsize:
+                notes.append(f"{endpoint} limitado a {state['limit']}")
+        return f" [{'; '.join(notes)}]" if notes else ""
+
     def _save_credentials(self):
         """Guardar credenciales en archivo de configuración"""
         try:
@@ -417,6 +577,7 @@ class SunatInvoiceAutomationGUI(tk.Tk):
             ):
                 logger.info("Cancelación solicitada por el usuario")
                 self.cancel_requested = True
+                self.cancel_event.set()
                 self.cancel_button.config(state=tk.DISABLED)
                 self.status_var.set("Cancelando...")
 
@@ -470,19 +631,16 @@ ITEMS:
 """
 
         # Items
-        total = 0
         for idx, product in enumerate(invoice.products, 1):
-            line_total = product.quantity * product.unit_value
-            total += line_total
             preview += f"""
     {idx}. {product.description}
        Cantidad: {product.quantity} {product.unit_measure}
        Precio unitario: {invoice.currency} {product.unit_value:.2f}
-       Subtotal: {invoice.currency} {line_total:.2f}
+       Subtotal: {invoice.currency} {format_cents(product.line_amount_cents)}
     {'='*50}"""
 
         # Total
-        preview += f"\nTOTAL: {invoice.currency} {total:.2f}"
+        preview += f"\nTOTAL: {invoice.currency} {format_cents(invoice.subtotal_cents)}"
 
         self.preview_text.insert(1.0, preview)
         self.preview_text.config(state=tk.DISABLED)
@@ -0,0 +1,228 @@
+import importlib.util
+import logging
+import os
+from itertools import islice
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+def _installed(*modules: str) -> bool:
+    return any(importlib.util.find_spec(module) is not None for module in modules)
+
+
+def _as_text(value: Any) -> Any:
+    """Texto de una celda; los números enteros leídos como float pierden el '.0'"""
+    if value is None or isinstance(value, str) or pd.isna(value):
+        return value
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+class InputBackend:
+    """
+    Lectura de un formato de entrada a DataFrame para ExcelReader.
+
+    Cada backend lee solo las columnas pedidas (las que falten se omiten;
+    ExcelReader valida después las obligatorias) con los tipos indicados, y
+    entrega el mismo DataFrame que pd.read_excel, de modo que el reparto en
+    facturas es común a todos.
+    """
+
+    name = ""
+    extensions: Sequence[str] = ()
+
+    def available(self) -> bool:
+        """True si sus dependencias opcionales están instaladas"""
+        return True
+
+    def read(self, path: str, columns: Sequence[str], dtypes: Dict[str, Any]) -> pd.DataFrame:
+        """Lee el archivo completo"""
+        raise NotImplementedError
+
+    def iter_frames(self, path: str, columns: Sequence[str], dtypes: Dict[str, Any],
+                    block_rows: int) -> Iterator[pd.DataFrame]:
+        """
+        Lee el archivo en bloques de exactamente block_rows filas (salvo el
+        último); por defecto lee todo y lo reparte
+        """
+        df = self.read(path, columns, dtypes)
+        for start in range(0, max(len(df), 1), block_rows):
+            yield df.iloc[start:start + block_rows]
+
+    @staticmethod
+    def _select(df: pd.DataFrame, columns: Sequence[str], dtypes: Dict[str, Any]) -> pd.DataFrame:
+        """Columnas pedidas presentes, con los tipos de texto aplicados a valores no vacíos"""
+        df = df[[column for column in df.columns if column in columns]]
+        converted = {
+            column: df[column].map(_as_text) for column, dtype in dtypes.items()
+            if dtype is str and column in df.columns
+        }
+        return df.assign(**converted) if converted else df
+
+
+class OpenpyxlBackend(InputBackend):
+    """xlsx con openpyxl (motor por defecto de pandas); streaming en modo read-only"""
+
+    name = "openpyxl"
+    extensions = (".xlsx", ".xlsm")
+
+    def read(self, path: str, columns: Sequence[str], dtypes: Dict[str, Any]) -> pd.DataFrame:
+        df = pd.read_excel(path, engine="openpyxl", usecols=lambda column: column in columns, dtype=dtypes)
+        return self._select(df, columns, dtypes)
+
+    def iter_frames(self, path: str, columns: Sequence[str], dtypes: Dict[str, Any],
+                    block_rows: int) -> Iterator[pd.DataFrame]:
+        from openpyxl import load_workbook
+
+        workbook = load_workbook(path, read_only=True, data_only=True)
+        try:
+            # Las filas totalmente vacías se omiten
+            rows = (row for row in workbook.active.iter_rows(values_only=True)
+                    if any(value is not None for value in row))
+            header = next(rows, None)
+            if header is None:
+                return
+            names = [str(name) if name is not None else f"Unnamed: {i}" for i, name in enumerate(header)]
+            wanted = [i for i, name in enumerate(names) if name in columns]
+            names = [names[i] for i in wanted]
+
+            first = True
+            while True:
+                block = [[row[i] if i < len(row) else None for i in wanted] for row in islice(rows, block_rows)]
+                if not block and not first:
+                    break
+                first = False
+                yield self._select(pd.DataFrame(block, columns=names), columns, dtypes)
+                if len(block) < block_rows:
+                    break
+        finally:
+            workbook.close()
+
+
+class CalamineBackend(InputBackend):
+    """xlsx/xls/ods con el motor nativo calamine (requiere python-calamine)"""
+
+    name = "calamine"
+    extensions = (".xlsx", ".xlsm", ".xls", ".xlsb", ".ods")
+
+    def available(self) -> bool:
+        return _installed("python_calamine")
+
+    def read(self, path: str, columns: Sequence[str], dtypes: Dict[str, Any]) -> pd.DataFrame:
+        df = pd.read_excel(path, engine="calamine", usecols=lambda column: column in columns)
+        return self._select(df, columns, dtypes)
+
+
+class CsvBackend(InputBackend):
+    """CSV (exportación del ERP); usa el motor de pyarrow si está instalado"""
+
+    name = "csv"
+    extensions = (".csv", ".txt")
+
+    def __init__(self, encoding: str = "utf-8-sig", sep: Optional[str] = None):
+        """
+        Args:
+            encoding: Codificación (utf-8-sig descarta el BOM de Excel)
+            sep: Separador; None lo detecta entre ',' y ';' en la cabecera
+        """
+        self.encoding = encoding
+        self.sep = sep
+
+    def _options(self, path: str, columns: Sequence[str], dtypes: Dict[str, Any]) -> Dict[str, Any]:
+        with open(path, 'r', encoding=self.encoding) as f:
+            header = f.readline().rstrip('\r\n')
+        sep = self.sep or (';' if header.count(';') > header.count(',') else ',')
+        present = [name.strip().strip('"') for name in header.split(sep)]
+        usecols = [name for name in present if name in columns]
+        return {
+            "sep": sep, "encoding": self.encoding, "usecols": usecols,
+            "dtype": {column: dtype for column, dtype in dtypes.items() if column in usecols}
+        }
+
+    def read(self, path: str, columns: Sequence[str], dtypes: Dict[str, Any]) -> pd.DataFrame:
+        options = self._options(path, columns, dtypes)
+        engine = "pyarrow" if _installed("pyarrow") else "c"
+        return pd.read_csv(path, engine=engine, **options)
+
+    def iter_frames(self, path: str, columns: Sequence[str], dtypes: Dict[str, Any],
+                    block_rows: int) -> Iterator[pd.DataFrame]:
+        # El motor pyarrow no admite chunksize; el de C sí lee por bloques
+        with pd.read_csv(path, chunksize=block_rows, **self._options(path, columns, dtypes)) as reader:
+            yield from reader
+
+
+class ParquetBackend(InputBackend):
+    """Parquet (requiere pyarrow o fastparquet); lee solo las columnas pedidas"""
+
+    name = "parquet"
+    extensions = (".parquet", ".pq")
+
+    def available(self) -> bool:
+        return _installed("pyarrow", "fastparquet")
+
+    def read(self, path: str, columns: Sequence[str], dtypes: Dict[str, Any]) -> pd.DataFrame:
+        if _installed("pyarrow"):
+            import pyarrow.parquet as pq
+            present = set(pq.read_schema(path).names)
+            df = pd.read_parquet(path, columns=[column for column in columns if column in present])
+        else:
+            df = pd.read_parquet(path)
+        return self._select(df, columns, dtypes)
+
+
+class JsonLinesBackend(InputBackend):
+    """JSON Lines: un objeto por línea con los nombres de columna como claves"""
+
+    name = "jsonl"
+    extensions = (".jsonl", ".ndjson")
+
+    def read(self, path: str, columns: Sequence[str], dtypes: Dict[str, Any]) -> pd.DataFrame:
+        return self._select(pd.read_json(path, lines=True, dtype=False), columns, dtypes)
+
+    def iter_frames(self, path: str, columns: Sequence[str], dtypes: Dict[str, Any],
+                    block_rows: int) -> Iterator[pd.DataFrame]:
+        with pd.read_json(path, lines=True, dtype=False, chunksize=block_rows) as reader:
+            for df in reader:
+                yield self._select(df, columns, dtypes)
+
+
+# En orden de preferencia: para xlsx se usa calamine si está instalado
+BACKENDS: List[InputBackend] = [
+    CalamineBackend(), OpenpyxlBackend(), CsvBackend(), ParquetBackend(), JsonLinesBackend()
+]
+
+
+def supported_extensions() -> List[str]:
+    """Extensiones que algún backend sabe leer"""
+    return sorted({extension for backend in BACKENDS for extension in backend.extensions})
+
+
+def get_backend(path: str, name: Optional[str] = None) -> InputBackend:
+    """
+    Backend para un archivo
+
+    Args:
+        path: Archivo de entrada (se elige por extensión)
+        name: Forzar un backend por nombre
+
+    Raises:
+        ValueError: Si el backend no existe, no está instalado o ninguno lee
+        esa extensión
+    """
+    if name:
+        for backend in BACKENDS:
+            if backend.name == name:
+                if not backend.available():
+                    raise ValueError(f"Backend {name} no disponible: falta su dependencia opcional")
+                return backend
+        raise ValueError(f"Backend desconocido: {name}")
+
+    extension = os.path.splitext(path)[1].lower()
+    for backend in BACKENDS:
+        if extension in backend.extensions and backend.available():
+            return backend
+    raise ValueError(f"Formato de entrada no soportado: {extension or path}")
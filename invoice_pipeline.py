@@ -0,0 +1,263 @@
+import logging
+import queue
+import threading
+import time
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from batch_submitter import InvoiceResult
+from run_journal import RunJournal
+
+logger = logging.getLogger(__name__)
+
+
+class _Job:
+    """Comprobante en tránsito por el pipeline"""
+
+    __slots__ = ("index", "invoice", "filename", "xml", "body", "result", "cancelled", "started")
+
+    def __init__(self, index: int, invoice: Any):
+        self.index = index
+        self.invoice = invoice
+        self.filename: Optional[str] = None
+        self.xml: Optional[bytes] = None
+        self.body: Optional[memoryview] = None
+        self.result: Optional[Dict[str, Any]] = None
+        self.cancelled = False
+        self.started = time.perf_counter()
+
+
+class _Stage:
+    """Etapa con sus hilos, su cola de entrada y sus contadores"""
+
+    def __init__(self, name: str, func: Callable[[_Job], None], workers: int, queue_size: int):
+        self.name = name
+        self.func = func
+        self.workers = max(1, workers)
+        self.input: "queue.Queue[Optional[_Job]]" = queue.Queue(maxsize=queue_size)
+        self.output: Optional["queue.Queue[Optional[_Job]]"] = None
+        self.processed = 0
+        self.errors = 0
+        self.busy = 0.0
+        self.blocked = 0.0
+        self.max_depth = 0
+        self._depth_total = 0
+        self._depth_samples = 0
+        self._running = self.workers
+        self._lock = threading.Lock()
+
+    def stats(self, elapsed: float) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "processed": self.processed,
+                "errors": self.errors,
+                "utilization": round(self.busy / (self.workers * elapsed), 3) if elapsed else 0.0,
+                "blocked_seconds": round(self.blocked, 3),
+                "avg_queue_depth": round(self._depth_total / self._depth_samples, 1) if self._depth_samples else 0.0,
+                "max_queue_depth": self.max_depth
+            }
+
+
+class InvoicePipeline:
+    """
+    Pipeline por etapas generar → firmar → comprimir → enviar.
+
+    Cada etapa tiene sus propios hilos y se comunica con la siguiente por una
+    cola acotada: si el envío se retrasa, las colas se llenan y las etapas
+    anteriores se detienen (backpressure) en lugar de acumular XML en
+    memoria. Así la generación y la firma de unos comprobantes se solapan con
+    la espera de red de otros.
+
+    La etapa de firma solo existe si se indica un firmador (SunatXMLSigner o
+    cualquier objeto con sign_xml). Un error en una etapa marca el
+    comprobante como fallido y las etapas siguientes lo dejan pasar.
+    """
+
+    DEFAULT_WORKERS = {"generate": 2, "sign": 2, "zip": 1, "send": 8}
+
+    def __init__(self, api: Any, signer: Any = None, workers: Optional[Dict[str, int]] = None,
+                 queue_size: int = 32, cancel_event: Optional[threading.Event] = None,
+                 on_result: Optional[Callable[[InvoiceResult], None]] = None):
+        """
+        Inicializa el pipeline
+
+        Args:
+            api: SunatAPI que genera, empaqueta y envía
+            signer: Firmador del XML (opcional)
+            workers: Hilos por etapa (generate, sign, zip, send); los que no
+                se indiquen usan DEFAULT_WORKERS
+            queue_size: Capacidad de la cola de entrada de cada etapa
+            cancel_event: Evento para cancelar; los comprobantes pendientes
+                se marcan como cancelados
+            on_result: Llamada con cada resultado según se completa
+        """
+        self.api = api
+        self.signer = signer
+        self.cancel_event = cancel_event or threading.Event()
+        self.on_result = on_result
+        self.elapsed = 0.0
+        workers = dict(self.DEFAULT_WORKERS, **(workers or {}))
+
+        stages = [_Stage("generate", self._generate, workers["generate"], queue_size)]
+        if signer is not None:
+            stages.append(_Stage("sign", self._sign, workers["sign"], queue_size))
+        stages.append(_Stage("zip", self._zip, workers["zip"], queue_size))
+        stages.append(_Stage("send", self._send, workers["send"], queue_size))
+        for stage, following in zip(stages, stages[1:]):
+            stage.output = following.input
+        self.stages = stages
+
+        self._results: Dict[int, InvoiceResult] = {}
+        self._results_lock = threading.Lock()
+
+    def run(self, invoices: Iterable[Any]) -> List[InvoiceResult]:
+        """
+        Procesa los comprobantes y espera a que terminen
+
+        Returns:
+            List[InvoiceResult] en el orden de entrada
+        """
+        started = time.perf_counter()
+        threads = []
+        for stage in self.stages:
+            for n in range(stage.workers):
+                thread = threading.Thread(target=self._worker, args=(stage,),
+                                          name=f"pipeline-{stage.name}-{n}", daemon=True)
+                thread.start()
+                threads.append(thread)
+
+        try:
+            self._feed(invoices)
+        finally:
+            for _ in range(self.stages[0].workers):
+                self.stages[0].input.put(None)
+            for thread in threads:
+                thread.join()
+            self.elapsed = time.perf_counter() - started
+
+        self._log_stats()
+        with self._results_lock:
+            return [self._results[index] for index in sorted(self._results)]
+
+    def stats(self) -> Dict[str, Any]:
+        """Contadores por etapa, utilización y profundidad de las colas"""
+        total = len(self._results)
+        return {
+            "elapsed": round(self.elapsed, 3),
+            "documents": total,
+            "throughput": round(total / self.elapsed, 2) if self.elapsed else 0.0,
+            "stages": {stage.name: stage.stats(self.elapsed) for stage in self.stages}
+        }
+
+    def _feed(self, invoices: Iterable[Any]) -> None:
+        source = iter(invoices)
+        first = self.stages[0]
+        index = 0
+        while not self.cancel_event.is_set():
+            chunk = list(islice(source, 500))
+            if not chunk:
+                break
+
+            if getattr(self.api, "ledger", None) or getattr(self.api, "journal", None):
+                presets = self.api._skip_finished(chunk)
+            else:
+                presets = [None] * len(chunk)
+            for invoice, preset in zip(chunk, presets):
+                if preset is not None:
+                    self._finish(InvoiceResult(index, invoice, preset, skipped=preset.get("skipped", True)))
+                else:
+                    first.input.put(_Job(index, invoice))
+                index += 1
+
+    def _worker(self, stage: _Stage) -> None:
+        while True:
+            depth = stage.input.qsize()
+            job = stage.input.get()
+            if job is None:
+                self._stop_worker(stage)
+                return
+
+            with stage._lock:
+                stage._depth_total += depth
+                stage._depth_samples += 1
+                stage.max_depth = max(stage.max_depth, depth)
+
+            if job.result is None and not job.cancelled:
+                if self.cancel_event.is_set():
+                    job.cancelled = True
+                else:
+                    start = time.perf_counter()
+                    try:
+                        stage.func(job)
+                        failed = False
+                    except Exception as e:
+                        logger.error(f"Error en la etapa {stage.name} ({job.filename or job.index}): {str(e)}")
+                        job.result = {"success": False, "error": f"{stage.name}: {str(e)}"}
+                        failed = True
+                    with stage._lock:
+                        stage.busy += time.perf_counter() - start
+                        stage.processed += 1
+                        stage.errors += failed
+
+            if stage.output is None:
+                self._finish(InvoiceResult(job.index, job.invoice, job.result, cancelled=job.cancelled,
+                                           elapsed=time.perf_counter() - job.started))
+            else:
+                blocked = time.perf_counter()
+                stage.output.put(job)
+                with stage._lock:
+                    stage.blocked += time.perf_counter() - blocked
+
+    def _stop_worker(self, stage: _Stage) -> None:
+        """El último hilo de una etapa en terminar detiene la siguiente"""
+        with stage._lock:
+            stage._running -= 1
+            last = stage._running == 0
+        if last and stage.output is not None:
+            following = self.stages[self.stages.index(stage) + 1]
+            for _ in range(following.workers):
+                stage.output.put(None)
+
+    def _finish(self, result: InvoiceResult) -> None:
+        with self._results_lock:
+            self._results[result.index] = result
+        if self.on_result:
+            try:
+                self.on_result(result)
+            except Exception as e:
+                logger.error(f"Error en on_result: {str(e)}")
+
+    def _generate(self, job: _Job) -> None:
+        job.filename = self.api._document_id(job.invoice)
+        job.xml = self.api._generate_xml(job.invoice)
+        self.api._journal_mark(job.filename, RunJournal.GENERATED)
+
+    def _sign(self, job: _Job) -> None:
+        signed = self.signer.sign_xml(job.xml)
+        job.xml = signed.encode("utf-8") if isinstance(signed, str) else signed
+        self.api._journal_mark(job.filename, RunJournal.SIGNED)
+
+    def _zip(self, job: _Job) -> None:
+        job.body = self.api._package_xml(job.filename, job.xml)
+
+    def _send(self, job: _Job) -> None:
+        self.api._journal_mark(job.filename, RunJournal.SENDING, **self.api._sending_info(job.invoice))
+        job.result = self.api._send_package(job.filename, job.xml, job.body)
+        self.api._journal_sent(job.filename, job.result)
+        if getattr(self.api, "ledger", None):
+            self.api._record_submission(job.filename, self.api._document_fingerprint(job.invoice), job.result)
+
+    def _log_stats(self) -> None:
+        stats = self.stats()
+        logger.info(
+            f"Pipeline: {stats['documents']} comprobantes en {stats['elapsed']:.1f}s "
+            f"({stats['throughput']:.1f}/s)"
+        )
+        for name, stage in stats["stages"].items():
+            logger.info(
+                f"  {name}: {stage['workers']} hilos, {stage['processed']} procesados, "
+                f"{stage['errors']} errores, utilización {stage['utilization']:.0%}, "
+                f"cola media {stage['avg_queue_depth']} (máx. {stage['max_queue_depth']}), "
+                f"bloqueada {stage['blocked_seconds']:.1f}s"
+            )
@@ -1,8 +1,16 @@
 from sunat_api import SunatAPI
+from validation_cache import ValidationCache
+from submission_ledger import SubmissionLedger
+from ticket_poller import TicketPoller
+from xml_signer import SunatXMLSigner
 from dotenv import load_dotenv
 import os
 from gui import SunatInvoiceAutomationGUI
 
+# Certificado digital del emisor (ver README)
+CERT_PATH = os.path.join('certs', 'cert.pem')
+KEY_PATH = os.path.join('certs', 'key.pem')
+
 def main():
     # Cargar variables de entorno
     load_dotenv()
@@ -11,7 +19,9 @@ def main():
     sunat_api = SunatAPI(
         ruc=os.getenv('SUNAT_RUC'),
         client_id=os.getenv('SUNAT_CLIENT_ID'),
-        client_secret=os.getenv('SUNAT_CLIENT_SECRET')
+        client_secret=os.getenv('SUNAT_CLIENT_SECRET'),
+        validation_cache=ValidationCache(),
+        ledger=SubmissionLedger()
     )
 
     # Crear directorios necesarios
@@ -19,9 +29,18 @@ def main():
     os.makedirs('resources', exist_ok=True)
     os.makedirs('templates', exist_ok=True)
 
+    # Seguimiento en segundo plano de los tickets pendientes (resúmenes diarios)
+    ticket_poller = TicketPoller(sunat_api).start()
+
+    # Firmador del XML; sin certificado no se pueden enviar resúmenes diarios
+    signer = None
+    if os.path.exists(CERT_PATH) and os.path.exists(KEY_PATH):
+        signer = SunatXMLSigner(CERT_PATH, KEY_PATH)
+
     # Iniciar la aplicación GUI
-    app = SunatInvoiceAutomationGUI(sunat_api)
+    app = SunatInvoiceAutomationGUI(sunat_api, ticket_poller=ticket_poller, signer=signer)
     app.mainloop()
+    ticket_poller.stop()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,133 @@
+import hashlib
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Identidad de una factura: clave de agrupación + ordinal dentro del grupo
+Identity = Tuple[Any, ...]
+
+NEW = "new"
+CHANGED = "changed"
+UNCHANGED = "unchanged"
+
+
+def row_hashes(df: pd.DataFrame, columns: Sequence[str]) -> np.ndarray:
+    """
+    Hash del contenido de cada fila (uint64) sobre las columnas dadas
+
+    Las columnas ausentes se omiten; el índice no interviene, así que una
+    fila movida conserva su hash.
+    """
+    present = [column for column in columns if column in df.columns]
+    if not len(df) or not present:
+        return np.zeros(len(df), dtype=np.uint64)
+    return pd.util.hash_pandas_object(df[present], index=False).to_numpy()
+
+
+def invoice_fingerprints(hashes: np.ndarray, starts: np.ndarray) -> List[str]:
+    """Huella de cada factura: blake2b de los hashes de sus filas, en orden"""
+    bounds = np.append(starts, len(hashes)).tolist()
+    hashes = np.ascontiguousarray(hashes, dtype=np.uint64)
+    return [hashlib.blake2b(hashes[start:end].tobytes(), digest_size=16).hexdigest()
+            for start, end in zip(bounds, bounds[1:])]
+
+
+class ParseDelta:
+    """Facturas nuevas, modificadas, sin cambios y eliminadas respecto de la lectura anterior"""
+
+    def __init__(self, new: List[int], changed: List[int], unchanged: List[int], removed: List[int]):
+        self.new = new
+        self.changed = changed
+        self.unchanged = unchanged
+        self.removed = removed
+
+    @property
+    def pending(self) -> List[int]:
+        """Números de factura que hay que regenerar y enviar"""
+        return sorted(self.new + self.changed)
+
+    def to_dict(self) -> Dict[str, int]:
+        return {"new": len(self.new), "changed": len(self.changed),
+                "unchanged": len(self.unchanged), "removed": len(self.removed)}
+
+    def __str__(self):
+        return (f"{len(self.new)} nuevas, {len(self.changed)} modificadas, "
+                f"{len(self.unchanged)} sin cambios, {len(self.removed)} eliminadas")
+
+
+class ParseSnapshot:
+    """
+    Resultado de la última lectura de un libro.
+
+    Guarda por identidad de factura su número y su huella, y opcionalmente
+    los objetos Invoice (la lectura en streaming no los conserva).
+    """
+
+    def __init__(self, path: str, entries: Optional[Dict[Identity, Tuple[int, str]]] = None,
+                 invoices: Optional[Dict[int, Any]] = None):
+        self.path = path
+        self.entries: Dict[Identity, Tuple[int, str]] = entries or {}
+        self.invoices: Dict[int, Any] = invoices or {}
+
+    def tracker(self, first_number: int = 1) -> 'ParseTracker':
+        return ParseTracker(self, first_number)
+
+
+class ParseTracker:
+    """
+    Compara una lectura, bloque a bloque, con la instantánea anterior.
+
+    Una factura conocida (misma identidad) conserva su número y es
+    'unchanged' si su huella coincide o 'changed' si no; las demás son
+    'new' y se numeran a continuación del mayor número anterior. Las
+    identidades anteriores que no aparecen quedan como eliminadas.
+    """
+
+    def __init__(self, previous: ParseSnapshot, first_number: int = 1):
+        self.previous = previous
+        numbers = [number for number, _ in previous.entries.values()]
+        self.next_number = max(numbers) + 1 if numbers else first_number
+        self.entries: Dict[Identity, Tuple[int, str]] = {}
+        self.status: Dict[int, str] = {}
+        self._ordinals: Dict[Tuple[Any, ...], int] = {}
+
+    def add(self, keys: Iterable[Tuple[Any, ...]], fingerprints: Sequence[str]) -> List[Tuple[int, str]]:
+        """
+        Registra las facturas de un bloque
+
+        Args:
+            keys: Clave de agrupación de cada factura, en orden de lectura
+            fingerprints: Huella de cada factura
+
+        Returns:
+            (número, estado) de cada factura
+        """
+        results = []
+        for key, fingerprint in zip(keys, fingerprints):
+            ordinal = self._ordinals.get(key, 0)
+            self._ordinals[key] = ordinal + 1
+            identity = tuple(key) + (ordinal,)
+
+            known = self.previous.entries.get(identity)
+            if known is None:
+                number, status = self.next_number, NEW
+                self.next_number += 1
+            else:
+                number = known[0]
+                status = UNCHANGED if known[1] == fingerprint else CHANGED
+            self.entries[identity] = (number, fingerprint)
+            self.status[number] = status
+            results.append((number, status))
+        return results
+
+    def finish(self, invoices: Optional[Dict[int, Any]] = None) -> Tuple[ParseDelta, ParseSnapshot]:
+        """Delta frente a la instantánea anterior y nueva instantánea"""
+        by_status: Dict[str, List[int]] = {NEW: [], CHANGED: [], UNCHANGED: []}
+        for number, status in self.status.items():
+            by_status[status].append(number)
+        removed = sorted(number for identity, (number, _) in self.previous.entries.items()
+                         if identity not in self.entries)
+        delta = ParseDelta(sorted(by_status[NEW]), sorted(by_status[CHANGED]),
+                           sorted(by_status[UNCHANGED]), removed)
+        return delta, ParseSnapshot(self.previous.path, self.entries, invoices)
@@ -0,0 +1,239 @@
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+# Unidades de medida del catálogo 03 de SUNAT (UN/ECE Rec. 20) más usadas
+UNIT_CODES = frozenset({
+    "NIU", "ZZ", "KGM", "GRM", "TNE", "LBR", "ONZ", "LTR", "MLT", "GLL", "GLI", "HLT", "MTR", "CMT",
+    "MMT", "KTM", "MTK", "MTQ", "FOT", "INH", "YRD", "BX", "BG", "BJ", "BLL", "BO", "CA", "CH", "CT",
+    "CY", "DR", "DZN", "GRO", "KT", "MIL", "MLL", "PK", "PR", "PF", "PG", "RM", "SA", "SET", "ST",
+    "TU", "4A", "BE", "JR", "HUR", "MIN", "SEC", "DAY", "MON", "ANN", "KWH", "MWH", "C62"
+})
+
+# Unidades comerciales habituales en las hojas (las de la plantilla incluidas)
+# y su código del catálogo 03
+UNIT_ALIASES = {
+    "BAG": "BG", "BAGS": "BG", "KG": "KGM", "KGS": "KGM", "PKT": "PK", "PACK": "PK",
+    "PCS": "NIU", "PC": "NIU", "UND": "NIU", "UNIT": "NIU", "BOX": "BX", "LT": "LTR", "LTS": "LTR"
+}
+
+# Pesos del dígito verificador del RUC (módulo 11)
+RUC_WEIGHTS = np.array([5, 4, 3, 2, 7, 6, 5, 4, 3, 2], dtype=np.int64)
+
+
+def ruc_check_digit_ok(rucs: Iterable[str]) -> np.ndarray:
+    """
+    Verifica en bloque el dígito verificador de RUC de 11 dígitos
+
+    Args:
+        rucs: Cadenas de exactamente 11 dígitos
+
+    Returns:
+        np.ndarray de bool, True si el undécimo dígito es el esperado
+    """
+    joined = "".join(rucs).encode("ascii")
+    digits = (np.frombuffer(joined, dtype=np.uint8).reshape(-1, 11) - ord("0")).astype(np.int64)
+    check = 11 - (digits[:, :10] @ RUC_WEIGHTS) % 11
+    check = np.where(check == 10, 0, np.where(check == 11, 1, check))
+    return check == digits[:, 10]
+
+
+def identity_document_type(number: Any) -> str:
+    """
+    Tipo de documento de identidad (catálogo 06) según el número
+
+    Returns:
+        "6" RUC (11 dígitos), "1" DNI (8 dígitos) o "0" sin documento
+        nacional (clientes del exterior)
+    """
+    number = str(number or "").strip()
+    if number.isdigit() and len(number) == 11:
+        return "6"
+    if number.isdigit() and len(number) == 8:
+        return "1"
+    return "0"
+
+
+class ValidationReport:
+    """Errores de validación de una hoja, por número de fila"""
+
+    def __init__(self, issues: Optional[List[Dict[str, Any]]] = None):
+        # row es el número de fila de la hoja (la cabecera es la 1) o None
+        # para errores del archivo completo
+        self.issues: List[Dict[str, Any]] = issues or []
+
+    @property
+    def ok(self) -> bool:
+        return not self.issues
+
+    @property
+    def rows(self) -> List[int]:
+        """Filas con algún error, ordenadas"""
+        return sorted({issue["row"] for issue in self.issues if issue["row"] is not None})
+
+    def extend(self, other: "ValidationReport") -> None:
+        self.issues.extend(other.issues)
+
+    def by_row(self) -> Dict[Optional[int], List[Dict[str, Any]]]:
+        report: Dict[Optional[int], List[Dict[str, Any]]] = {}
+        for issue in sorted(self.issues, key=lambda issue: (issue["row"] or 0, issue["column"] or "")):
+            report.setdefault(issue["row"], []).append(issue)
+        return report
+
+    def to_frame(self) -> pd.DataFrame:
+        """Informe como DataFrame (row, column, code, value, message)"""
+        columns = ["row", "column", "code", "value", "message"]
+        frame = pd.DataFrame(self.issues, columns=columns)
+        return frame.sort_values(["row", "column"], na_position="first", kind="stable").reset_index(drop=True)
+
+    def messages(self, limit: Optional[int] = None) -> List[str]:
+        """Mensajes legibles ordenados por fila, como máximo limit"""
+        lines = []
+        for row, issues in self.by_row().items():
+            place = f"Fila {row}" if row is not None else "Archivo"
+            for issue in issues:
+                column = f" [{issue['column']}]" if issue["column"] else ""
+                value = f" ({issue['value']!r})" if issue["value"] not in (None, "") else ""
+                lines.append(f"{place}{column}: {issue['message']}{value}")
+        if limit is not None and len(lines) > limit:
+            lines = lines[:limit] + [f"... y {len(lines) - limit} errores más"]
+        return lines
+
+    def __str__(self):
+        if self.ok:
+            return "Sin errores"
+        return f"{len(self.issues)} errores en {len(self.rows)} filas"
+
+
+class RowValidator:
+    """
+    Validación de la hoja completa antes de construir facturas.
+
+    Cada comprobación es una operación por columnas sobre todo el DataFrame
+    (sin recorrer filas); solo las filas con error se convierten en
+    entradas del informe. Comprueba columnas obligatorias, valores vacíos,
+    el dígito verificador (módulo 11) de los RUC, que cantidades y precios
+    sean numéricos y mayores que cero, y que las unidades estén en el
+    catálogo 03 de SUNAT o tengan equivalente en él (unit_aliases). Los
+    documentos solo de dígitos deben ser RUC (11) o DNI (8); los que llevan
+    letras o guiones (tipo 0: clientes del exterior, como "US-99887766") no
+    se comprueban.
+    """
+
+    DOCUMENT_COLUMN = "Customer_RUC"
+    NUMERIC_COLUMNS = ("Quantity", "Unit_Price", "Unit_Value")
+    UNIT_COLUMNS = ("Unit", "Unit_Measure")
+
+    def __init__(self, required_columns: Sequence[str], unit_codes: Iterable[str] = UNIT_CODES,
+                 unit_aliases: Dict[str, str] = UNIT_ALIASES):
+        """
+        Args:
+            required_columns: Columnas que deben existir y no estar vacías
+            unit_codes: Códigos de unidad aceptados
+            unit_aliases: Otras unidades aceptadas y su código del catálogo
+        """
+        self.required_columns = list(required_columns)
+        self.unit_codes = frozenset(code.upper() for code in unit_codes)
+        self.unit_aliases = {alias.upper(): code for alias, code in unit_aliases.items()}
+
+    def validate(self, df: pd.DataFrame, first_row: int = 2) -> ValidationReport:
+        """
+        Valida la hoja
+
+        Args:
+            df: Filas tal como se leyeron
+            first_row: Número de fila de la primera fila de df (2 tras la cabecera)
+
+        Returns:
+            ValidationReport con un error por celda inválida
+        """
+        report = ValidationReport()
+        rows = first_row + np.arange(len(df))
+
+        def add(mask: np.ndarray, column: Optional[str], code: str, message: str,
+                values: Optional[pd.Series] = None) -> None:
+            positions = np.flatnonzero(mask)
+            if not len(positions):
+                return
+            shown = values.iloc[positions].tolist() if values is not None else [None] * len(positions)
+            report.issues.extend(
+                {"row": int(row), "column": column, "code": code, "value": value, "message": message}
+                for row, value in zip(rows[positions].tolist(), shown)
+            )
+
+        missing = [column for column in self.required_columns if column not in df.columns]
+        for column in missing:
+            report.issues.append({"row": None, "column": column, "code": "missing_column",
+                                  "value": None, "message": "Columna obligatoria ausente"})
+
+        text = {column: self._text(df[column]) for column in df.columns
+                if column in self.required_columns or column in self.UNIT_COLUMNS
+                or column == self.DOCUMENT_COLUMN}
+        blank = {column: (values == "").to_numpy() for column, values in text.items()}
+
+        for column in self.required_columns:
+            if column in blank:
+                add(blank[column], column, "required", "Valor obligatorio vacío")
+
+        if self.DOCUMENT_COLUMN in text:
+            self._check_documents(text[self.DOCUMENT_COLUMN], blank[self.DOCUMENT_COLUMN], add)
+
+        for column in self.NUMERIC_COLUMNS:
+            if column not in df.columns:
+                continue
+            values = pd.to_numeric(df[column], errors="coerce").to_numpy(dtype=float)
+            empty = (text[column] if column in text else self._text(df[column])).to_numpy() == ""
+            # Los vacíos de columnas obligatorias ya se informaron
+            if column not in self.required_columns:
+                add(empty, column, "required", "Valor vacío (se tomaría como 0)")
+            add(np.isnan(values) & ~empty, column, "not_numeric", "No es un número", df[column])
+            add(values <= 0, column, "not_positive", "Debe ser mayor que cero", df[column])
+
+        for column in self.UNIT_COLUMNS:
+            if column in text:
+                codes = text[column].str.upper()
+                known = codes.isin(self.unit_codes) | codes.isin(self.unit_aliases.keys())
+                unknown = ~known.to_numpy() & ~blank[column]
+                add(unknown, column, "unknown_unit", "Unidad fuera del catálogo 03 de SUNAT", df[column])
+
+        return report
+
+    def _check_documents(self, numbers: pd.Series, blank: np.ndarray, add) -> None:
+        """
+        RUC de 11 dígitos con dígito verificador válido o DNI de 8 dígitos
+
+        Un número solo de dígitos con otra longitud es un error de tecleo; los
+        que llevan letras o guiones son tipo 0 (identificación del exterior,
+        ver identity_document_type) y se aceptan tal cual.
+        """
+        digits = numbers.str.fullmatch(r"\d+").to_numpy(dtype=bool)
+        lengths = numbers.str.len().to_numpy()
+        column = self.DOCUMENT_COLUMN
+
+        add(digits & (lengths != 11) & (lengths != 8), column, "document_length",
+            "Longitud inválida: RUC de 11 dígitos o DNI de 8", numbers)
+
+        is_ruc = digits & (lengths == 11)
+        if is_ruc.any():
+            bad = np.zeros(len(numbers), dtype=bool)
+            bad[is_ruc] = ~ruc_check_digit_ok(numbers[is_ruc].tolist())
+            add(bad, column, "ruc_check_digit", "Dígito verificador del RUC inválido", numbers)
+
+    @staticmethod
+    def _text(values: pd.Series) -> pd.Series:
+        """Texto sin espacios; vacíos y NaN como '' y enteros leídos como float sin '.0'"""
+        if pd.api.types.is_float_dtype(values):
+            numbers = values.to_numpy()
+            integral = np.isfinite(numbers) & (numbers == np.floor(numbers))
+            text = values.astype(str)
+            text[integral] = values[integral].astype(np.int64).astype(str)
+            text[values.isna()] = ""
+            return text
+        text = values.fillna("").astype(str).str.strip()
+        if values.dtype == object:
+            # Números de documento leídos como float dentro de una columna de texto
+            as_float = text.str.endswith(".0").to_numpy()
+            if as_float.any():
+                text[as_float] = text[as_float].str[:-2]
+        return text
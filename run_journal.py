@@ -0,0 +1,178 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_JOURNAL_DIR = os.path.join(os.path.expanduser('~'), '.sunat_automation', 'runs')
+
+
+class RunJournal:
+    """
+    Diario de avance de un lote, en JSON Lines y solo de añadido.
+
+    Cada comprobante deja una línea por etapa completada: generated, signed,
+    sending (justo antes del POST), sent y cdr. Las líneas se escriben al
+    momento pero el fsync se agrupa (cada fsync_every líneas o cada
+    fsync_interval segundos, en un hilo aparte) para no pagar un fsync por
+    comprobante. Tras una caída se pierde como mucho el último grupo; una
+    línea cortada al final se ignora al leer.
+
+    En modo resume se carga el diario existente y se continúa escribiendo
+    en él: los comprobantes enviados con éxito se omiten, los que no
+    llegaron a enviarse se vuelven a procesar y los que empezaron el envío
+    sin éxito confirmado (unconfirmed) se consultan en SUNAT antes de
+    reenviarlos, con la fecha, el importe y el ticket anotados.
+    """
+
+    GENERATED = "generated"
+    SIGNED = "signed"
+    SENDING = "sending"
+    SENT = "sent"
+    CDR = "cdr"
+
+    def __init__(self, path: str, resume: bool = False, fsync_every: int = 64, fsync_interval: float = 0.5):
+        """
+        Abre el diario
+
+        Args:
+            path: Archivo del diario
+            resume: Cargar y continuar el diario existente; si es False se
+                empieza uno nuevo
+            fsync_every: Líneas escritas antes de forzar un fsync
+            fsync_interval: Segundos máximos entre fsync
+        """
+        self.path = path
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self._state: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._unsynced = 0
+        self._closed = False
+        self._stopping = False
+        self._wakeup = threading.Event()
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        if resume and os.path.exists(path):
+            self._load()
+            logger.info(
+                f"Reanudando desde {path}: {len(self.completed())} comprobantes terminados, "
+                f"{len(self.in_flight())} a medias"
+            )
+        self._file = open(path, 'a' if resume else 'w', encoding='utf-8')
+
+        self._syncer = threading.Thread(target=self._sync_loop, name="journal-fsync", daemon=True)
+        self._syncer.start()
+
+    @staticmethod
+    def path_for(source: str, journal_dir: str = DEFAULT_JOURNAL_DIR) -> str:
+        """Diario asociado a un archivo de entrada"""
+        key = hashlib.sha256(os.path.abspath(source).encode()).hexdigest()[:16]
+        return os.path.join(journal_dir, f"run_{key}.jsonl")
+
+    def mark(self, doc_id: str, stage: str, **info: Any) -> None:
+        """Registra que un comprobante completó una etapa"""
+        record = dict(info, doc=doc_id, stage=stage, t=round(time.time(), 3))
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            if self._closed:
+                return
+            self._apply(record)
+            self._file.write(line)
+            self._file.flush()
+            self._unsynced += 1
+            wake = self._unsynced >= self.fsync_every
+        if wake:
+            self._wakeup.set()
+
+    def stage(self, doc_id: str) -> Optional[str]:
+        """Última etapa registrada del comprobante"""
+        with self._lock:
+            entry = self._state.get(doc_id)
+            return entry["stage"] if entry else None
+
+    def is_done(self, doc_id: str) -> bool:
+        """True si el comprobante ya se envió con éxito (o tiene CDR)"""
+        with self._lock:
+            return self._done(self._state.get(doc_id))
+
+    def unconfirmed(self, doc_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Envío empezado cuyo resultado se desconoce
+
+        Returns:
+            fecha, monto y ticket anotados si el comprobante llegó a la etapa
+            sending pero no consta enviado con éxito; None en otro caso
+        """
+        with self._lock:
+            entry = self._state.get(doc_id)
+            if entry is None or self._done(entry) or entry["stage"] not in (self.SENDING, self.SENT):
+                return None
+            return {"fecha": entry.get("fecha"), "monto": entry.get("monto"), "ticket": entry.get("ticket")}
+
+    def completed(self) -> List[str]:
+        with self._lock:
+            return [doc for doc, entry in self._state.items() if self._done(entry)]
+
+    def in_flight(self) -> List[str]:
+        """Comprobantes que empezaron pero no terminaron con éxito"""
+        with self._lock:
+            return [doc for doc, entry in self._state.items() if not self._done(entry)]
+
+    def sync(self) -> None:
+        """Fuerza el fsync de lo escrito"""
+        with self._lock:
+            if self._closed or not self._unsynced:
+                return
+            self._unsynced = 0
+            fd = self._file.fileno()
+        os.fsync(fd)
+
+    def close(self) -> None:
+        self._stopping = True
+        self._wakeup.set()
+        self._syncer.join()
+        self.sync()
+        with self._lock:
+            self._closed = True
+            self._file.close()
+
+    @staticmethod
+    def _done(entry: Optional[Dict[str, Any]]) -> bool:
+        return entry is not None and (entry.get("cdr") or entry.get("sent_ok", False))
+
+    def _apply(self, record: Dict[str, Any]) -> None:
+        entry = self._state.setdefault(record["doc"], {})
+        entry["stage"] = record["stage"]
+        if record["stage"] == self.SENDING:
+            entry.update((key, record[key]) for key in ("fecha", "monto") if key in record)
+        elif record["stage"] == self.SENT:
+            entry["sent_ok"] = bool(record.get("ok"))
+            if record.get("ticket"):
+                entry["ticket"] = record["ticket"]
+        elif record["stage"] == self.CDR:
+            entry["cdr"] = True
+
+    def _load(self) -> None:
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for number, line in enumerate(f, 1):
+                try:
+                    self._apply(json.loads(line))
+                except (ValueError, KeyError):
+                    # Última línea a medio escribir cuando el proceso murió
+                    logger.warning(f"Línea {number} del diario ilegible, se ignora")
+
+    def _sync_loop(self) -> None:
+        while True:
+            self._wakeup.wait(self.fsync_interval)
+            self._wakeup.clear()
+            if self._stopping:
+                return
+            try:
+                self.sync()
+            except (OSError, ValueError) as e:
+                logger.error(f"Error sincronizando el diario: {str(e)}")
@@ -0,0 +1,236 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Any, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LEDGER_PATH = os.path.join(os.path.expanduser('~'), '.sunat_automation', 'submissions.sqlite3')
+
+
+class SubmissionLedger:
+    """
+    Registro local (SQLite) de los comprobantes enviados a SUNAT.
+
+    Cada comprobante se identifica por RUC, tipo, serie y número y guarda la
+    huella de su contenido, el hash del XML enviado, la hora de envío y el
+    estado del CDR. Antes de enviar un lote se consulta en bloque para no
+    reenviar comprobantes aceptados (o en proceso) cuyo contenido no cambió.
+    """
+
+    ACCEPTED = "accepted"
+    PENDING = "pending"
+    REJECTED = "rejected"
+    ERROR = "error"
+
+    # Estados que no deben reenviarse si el contenido es el mismo
+    FINAL_STATUSES = (ACCEPTED, PENDING)
+
+    # Límite de parámetros por consulta de SQLite
+    _QUERY_CHUNK = 500
+
+    def __init__(self, path: str = DEFAULT_LEDGER_PATH):
+        """
+        Abre (o crea) el registro
+
+        Args:
+            path: Archivo SQLite (":memory:" para un registro temporal)
+        """
+        self.path = path
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS submissions ("
+            " doc_id TEXT PRIMARY KEY,"
+            " ruc TEXT NOT NULL,"
+            " tipo TEXT NOT NULL,"
+            " serie TEXT NOT NULL,"
+            " numero TEXT NOT NULL,"
+            " fingerprint TEXT,"
+            " xml_hash TEXT,"
+            " submitted_at REAL NOT NULL,"
+            " status TEXT NOT NULL,"
+            " cdr_code TEXT,"
+            " ticket TEXT,"
+            " message TEXT)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS submissions_status ON submissions (status)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS submissions_ticket ON submissions (ticket)")
+        # Cola persistente de tickets pendientes de consulta
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS tickets ("
+            " ticket TEXT PRIMARY KEY,"
+            " doc_id TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " next_poll_at REAL NOT NULL,"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " status TEXT NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS tickets_due ON tickets (status, next_poll_at)")
+
+    @staticmethod
+    def make_doc_id(ruc: str, tipo: str, serie: str, numero: Any) -> str:
+        """Identificador del comprobante (mismo formato que el nombre del ZIP)"""
+        return f"{ruc}-{tipo}-{serie}-{numero}"
+
+    def lookup_many(self, doc_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Consulta varios comprobantes con una consulta por cada 500
+
+        Returns:
+            Dict doc_id -> fila registrada (solo los que existen)
+        """
+        doc_ids = list(dict.fromkeys(doc_ids))
+        found: Dict[str, Dict[str, Any]] = {}
+        with self._lock:
+            for start in range(0, len(doc_ids), self._QUERY_CHUNK):
+                chunk = doc_ids[start:start + self._QUERY_CHUNK]
+                cursor = self._conn.execute(
+                    "SELECT doc_id, fingerprint, xml_hash, submitted_at, status, cdr_code, ticket, message "
+                    f"FROM submissions WHERE doc_id IN ({','.join('?' * len(chunk))})",
+                    chunk
+                )
+                for row in cursor:
+                    found[row[0]] = {
+                        "fingerprint": row[1],
+                        "xml_hash": row[2],
+                        "submitted_at": row[3],
+                        "status": row[4],
+                        "cdr_code": row[5],
+                        "ticket": row[6],
+                        "message": row[7]
+                    }
+        return found
+
+    def get(self, doc_id: str) -> Optional[Dict[str, Any]]:
+        return self.lookup_many([doc_id]).get(doc_id)
+
+    def record(self, doc_id: str, fingerprint: Optional[str], status: str,
+               xml_hash: Optional[str] = None, cdr_code: Optional[str] = None,
+               ticket: Optional[str] = None, message: Optional[str] = None) -> None:
+        """
+        Registra (o reemplaza) el resultado del envío de un comprobante
+
+        Un envío pendiente con ticket se encola para que TicketPoller lo consulte.
+        """
+        self.record_many([{
+            "doc_id": doc_id, "fingerprint": fingerprint, "status": status, "xml_hash": xml_hash,
+            "cdr_code": cdr_code, "ticket": ticket, "message": message
+        }])
+
+    def record_many(self, rows: Iterable[Dict[str, Any]]) -> None:
+        """
+        Registra varios comprobantes en una sola transacción
+
+        Args:
+            rows: Dicts con los mismos campos que record()
+        """
+        now = time.time()
+        values = []
+        tickets = {}
+        for row in rows:
+            ruc, tipo, serie, numero = row["doc_id"].split("-", 3)
+            values.append((row["doc_id"], ruc, tipo, serie, numero, row.get("fingerprint"),
+                           row.get("xml_hash"), now, row["status"], row.get("cdr_code"),
+                           row.get("ticket"), row.get("message")))
+            if row["status"] == self.PENDING and row.get("ticket"):
+                # Varias boletas comparten el ticket de su resumen; se encola el primero
+                tickets.setdefault(row["ticket"], row["doc_id"])
+        with self._lock:
+            with self._conn:
+                self._conn.execute("BEGIN")
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO submissions "
+                    "(doc_id, ruc, tipo, serie, numero, fingerprint, xml_hash, submitted_at, status, "
+                    " cdr_code, ticket, message) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    values
+                )
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO tickets (ticket, doc_id, created_at, next_poll_at, status) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    [(ticket, doc_id, now, now, self.PENDING) for ticket, doc_id in tickets.items()]
+                )
+
+    def next_summary_sequence(self, ruc: str, issue_date: str) -> int:
+        """
+        Siguiente correlativo libre de Resumen Diario para el día
+
+        Args:
+            issue_date: Fecha de generación en formato YYYYMMDD
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT MAX(CAST(numero AS INTEGER)) FROM submissions WHERE ruc = ? AND tipo = 'RC' AND serie = ?",
+                (ruc, issue_date)
+            ).fetchone()
+        return (row[0] or 0) + 1
+
+    def update_status(self, doc_id: str, status: str, cdr_code: Optional[str] = None,
+                      message: Optional[str] = None) -> None:
+        """Actualiza el estado tras recibir el CDR de un envío en proceso"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE submissions SET status = ?, cdr_code = COALESCE(?, cdr_code), "
+                "message = COALESCE(?, message) WHERE doc_id = ?",
+                (status, cdr_code, message, doc_id)
+            )
+
+    def due_tickets(self, limit: int, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Tickets pendientes cuya próxima consulta ya venció, los más antiguos primero"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT ticket, doc_id, created_at, attempts FROM tickets "
+                "WHERE status = ? AND next_poll_at <= ? ORDER BY next_poll_at LIMIT ?",
+                (self.PENDING, now if now is not None else time.time(), limit)
+            ).fetchall()
+        return [{"ticket": r[0], "doc_id": r[1], "created_at": r[2], "attempts": r[3]} for r in rows]
+
+    def next_ticket_poll(self) -> Optional[float]:
+        """Hora de la próxima consulta programada (None si no hay tickets pendientes)"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT MIN(next_poll_at) FROM tickets WHERE status = ?", (self.PENDING,)
+            ).fetchone()
+        return row[0]
+
+    def reschedule_ticket(self, ticket: str, next_poll_at: float) -> None:
+        """Programa la siguiente consulta de un ticket que sigue en proceso"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE tickets SET next_poll_at = ?, attempts = attempts + 1 WHERE ticket = ?",
+                (next_poll_at, ticket)
+            )
+
+    def complete_ticket(self, ticket: str, status: str, cdr_code: Optional[str] = None,
+                        message: Optional[str] = None) -> None:
+        """Cierra un ticket y actualiza todos los comprobantes enviados con él"""
+        with self._lock:
+            with self._conn:
+                self._conn.execute("BEGIN")
+                self._conn.execute(
+                    "UPDATE tickets SET status = ?, attempts = attempts + 1 WHERE ticket = ?",
+                    (status, ticket)
+                )
+                self._conn.execute(
+                    "UPDATE submissions SET status = ?, cdr_code = COALESCE(?, cdr_code), "
+                    "message = COALESCE(?, message) WHERE ticket = ?",
+                    (status, cdr_code, message, ticket)
+                )
+
+    def stats(self) -> Dict[str, int]:
+        """Número de comprobantes registrados por estado"""
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM submissions GROUP BY status").fetchall()
+        return dict(rows)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
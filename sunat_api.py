@@ -2,177 +2,450 @@ import requests
 import json
 import base64
 import logging
-from datetime import datetime
-from typing import Dict, Any, Optional
-from excel_reader import Invoice
+from datetime import date, datetime
+from typing import Callable, Dict, Any, Iterable, List, Optional, Tuple
+from excel_reader import Invoice, document_serie, format_cents
 from dotenv import load_dotenv
 import os
 import xml.etree.ElementTree as ET
 import hashlib
 import zipfile
+import io
+import threading
+from sunat_http import SunatHTTPSession
+from token_manager import TokenManager, TokenError
+from batch_submitter import BatchSubmission
+from invoice_pipeline import InvoicePipeline
+from daily_summary import DailySummaryBuilder, boleta_id
+from zip_archiver import ZipArchiver
+from ubl_template import UBLInvoiceTemplate
+from validation_cache import ValidationCache
+from submission_ledger import SubmissionLedger
+from run_journal import RunJournal
+from row_validation import identity_document_type
 
-class SunatAPI:
-    def __init__(self, ruc: str = None, client_id: str = None, client_secret: str = None):
-        """Inicializa el API de SUNAT con credenciales"""
-        load_dotenv()
-        self.ruc = ruc or os.getenv("SUNAT_RUC")
-        self.client_id = client_id or os.getenv("SUNAT_CLIENT_ID")
-        self.client_secret = client_secret or os.getenv("SUNAT_CLIENT_SECRET")
-        self.token = None
-        self.logger = logging.getLogger('sunat_api')
-        
-        # URLs del API
-        self.token_url = "https://api-seguridad.sunat.gob.pe/v1/clientesextranet/{}/oauth2/token/"
-        self.base_url = "https://api.sunat.gob.pe/v1/contribuyente/contribuyentes"
-        
-        self.logger.info(f"SunatAPI inicializado para RUC: {self.ruc}")
+class SunatDocumentBuilder:
+    """
+    Construcción de XML UBL 2.1, paquetes ZIP y cuerpos de petición.
+
+    Es común a SunatAPI y AsyncSunatAPI; las subclases solo aportan el
+    transporte HTTP y deben definir ruc, client_id, client_secret, token_url
+    y logger.
+    """
+
+    TIPOS_COMPROBANTE = {
+        "FACTURA": "01",
+        "BOLETA": "03",
+        "NOTA_CREDITO": "07",
+        "NOTA_DEBITO": "08"
+    }
+
+    ENVIO_PATH = "/contribuyente/gem/comprobantes/envio"
+    TICKET_PATH = "/contribuyente/gem/comprobantes/envios/{}"
+
+    # codRespuesta de la consulta de ticket
+    TICKET_EN_PROCESO = "98"
+    TICKET_CON_ERROR = "99"
+
+    # Archivo opcional en disco de los ZIP enviados
+    archiver: Optional[ZipArchiver] = None
+
+    # Caché opcional de resultados de validarcomprobante
+    validation_cache: Optional[ValidationCache] = None
+
+    # Registro opcional de comprobantes enviados (evita reenvíos)
+    ledger: Optional[SubmissionLedger] = None
+
+    # Diario opcional de la ejecución en curso (reanudación tras una caída)
+    journal: Optional[RunJournal] = None
+
+    # Firmador opcional del XML de create_invoice (SunatXMLSigner)
+    signer: Any = None
+
+    # Generar el XML con la plantilla precompilada en lugar de ElementTree
+    use_xml_template = True
+    _ubl_template: Optional[UBLInvoiceTemplate] = None
 
     # Constantes para XML
     XML_NAMESPACES = {
         'xmlns': "urn:oasis:names:specification:ubl:schema:xsd:Invoice-2",
-        'cac': "urn:oasis:names:specification:ubl:schema:xsd:CommonAggregateComponents-2",
-        'cbc': "urn:oasis:names:specification:ubl:schema:xsd:CommonBasicComponents-2",
-        'ds': "http://www.w3.org/2000/09/xmldsig#",
-        'ext': "urn:oasis:names:specification:ubl:schema:xsd:CommonExtensionComponents-2"
+        'xmlns:cac': "urn:oasis:names:specification:ubl:schema:xsd:CommonAggregateComponents-2",
+        'xmlns:cbc': "urn:oasis:names:specification:ubl:schema:xsd:CommonBasicComponents-2",
+        'xmlns:ds': "http://www.w3.org/2000/09/xmldsig#",
+        'xmlns:ext': "urn:oasis:names:specification:ubl:schema:xsd:CommonExtensionComponents-2"
     }
 
-    def get_token(self) -> bool:
-        """Obtener token de autenticación"""
+    def _token_request(self) -> Tuple[str, Dict[str, str], Dict[str, str]]:
+        """URL, datos y cabeceras de la petición de token client_credentials"""
+        url = self.token_url.format(self.client_id)
+
+        data = {
+            "grant_type": "client_credentials",
+            "scope": "https://api.sunat.gob.pe/v1/contribuyente/contribuyentes",
+            "client_id": self.client_id,
+            "client_secret": self.client_secret
+        }
+
+        headers = {
+            "Content-Type": "application/x-www-form-urlencoded"
+        }
+
+        return url, data, headers
+
+    def _build_invoice_package(self, invoice: Invoice) -> Tuple[str, bytes, memoryview]:
+        """
+        Genera el XML (firmado, si hay firmador) y el ZIP de un comprobante en memoria
+
+        El ZIP se escribe en un único buffer y se devuelve como vista sin
+        copiarlo; si hay archivador, se encola la misma vista para guardarla.
+        Cada etapa completada se anota en el diario.
+
+        Returns:
+            Tuple con el nombre base del archivo, el XML y el cuerpo ZIP
+        """
+        # Crear nombre de archivo
+        filename = self._document_id(invoice)
+        
+        # Generar XML
+        xml_content = self._generate_xml(invoice)
+        self._journal_mark(filename, RunJournal.GENERATED)
+        
+        if self.signer is not None:
+            signed = self.signer.sign_xml(xml_content)
+            xml_content = signed.encode("utf-8") if isinstance(signed, str) else signed
+            self._journal_mark(filename, RunJournal.SIGNED)
+        
+        return filename, xml_content, self._package_xml(filename, xml_content)
+
+    def _package_xml(self, filename: str, xml_content: bytes) -> memoryview:
+        """ZIP en memoria con <filename>.xml; se encola en el archivador si hay"""
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w') as zf:
+            zf.writestr(f"{filename}.xml", xml_content)
+        body = buffer.getbuffer()
+        
+        if self.archiver:
+            self.archiver.submit(f"{filename}.zip", body)
+        
+        return body
+
+    def _document_id(self, invoice: Invoice) -> str:
+        """RUC-tipo-serie-número: nombre del ZIP y clave del registro de envíos"""
+        return SubmissionLedger.make_doc_id(self.ruc, '01' if invoice.is_factura else '03',
+                                            invoice.serie, invoice.invoice_number)
+
+    def _document_fingerprint(self, invoice: Invoice) -> str:
+        """
+        Huella del contenido del comprobante
+
+        A diferencia del hash del XML no depende de la fecha de emisión,
+        así que permite saber si un comprobante cambió entre dos lecturas.
+        """
+        digest = hashlib.sha256()
+        header = (invoice.serie, invoice.invoice_number, getattr(invoice, "customer_ruc", ""),
+                  getattr(invoice, "currency", ""), getattr(invoice, "emisor_name", ""),
+                  invoice.subtotal_cents, invoice.igv_cents, invoice.total_cents)
+        digest.update(repr(header).encode())
+        for product in invoice.products:
+            line = (getattr(product, "description", getattr(product, "product", "")),
+                    product.quantity, product.line_amount_cents, product.igv_cents)
+            digest.update(repr(line).encode())
+        return digest.hexdigest()
+
+    def _ledger_skip(self, invoices: List[Invoice],
+                     doc_ids: Optional[List[str]] = None) -> List[Optional[Dict[str, Any]]]:
+        """
+        Consulta en bloque el registro de envíos
+
+        Args:
+            invoices: Comprobantes a consultar
+            doc_ids: Identificadores ya calculados (por defecto _document_id)
+
+        Returns:
+            Por comprobante, None si debe enviarse o el resultado con
+            skipped=True si ya fue aceptado (o está en proceso) sin cambios
+        """
+        if not self.ledger:
+            return [None] * len(invoices)
+
         try:
-            url = self.token_url.format(self.client_id)
-            
-            data = {
-                "grant_type": "client_credentials",
-                "scope": "https://api.sunat.gob.pe/v1/contribuyente/contribuyentes",
-                "client_id": self.client_id,
-                "client_secret": self.client_secret
+            doc_ids = doc_ids or [self._document_id(invoice) for invoice in invoices]
+            entries = [{"doc_id": doc_id, "fingerprint": self._document_fingerprint(invoice)}
+                       for doc_id, invoice in zip(doc_ids, invoices)]
+            known = self.ledger.lookup_many(entry["doc_id"] for entry in entries)
+        except Exception as e:
+            # Sin registro se envía todo; SUNAT rechaza los duplicados
+            self.logger.error(f"Error consultando el registro de envíos: {str(e)}")
+            return [None] * len(invoices)
+
+        results: List[Optional[Dict[str, Any]]] = []
+        for entry in entries:
+            row = known.get(entry["doc_id"])
+            if (row is not None and row["status"] in SubmissionLedger.FINAL_STATUSES
+                    and row["fingerprint"] == entry["fingerprint"]):
+                results.append({
+                    "success": True,
+                    "skipped": True,
+                    "status": row["status"],
+                    "xml_hash": row["xml_hash"],
+                    "message": f"{entry['doc_id']} ya enviado sin cambios ({row['status']})"
+                })
+            else:
+                results.append(None)
+
+        skipped = sum(1 for result in results if result is not None)
+        if skipped:
+            self.logger.info(f"{skipped} de {len(invoices)} comprobantes omitidos: ya enviados sin cambios")
+        return results
+
+    def _skip_finished(self, invoices: List[Invoice],
+                       doc_ids: Optional[List[str]] = None) -> List[Optional[Dict[str, Any]]]:
+        """
+        Comprobantes que no hace falta enviar: los terminados según el diario
+        de la ejecución y, del resto, los ya enviados según el registro
+
+        Los que quedaron generados o firmados se vuelven a procesar. Los que
+        empezaron el envío sin éxito confirmado se consultan antes en SUNAT
+        (ticket o validarcomprobante): si ya los tiene se omiten, si no los
+        tiene se reenvían y si no se puede saber quedan con error, sin
+        reenviarlos.
+        """
+        doc_ids = doc_ids or [self._document_id(invoice) for invoice in invoices]
+        results: List[Optional[Dict[str, Any]]] = [None] * len(invoices)
+        if self.journal:
+            for i, doc_id in enumerate(doc_ids):
+                if self.journal.is_done(doc_id):
+                    results[i] = {
+                        "success": True,
+                        "skipped": True,
+                        "message": f"{doc_id} ya enviado en la ejecución anterior"
+                    }
+                    continue
+                info = self.journal.unconfirmed(doc_id)
+                if info is not None:
+                    results[i] = self._confirm_in_flight(doc_id, info)
+
+        rest = [i for i, result in enumerate(results) if result is None]
+        if self.ledger and rest:
+            known = self._ledger_skip([invoices[i] for i in rest], [doc_ids[i] for i in rest])
+            for i, result in zip(rest, known):
+                results[i] = result
+        return results
+
+    def _confirm_in_flight(self, doc_id: str, info: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Consulta en SUNAT un comprobante cuyo envío quedó sin confirmar
+
+        Lo implementa cada transporte, con _in_flight_query para armar la
+        consulta y _in_flight_result para interpretarla.
+
+        Args:
+            doc_id: Identificador del comprobante
+            info: fecha, monto y ticket anotados en el diario
+
+        Returns:
+            None si SUNAT no lo tiene y hay que enviarlo; si no, el resultado
+            con el que se omite (skipped=True) o el error de la consulta
+        """
+        raise NotImplementedError
+
+    def _in_flight_query(self, doc_id: str, info: Dict[str, Any]) -> Optional[Tuple[str, str, str, str, float]]:
+        """Argumentos de validarcomprobante (tipo, serie, número, fecha, monto) o None sin fecha anotada"""
+        if not info.get("fecha"):
+            return None
+        _, code, serie, numero = doc_id.rsplit("-", 3)
+        tipo = next((name for name, value in self.TIPOS_COMPROBANTE.items() if value == code), code)
+        return tipo, serie, numero, info["fecha"], info.get("monto") or 0
+
+    def _in_flight_result(self, doc_id: str, check: Optional[Dict[str, Any]],
+                          ticket: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Resultado de la consulta de un envío sin confirmar
+
+        Args:
+            doc_id: Identificador del comprobante
+            check: Resultado de consultar_ticket o de validar_comprobante
+                (None si no había forma de consultarlo)
+            ticket: Ticket consultado, si la consulta fue por ticket
+        """
+        if check is None or not check.get("success"):
+            reason = "sin fecha ni ticket anotados" if check is None else check.get("error") or check.get("message")
+            self.logger.error(f"No se pudo confirmar si {doc_id} llegó a SUNAT: {reason}")
+            return {
+                "success": False,
+                "skipped": False,
+                "error": f"envío sin confirmar, no se reenvía: {reason}"
             }
-            
-            headers = {
-                "Content-Type": "application/x-www-form-urlencoded"
+
+        if ticket is None and check.get("estado_cp") == "0":
+            self.logger.info(f"{doc_id} no llegó a SUNAT en la ejecución anterior, se reenvía")
+            return None
+        if check.get("status") == SubmissionLedger.REJECTED:
+            return {
+                "success": False,
+                "skipped": False,
+                "error": f"rechazado por SUNAT (ticket {ticket}): {check.get('message')}"
             }
 
-            self.logger.debug(f"Solicitando token a: {url}")
-            response = requests.post(url, data=data, headers=headers)
-            
-            if response.status_code == 200:
-                self.token = response.json()["access_token"]
-                self.logger.info("Token obtenido exitosamente")
-                return True
-            else:
-                self.logger.error(f"Error obteniendo token: {response.text}")
-                return False
+        self._journal_mark(doc_id, RunJournal.SENT, ok=True, ticket=ticket, confirmed=True)
+        status = check.get("status") or f"estadoCp {check.get('estado_cp')}"
+        return {
+            "success": True,
+            "skipped": True,
+            "status": check.get("status"),
+            "message": f"{doc_id} ya recibido por SUNAT en la ejecución anterior ({status})"
+        }
+
+    def _sending_info(self, invoice: Invoice, issued: Optional[date] = None) -> Dict[str, Any]:
+        """Fecha de emisión e importe que se anotan al empezar el envío (para validarcomprobante)"""
+        return {"fecha": f"{issued or date.today():%d/%m/%Y}", "monto": invoice.total_cents / 100}
 
+    def _journal_mark(self, doc_id: str, stage: str, **info: Any) -> None:
+        """Anota una etapa en el diario de la ejecución (si hay)"""
+        if not self.journal:
+            return
+        try:
+            self.journal.mark(doc_id, stage, **info)
         except Exception as e:
-            self.logger.error(f"Error en autenticación: {str(e)}")
-            return False
+            self.logger.error(f"Error escribiendo el diario para {doc_id}: {str(e)}")
 
-    def create_invoice(self, invoice: Invoice) -> Dict[str, Any]:
-        """Crea y envía una factura a SUNAT"""
+    def _journal_sent(self, doc_id: str, result: Dict[str, Any]) -> None:
+        """Anota el resultado del envío y, si SUNAT devolvió el CDR, su recepción"""
+        if not self.journal:
+            return
+        cdr = result.get("cdr") or {}
+        self._journal_mark(doc_id, RunJournal.SENT, ok=result["success"],
+                           xml_hash=result.get("xml_hash"), ticket=cdr.get("numTicket"))
+        if result["success"] and self._cdr_status(cdr)[0] != SubmissionLedger.PENDING:
+            self._journal_mark(doc_id, RunJournal.CDR, code=str(cdr.get("codRespuesta")))
+
+    @staticmethod
+    def _cdr_status(cdr: Dict[str, Any]) -> Tuple[str, Optional[str]]:
+        """Estado para el registro a partir de la respuesta de envío: (estado, código)"""
+        code = cdr.get("codRespuesta")
+        if code is None or str(code) == "98":
+            # Solo ticket, o SUNAT aún procesa el comprobante
+            return SubmissionLedger.PENDING, code
+        if str(code) == "0":
+            return SubmissionLedger.ACCEPTED, str(code)
+        return SubmissionLedger.REJECTED, str(code)
+
+    def _record_submission(self, filename: str, fingerprint: Optional[str], result: Dict[str, Any]) -> None:
+        """Guarda el resultado del envío en el registro (si hay)"""
+        if not self.ledger:
+            return
         try:
-            # Generar XML
-            xml_content = self._generate_xml(invoice)
-            
-            # Crear nombre de archivo
-            filename = f"{self.ruc}-{'01' if invoice.is_factura else '03'}-{invoice.serie}-{invoice.invoice_number}"
-            
-            # Crear ZIP
-            zip_filename = f"{filename}.zip"
-            with zipfile.ZipFile(zip_filename, 'w') as zf:
-                zf.writestr(f"{filename}.xml", xml_content)
-            
-            # Enviar a SUNAT
-            if not self.token and not self.get_token():
-                raise Exception("No se pudo obtener el token")
-            
-            headers = {
-                "Authorization": f"Bearer {self.token}",
-                "Content-Type": "application/zip"
-            }
-            
-            with open(zip_filename, 'rb') as f:
-                response = requests.post(
-                    f"{self.base_url}/contribuyente/gem/comprobantes/envio",
-                    headers=headers,
-                    data=f.read()
-                )
-            
-            # Procesar respuesta
-            if response.status_code == 200:
-                cdr = response.json()
-                self.logger.info(f"Comprobante {filename} enviado exitosamente")
-                return {
-                    "success": True,
-                    "cdr": cdr,
-                    "xml_hash": hashlib.sha256(xml_content).hexdigest()
-                }
+            if result["success"]:
+                cdr = result.get("cdr") or {}
+                status, code = self._cdr_status(cdr)
+                self.ledger.record(filename, fingerprint, status, xml_hash=result.get("xml_hash"),
+                                   cdr_code=code, ticket=cdr.get("numTicket"))
             else:
-                self.logger.error(f"Error enviando comprobante: {response.text}")
-                return {
-                    "success": False,
-                    "error": response.text
-                }
-                
+                self.ledger.record(filename, fingerprint, SubmissionLedger.ERROR,
+                                   message=str(result.get("error"))[:500])
         except Exception as e:
-            self.logger.error(f"Error en create_invoice: {str(e)}")
+            self.logger.error(f"Error guardando {filename} en el registro de envíos: {str(e)}")
+
+    def _invoice_result(self, filename: str, xml_content: bytes, status_code: int,
+                        get_json: Optional[Callable[[], Dict[str, Any]]], text: str) -> Dict[str, Any]:
+        """Convierte la respuesta del envío en el resultado de create_invoice"""
+        if status_code == 200:
+            cdr = get_json()
+            self.logger.info(f"Comprobante {filename} enviado exitosamente")
+            return {
+                "success": True,
+                "cdr": cdr,
+                "xml_hash": hashlib.sha256(xml_content).hexdigest()
+            }
+        else:
+            self.logger.error(f"Error enviando comprobante: {text}")
             return {
                 "success": False,
-                "error": str(e)
+                "error": text
             }
 
-    def _generate_xml(self, invoice: Invoice) -> str:
-        """Genera el XML UBL 2.1 para SUNAT"""
+    def _ticket_result(self, ticket: str, status_code: int,
+                       get_json: Optional[Callable[[], Dict[str, Any]]], text: str) -> Dict[str, Any]:
+        """
+        Convierte la respuesta de la consulta de ticket
+
+        Returns:
+            Dict con success, status (pending, accepted o rejected), cdr_code,
+            cdr (ZIP del CDR si SUNAT lo generó) y message
+        """
+        if status_code != 200:
+            return {"success": False, "error": text, "status_code": status_code}
+
+        data = get_json()
+        code = str(data.get("codRespuesta", self.TICKET_EN_PROCESO))
+        cdr_zip = data.get("arcCdr")
+        result = {
+            "success": True,
+            "ticket": ticket,
+            "cdr_code": code,
+            "cdr": base64.b64decode(cdr_zip) if cdr_zip else None,
+            "message": (data.get("error") or {}).get("desError")
+        }
+        if code == self.TICKET_EN_PROCESO:
+            result["status"] = SubmissionLedger.PENDING
+        elif code == "0":
+            result["status"] = SubmissionLedger.ACCEPTED
+        else:
+            result["status"] = SubmissionLedger.REJECTED
+        return result
+
+    def _validation_payload(self, tipo: str, serie: str, numero: str, fecha: str, monto: float) -> Dict[str, Any]:
+        """Cuerpo de la petición de validarcomprobante"""
+        return {
+            "numRuc": self.ruc,
+            "codComp": self.TIPOS_COMPROBANTE.get(tipo),
+            "numeroSerie": serie,
+            "numero": numero,
+            "fechaEmision": fecha,
+            "monto": monto
+        }
+
+    def _validation_result(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        """Convierte la respuesta de validarcomprobante en el resultado"""
+        return {
+            "success": True,
+            "estado_cp": result["data"]["estadoCp"],
+            "estado_ruc": result["data"]["estadoRuc"],
+            "cond_domi_ruc": result["data"]["condDomiRuc"],
+            "observaciones": result["data"].get("Observaciones", [])
+        }
+
+    def _validation_from_cache(self, key: str) -> Optional[Dict[str, Any]]:
+        """Resultado de validación en caché, marcado con from_cache"""
+        if not self.validation_cache:
+            return None
+        result = self.validation_cache.get(key)
+        if result is not None:
+            result["from_cache"] = True
+            self.logger.debug(f"Validación obtenida de caché: {key}")
+        return result
+
+    def _store_validation(self, key: str, result: Dict[str, Any]) -> None:
+        if self.validation_cache:
+            self.validation_cache.put(key, result)
+
+    def _generate_xml(self, invoice: Invoice, issued_at: Optional[datetime] = None) -> bytes:
+        """
+        Genera el XML UBL 2.1 para SUNAT
+
+        Usa la plantilla precompilada (UBLInvoiceTemplate) salvo que
+        use_xml_template sea False; ambas rutas producen los mismos bytes.
+
+        Args:
+            invoice: Comprobante a generar
+            issued_at: Fecha y hora de emisión (por defecto, ahora)
+        """
         try:
-            # Crear elemento raíz con namespaces
-            root = ET.Element("Invoice", self.XML_NAMESPACES)
-            
-            # Versión UBL y personalización
-            ET.SubElement(root, "cbc:UBLVersionID").text = "2.1"
-            ET.SubElement(root, "cbc:CustomizationID").text = "2.0"
-            
-            # ID del documento (serie-número)
-            ET.SubElement(root, "cbc:ID").text = f"{invoice.serie}-{invoice.invoice_number}"
-            
-            # Fecha y hora de emisión
-            now = datetime.now()
-            ET.SubElement(root, "cbc:IssueDate").text = now.strftime("%Y-%m-%d")
-            ET.SubElement(root, "cbc:IssueTime").text = now.strftime("%H:%M:%S")
-            
-            # Tipo de documento
-            ET.SubElement(root, "cbc:InvoiceTypeCode").text = "01" if invoice.is_factura else "03"
-            
-            # Moneda
-            ET.SubElement(root, "cbc:DocumentCurrencyCode").text = "PEN" if invoice.currency == "SOL" else "USD"
-            
-            # Datos del emisor
-            supplier = ET.SubElement(root, "cac:AccountingSupplierParty")
-            party = ET.SubElement(supplier, "cac:Party")
-            
-            party_identification = ET.SubElement(party, "cac:PartyIdentification")
-            ET.SubElement(party_identification, "cbc:ID", schemeID="6").text = self.ruc
-            
-            party_name = ET.SubElement(party, "cac:PartyName")
-            ET.SubElement(party_name, "cbc:Name").text = invoice.emisor_name
-            
-            # Datos del cliente
-            customer = ET.SubElement(root, "cac:AccountingCustomerParty")
-            customer_party = ET.SubElement(customer, "cac:Party")
-            
-            customer_identification = ET.SubElement(customer_party, "cac:PartyIdentification")
-            doc_type = "6" if len(invoice.customer_ruc) == 11 else "1"
-            ET.SubElement(customer_identification, "cbc:ID", schemeID=doc_type).text = invoice.customer_ruc
-            
-            # Totales
-            tax_total = ET.SubElement(root, "cac:TaxTotal")
-            total_igv = sum(self._calculate_igv(item.unit_value * item.quantity) for item in invoice.products)
-            ET.SubElement(tax_total, "cbc:TaxAmount", currencyID=invoice.currency).text = str(total_igv)
-            
-            # Items
-            for idx, item in enumerate(invoice.products, 1):
-                self._add_invoice_line(root, idx, item, invoice.currency)
-            
-            # Generar XML
-            xml_string = ET.tostring(root, encoding="ISO-8859-1")
+            issued_at = issued_at or datetime.now()
+            if self.use_xml_template:
+                xml_string = self._get_ubl_template().render(invoice, issued_at)
+            else:
+                xml_string = self._build_xml_tree(invoice, issued_at)
             
             # Calcular hash
             xml_hash = hashlib.sha256(xml_string).hexdigest()
@@ -184,6 +457,63 @@ class SunatAPI:
             self.logger.error(f"Error generando XML: {str(e)}")
             raise
 
+    def _get_ubl_template(self) -> UBLInvoiceTemplate:
+        """Plantilla UBL de este emisor (se crea en el primer uso)"""
+        if self._ubl_template is None or self._ubl_template.ruc != self.ruc:
+            self._ubl_template = UBLInvoiceTemplate(self)
+        return self._ubl_template
+
+    def _build_xml_tree(self, invoice: Invoice, issued_at: datetime) -> bytes:
+        """Genera el XML UBL 2.1 elemento por elemento con ElementTree"""
+        # Crear elemento raíz con namespaces
+        root = ET.Element("Invoice", self.XML_NAMESPACES)
+        
+        # Versión UBL y personalización
+        ET.SubElement(root, "cbc:UBLVersionID").text = "2.1"
+        ET.SubElement(root, "cbc:CustomizationID").text = "2.0"
+        
+        # ID del documento (serie-número)
+        ET.SubElement(root, "cbc:ID").text = f"{invoice.serie}-{invoice.invoice_number}"
+        
+        # Fecha y hora de emisión
+        ET.SubElement(root, "cbc:IssueDate").text = issued_at.strftime("%Y-%m-%d")
+        ET.SubElement(root, "cbc:IssueTime").text = issued_at.strftime("%H:%M:%S")
+        
+        # Tipo de documento
+        ET.SubElement(root, "cbc:InvoiceTypeCode").text = "01" if invoice.is_factura else "03"
+        
+        # Moneda
+        ET.SubElement(root, "cbc:DocumentCurrencyCode").text = "PEN" if invoice.currency == "SOL" else "USD"
+        
+        # Datos del emisor
+        supplier = ET.SubElement(root, "cac:AccountingSupplierParty")
+        party = ET.SubElement(supplier, "cac:Party")
+        
+        party_identification = ET.SubElement(party, "cac:PartyIdentification")
+        ET.SubElement(party_identification, "cbc:ID", schemeID="6").text = self.ruc
+        
+        party_name = ET.SubElement(party, "cac:PartyName")
+        ET.SubElement(party_name, "cbc:Name").text = invoice.emisor_name
+        
+        # Datos del cliente
+        customer = ET.SubElement(root, "cac:AccountingCustomerParty")
+        customer_party = ET.SubElement(customer, "cac:Party")
+        
+        customer_identification = ET.SubElement(customer_party, "cac:PartyIdentification")
+        doc_type = identity_document_type(invoice.customer_ruc)
+        ET.SubElement(customer_identification, "cbc:ID", schemeID=doc_type).text = invoice.customer_ruc
+        
+        # Totales
+        tax_total = ET.SubElement(root, "cac:TaxTotal")
+        ET.SubElement(tax_total, "cbc:TaxAmount", currencyID=invoice.currency).text = str(self._tax_total_amount(invoice))
+        
+        # Items
+        for idx, item in enumerate(invoice.products, 1):
+            self._add_invoice_line(root, idx, item, invoice.currency)
+        
+        # Generar XML
+        return ET.tostring(root, encoding="ISO-8859-1")
+
     def _add_invoice_line(self, root: ET.Element, line_number: int, product: Any, currency: str):
         """Agrega una línea de factura al XML"""
         line = ET.SubElement(root, "cac:InvoiceLine")
@@ -193,20 +523,15 @@ class SunatAPI:
         ET.SubElement(line, "cbc:InvoicedQuantity", 
                      unitCode=product.unit_measure).text = str(product.quantity)
         
-        # Valores
-        unit_value = product.unit_value
-        igv = self._calculate_igv(unit_value)
-        line_total = unit_value * product.quantity
-        
         # Precio unitario
         price = ET.SubElement(line, "cac:Price")
         ET.SubElement(price, "cbc:PriceAmount", 
-                     currencyID=currency).text = str(unit_value)
+                     currencyID=currency).text = str(product.unit_value)
         
         # IGV
         tax_total = ET.SubElement(line, "cac:TaxTotal")
         ET.SubElement(tax_total, "cbc:TaxAmount", 
-                     currencyID=currency).text = str(igv * product.quantity)
+                     currencyID=currency).text = str(self._line_tax_amount(product))
         
         # Descripción
         item = ET.SubElement(line, "cac:Item")
@@ -248,20 +573,362 @@ class SunatAPI:
                 "unidad": product.unit_measure,
                 "cantidad": product.quantity,
                 "valorUnitario": product.unit_value,
-                "igv": self._calculate_igv(product.unit_value),
+                "igv": product.igv_cents / 100,
                 "tipAfectacion": "10"  # Gravado - Operación Onerosa
             })
         return items
 
-    def _calculate_igv(self, unit_value: float) -> float:
-        """Calcular IGV (18%)"""
-        return round(unit_value * 0.18, 2)
+    def _tax_total_amount(self, invoice: Invoice) -> str:
+        """IGV total del comprobante (precalculado al leer el Excel)"""
+        return format_cents(invoice.igv_cents)
+
+    def _line_tax_amount(self, product: Any) -> str:
+        """IGV de una línea (precalculado al leer el Excel)"""
+        return format_cents(product.igv_cents)
+
+
+class SunatAPI(SunatDocumentBuilder):
+    def __init__(self, ruc: str = None, client_id: str = None, client_secret: str = None,
+                 session: Optional[SunatHTTPSession] = None,
+                 token_manager: Optional[TokenManager] = None,
+                 archive_dir: Optional[str] = None,
+                 validation_cache: Optional[ValidationCache] = None,
+                 ledger: Optional[SubmissionLedger] = None):
+        """
+        Inicializa el API de SUNAT con credenciales
+
+        Args:
+            session: Sesión HTTP con pool de conexiones a reutilizar. Si no se
+                indica se crea una con la configuración por defecto.
+            token_manager: Caché de token compartida. Por defecto se usa la
+                caché en disco asociada al client_id.
+            archive_dir: Directorio donde guardar en segundo plano los ZIP
+                enviados. Por defecto no se guardan.
+            validation_cache: Caché de resultados de validarcomprobante
+            ledger: Registro de envíos; los lotes omiten los comprobantes ya
+                aceptados cuyo contenido no cambió
+        """
+        load_dotenv()
+        self.ruc = ruc or os.getenv("SUNAT_RUC")
+        self.client_id = client_id or os.getenv("SUNAT_CLIENT_ID")
+        self.client_secret = client_secret or os.getenv("SUNAT_CLIENT_SECRET")
+        self.logger = logging.getLogger('sunat_api')
+        self.session = session or SunatHTTPSession()
+        self.token_manager = token_manager or TokenManager(self._request_token, self.client_id)
+        self.archiver = ZipArchiver(archive_dir) if archive_dir else None
+        self.validation_cache = validation_cache
+        self.ledger = ledger
+        
+        # URLs del API
+        self.token_url = "https://api-seguridad.sunat.gob.pe/v1/clientesextranet/{}/oauth2/token/"
+        self.base_url = "https://api.sunat.gob.pe/v1/contribuyente/contribuyentes"
+        
+        self.logger.info(f"SunatAPI inicializado para RUC: {self.ruc}")
+
+    @property
+    def token(self) -> Optional[str]:
+        """Token vigente en caché (None si no hay o expiró)"""
+        return self.token_manager.token
+
+    def get_token(self, force: bool = False) -> bool:
+        """
+        Obtener token de autenticación
+
+        Reutiliza el token en caché mientras siga vigente; force=True
+        solicita uno nuevo.
+        """
+        try:
+            self.token_manager.get_token(force=force)
+            return True
+        except Exception as e:
+            self.logger.error(f"Error en autenticación: {str(e)}")
+            return False
+
+    def _request_token(self) -> Dict[str, Any]:
+        """Solicita un token nuevo al endpoint de api-seguridad"""
+        url, data, headers = self._token_request()
+
+        self.logger.debug(f"Solicitando token a: {url}")
+        response = self.session.post(url, data=data, headers=headers)
+
+        if response.status_code != 200:
+            raise TokenError(f"Error obteniendo token: {response.text}")
+
+        self.logger.info("Token obtenido exitosamente")
+        return response.json()
+
+    def _post_authorized(self, url: str, headers: Dict[str, str], **kwargs) -> requests.Response:
+        """POST con token Bearer; ante un 401 renueva el token y reintenta una vez"""
+        return self._request_authorized("POST", url, headers, **kwargs)
+
+    def _request_authorized(self, method: str, url: str, headers: Dict[str, str], **kwargs) -> requests.Response:
+        token = self.token_manager.get_token()
+        response = self.session.request(method, url, headers=dict(headers, Authorization=f"Bearer {token}"),
+                                        **kwargs)
+
+        if response.status_code == 401:
+            self.logger.warning("Token rechazado por SUNAT (401), renovando...")
+            self.token_manager.invalidate(token)
+            token = self.token_manager.get_token()
+            response = self.session.request(method, url, headers=dict(headers, Authorization=f"Bearer {token}"),
+                                            **kwargs)
+
+        return response
+
+    def create_invoice(self, invoice: Invoice) -> Dict[str, Any]:
+        """Crea y envía una factura a SUNAT"""
+        try:
+            filename, xml_content, body = self._build_invoice_package(invoice)
+            self._journal_mark(filename, RunJournal.SENDING, **self._sending_info(invoice))
+            result = self._send_package(filename, xml_content, body)
+            self._journal_sent(filename, result)
+            if self.ledger:
+                self._record_submission(filename, self._document_fingerprint(invoice), result)
+            return result
+                
+        except Exception as e:
+            self.logger.error(f"Error en create_invoice: {str(e)}")
+            return {
+                "success": False,
+                "error": str(e)
+            }
+
+    def _send_package(self, filename: str, xml_content: bytes, body: memoryview) -> Dict[str, Any]:
+        """Envía a SUNAT un ZIP ya generado"""
+        response = self._post_authorized(
+            f"{self.base_url}{self.ENVIO_PATH}",
+            headers={"Content-Type": "application/zip"},
+            data=body
+        )
+        
+        return self._invoice_result(filename, xml_content, response.status_code,
+                                    response.json if response.status_code == 200 else None,
+                                    response.text)
+
+    def _confirm_in_flight(self, doc_id: str, info: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        ticket = info.get("ticket")
+        if ticket:
+            return self._in_flight_result(doc_id, self.consultar_ticket(ticket), ticket)
+        query = self._in_flight_query(doc_id, info)
+        check = self.validar_comprobante(*query, use_cache=False) if query else None
+        return self._in_flight_result(doc_id, check)
+
+    def consultar_ticket(self, ticket: str) -> Dict[str, Any]:
+        """
+        Consulta el estado de un envío asíncrono (resumen, baja o envío diferido)
+
+        Returns:
+            Dict con success y, si la consulta respondió, status (pending,
+            accepted o rejected), cdr_code y cdr (bytes del ZIP o None)
+        """
+        try:
+            response = self._request_authorized("GET", f"{self.base_url}{self.TICKET_PATH.format(ticket)}", {})
+            return self._ticket_result(ticket, response.status_code,
+                                       response.json if response.status_code == 200 else None,
+                                       response.text)
+        except Exception as e:
+            self.logger.error(f"Error consultando ticket {ticket}: {str(e)}")
+            return {"success": False, "error": str(e)}
+
+    def submit_batch(self, invoices: Iterable[Invoice], workers: int = 4,
+                     send: Optional[Callable[[Invoice], Dict[str, Any]]] = None,
+                     cancel_event: Optional[threading.Event] = None,
+                     retain_results: bool = True) -> BatchSubmission:
+        """
+        Envía un lote de comprobantes en paralelo
+
+        Args:
+            invoices: Comprobantes a enviar (lista o generador)
+            workers: Número de envíos simultáneos
+            send: Función de envío por comprobante (por defecto create_invoice)
+            cancel_event: Evento compartido para cancelar el lote
+            retain_results: False para no guardar los resultados entregados
+                por as_completed (entrada en streaming con memoria acotada)
+
+        Con registro de envíos, los comprobantes ya aceptados sin cambios no se
+        envían y su resultado llega con skipped=True; con diario de ejecución,
+        tampoco los terminados en la ejecución que se reanuda.
+
+        Returns:
+            BatchSubmission: Permite iterar resultados en orden o según terminan
+        """
+        if workers > self.session.pool_maxsize:
+            self.logger.warning(
+                f"{workers} hilos con un pool de {self.session.pool_maxsize} conexiones por host: "
+                "las conexiones sobrantes no se reutilizarán"
+            )
+        return BatchSubmission(send or self.create_invoice, invoices, workers, cancel_event,
+                               skip=self._skip_finished if self.ledger or self.journal else None,
+                               retain_results=retain_results)
+
+    def send_daily_summary(self, boletas: Iterable[Invoice], reference_date: Optional[date] = None,
+                           signer: Any = None, emisor_name: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Envía las boletas agrupadas en Resúmenes Diarios de hasta 500 líneas
+
+        Cada resumen es una sola petición; SUNAT responde con un ticket que
+        se guarda en el registro de envíos para el resumen y para cada una de
+        sus boletas. Con registro, las boletas ya enviadas sin cambios se
+        omiten y el correlativo RC del día continúa el último registrado.
+
+        Args:
+            boletas: Boletas a declarar
+            reference_date: Fecha de emisión de las boletas que no tengan
+                atributo date (por defecto hoy)
+            signer: Firmador del XML (SunatXMLSigner), opcional
+            emisor_name: Razón social (por defecto la de la primera boleta)
+
+        Returns:
+            List con el resultado de cada resumen: success, summary_id,
+            ticket y documents (serie-número de sus boletas). Las boletas
+            cuyo envío anterior no se pudo confirmar llegan como un resultado
+            con error y summary_id None.
+        """
+        boletas = list(boletas)
+        if not boletas:
+            return []
+
+        # Las boletas llevan serie B aunque el lector las haya numerado como facturas
+        doc_ids = [SubmissionLedger.make_doc_id(self.ruc, '03', document_serie('03', b.invoice_number),
+                                                b.invoice_number) for b in boletas]
+        presets = self._skip_finished(boletas, doc_ids)
+        pending = [(doc_id, boleta) for doc_id, boleta, preset in zip(doc_ids, boletas, presets) if preset is None]
+
+        # Envíos de la ejecución anterior que no se pudieron confirmar: no se reenvían
+        results = [{"success": False, "summary_id": None, "ticket": None,
+                    "documents": [boleta_id(boleta)], "error": preset["error"]}
+                   for boleta, preset in zip(boletas, presets) if preset is not None and not preset["success"]]
+
+        # Un resumen solo agrupa boletas de una misma fecha de emisión
+        by_date: Dict[date, List[Tuple[str, Invoice]]] = {}
+        default_date = reference_date or date.today()
+        for doc_id, boleta in pending:
+            issued = getattr(boleta, "date", None) or default_date
+            issued = issued.date() if isinstance(issued, datetime) else issued
+            by_date.setdefault(issued, []).append((doc_id, boleta))
+
+        builder = DailySummaryBuilder(self.ruc, emisor_name or getattr(boletas[0], "emisor_name", ""))
+        issue_date = date.today()
+        sequence = self.ledger.next_summary_sequence(self.ruc, f"{issue_date:%Y%m%d}") if self.ledger else 1
+        first_sequence = sequence
+
+        for day in sorted(by_date):
+            entries = by_date[day]
+            ids = {id(boleta): doc_id for doc_id, boleta in entries}
+            for summary in builder.group([b for _, b in entries], day, issue_date, sequence):
+                sequence += 1
+                summary_ids = [ids[id(b)] for b in summary.invoices]
+                for doc_id, boleta in zip(summary_ids, summary.invoices):
+                    self._journal_mark(doc_id, RunJournal.SENDING, summary=summary.summary_id,
+                                       **self._sending_info(boleta, day))
+                result = self._send_summary(builder, summary, signer)
+                results.append(result)
+                for doc_id in summary_ids:
+                    self._journal_mark(doc_id, RunJournal.SENT, ok=result["success"], ticket=result["ticket"])
+                if self.ledger:
+                    self._record_summary(summary, summary_ids, result)
+
+        self.logger.info(
+            f"{len(pending)} boletas enviadas en {sequence - first_sequence} resúmenes diarios "
+            f"({len(boletas) - len(pending)} omitidas por estar ya enviadas)"
+        )
+        return results
+
+    def _send_summary(self, builder: DailySummaryBuilder, summary: Any, signer: Any) -> Dict[str, Any]:
+        """Genera, firma, comprime y envía un resumen"""
+        filename = f"{self.ruc}-{summary.summary_id}"
+        try:
+            xml_content = builder.build_xml(summary)
+            if signer is not None:
+                signed = signer.sign_xml(xml_content)
+                xml_content = signed.encode("utf-8") if isinstance(signed, str) else signed
+
+            result = self._send_package(filename, xml_content, self._package_xml(filename, xml_content))
+        except Exception as e:
+            self.logger.error(f"Error enviando resumen {summary.summary_id}: {str(e)}")
+            result = {"success": False, "error": str(e)}
+
+        result["summary_id"] = summary.summary_id
+        result["ticket"] = (result.get("cdr") or {}).get("numTicket")
+        result["documents"] = summary.document_ids
+        if result["success"]:
+            self.logger.info(f"Resumen {summary} enviado, ticket {result['ticket']}")
+        return result
+
+    def _record_summary(self, summary: Any, doc_ids: List[str], result: Dict[str, Any]) -> None:
+        """Registra el resumen y el estado de cada boleta con el ticket recibido"""
+        if result["success"]:
+            status, code = self._cdr_status(result.get("cdr") or {})
+        else:
+            status, code = SubmissionLedger.ERROR, None
+        message = None if result["success"] else str(result.get("error"))[:500]
+
+        rows = [{
+            "doc_id": f"{self.ruc}-{summary.summary_id}",
+            "xml_hash": result.get("xml_hash"),
+            "status": status, "cdr_code": code, "ticket": result["ticket"], "message": message
+        }]
+        for doc_id, boleta in zip(doc_ids, summary.invoices):
+            rows.append({
+                "doc_id": doc_id, "fingerprint": self._document_fingerprint(boleta),
+                "status": status, "cdr_code": code, "ticket": result["ticket"],
+                "message": message or summary.summary_id
+            })
+        try:
+            self.ledger.record_many(rows)
+        except Exception as e:
+            self.logger.error(f"Error guardando el resumen {summary.summary_id} en el registro: {str(e)}")
+
+    def create_pipeline(self, signer: Any = None, workers: Optional[Dict[str, int]] = None,
+                        queue_size: int = 32, cancel_event: Optional[threading.Event] = None,
+                        on_result: Optional[Callable[[Any], None]] = None) -> InvoicePipeline:
+        """
+        Pipeline por etapas (generar, firmar, comprimir, enviar) con colas acotadas
+
+        Args:
+            signer: Firmador del XML (SunatXMLSigner); sin él no hay etapa de firma
+            workers: Hilos por etapa, p. ej. {"generate": 2, "send": 8}
+            queue_size: Capacidad de cada cola entre etapas
+            cancel_event: Evento compartido para cancelar
+            on_result: Llamada con cada InvoiceResult según se completa
+
+        Returns:
+            InvoicePipeline: run(invoices) procesa y stats() da el uso por etapa
+        """
+        pipeline = InvoicePipeline(self, signer, workers, queue_size, cancel_event, on_result)
+        send_workers = pipeline.stages[-1].workers
+        if send_workers > self.session.pool_maxsize:
+            self.logger.warning(
+                f"{send_workers} hilos de envío con un pool de {self.session.pool_maxsize} conexiones "
+                "por host: las conexiones sobrantes no se reutilizarán"
+            )
+        return pipeline
+
+    def connection_stats(self) -> Dict[str, Any]:
+        """Estadísticas de reutilización de conexiones del pool HTTP"""
+        return self.session.connection_stats()
+
+    def transport_state(self) -> Dict[str, Dict[str, Any]]:
+        """Concurrencia, circuito y reintentos por endpoint"""
+        return self.session.transport_state()
+
+    def close(self) -> None:
+        """Cierra el pool HTTP y el registro de envíos, termina el archivo de ZIP y guarda
+        la caché de validación"""
+        if self.archiver:
+            self.archiver.close()
+        if self.validation_cache:
+            self.validation_cache.save()
+        if self.ledger:
+            self.ledger.close()
+        self.token_manager.close()
+        self.session.close()
 
     def test_connection(self) -> bool:
         """Prueba la conexión y las credenciales"""
         try:
             self.logger.info("Probando conexión con SUNAT...")
-            if self.get_token():
+            if self.get_token(force=True):
                 self.logger.info("Conexión exitosa - Token obtenido")
                 return True
             return False
@@ -269,40 +936,28 @@ class SunatAPI:
             self.logger.error(f"Error probando conexión: {str(e)}")
             return False
 
-    def validar_comprobante(self, tipo: str, serie: str, numero: str, fecha: str, monto: float) -> Dict[str, Any]:
-        """Validar un comprobante de pago"""
+    def validar_comprobante(self, tipo: str, serie: str, numero: str, fecha: str, monto: float,
+                            use_cache: bool = True) -> Dict[str, Any]:
+        """Validar un comprobante de pago (consulta primero la caché de validación, salvo use_cache=False)"""
+        cache_key = ValidationCache.make_key(tipo, serie, numero, fecha, monto)
+        cached = self._validation_from_cache(cache_key) if use_cache else None
+        if cached is not None:
+            return cached
+
         if not self.token and not self.get_token():
             return {"success": False, "message": "No se pudo obtener el token"}
 
         try:
             url = f"{self.base_url}/{self.ruc}/validarcomprobante"
-            
-            headers = {
-                "Authorization": f"Bearer {self.token}",
-                "Content-Type": "application/json"
-            }
-
-            data = {
-                "numRuc": self.ruc,
-                "codComp": self.TIPOS_COMPROBANTE.get(tipo),
-                "numeroSerie": serie,
-                "numero": numero,
-                "fechaEmision": fecha,
-                "monto": monto
-            }
+            data = self._validation_payload(tipo, serie, numero, fecha, monto)
 
             self.logger.debug(f"Validando comprobante: {data}")
-            response = requests.post(url, json=data, headers=headers)
+            response = self._post_authorized(url, json=data, headers={"Content-Type": "application/json"})
             
             if response.status_code == 200:
-                result = response.json()
-                return {
-                    "success": True,
-                    "estado_cp": result["data"]["estadoCp"],
-                    "estado_ruc": result["data"]["estadoRuc"],
-                    "cond_domi_ruc": result["data"]["condDomiRuc"],
-                    "observaciones": result["data"].get("Observaciones", [])
-                }
+                result = self._validation_result(response.json())
+                self._store_validation(cache_key, result)
+                return result
             else:
                 return {
                     "success": False,
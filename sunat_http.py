@@ -0,0 +1,318 @@
+import threading
+import logging
+import time
+from typing import Dict, Any, Optional, Tuple
+
+from flow_control import AdaptiveLimiter, CircuitBreaker, CircuitOpenError, backoff_delay
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+from urllib3.poolmanager import PoolManager
+
+logger = logging.getLogger(__name__)
+
+
+class ConnectionStats:
+    """Contadores de peticiones y handshakes por host (thread-safe)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._hosts: Dict[str, Dict[str, int]] = {}
+
+    def _host(self, host: str) -> Dict[str, int]:
+        return self._hosts.setdefault(host, {"requests": 0, "connections": 0})
+
+    def record_request(self, host: str) -> None:
+        with self._lock:
+            self._host(host)["requests"] += 1
+
+    def record_connection(self, host: str) -> None:
+        with self._lock:
+            self._host(host)["connections"] += 1
+
+    def reset(self) -> None:
+        with self._lock:
+            self._hosts = {}
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Devuelve una copia de las estadísticas
+
+        Returns:
+            Dict con totales (requests, connections, reused, reuse_ratio)
+            y el detalle por host
+        """
+        with self._lock:
+            hosts = {host: dict(values) for host, values in self._hosts.items()}
+
+        for values in hosts.values():
+            values["reused"] = max(values["requests"] - values["connections"], 0)
+
+        total_requests = sum(v["requests"] for v in hosts.values())
+        total_connections = sum(v["connections"] for v in hosts.values())
+        reused = max(total_requests - total_connections, 0)
+        return {
+            "requests": total_requests,
+            "connections": total_connections,
+            "reused": reused,
+            "reuse_ratio": round(reused / total_requests, 4) if total_requests else 0.0,
+            "hosts": hosts
+        }
+
+
+class _CountingPoolManager(PoolManager):
+    """PoolManager que registra cada conexión TCP/TLS abierta"""
+
+    def __init__(self, stats: ConnectionStats, **kwargs):
+        super().__init__(**kwargs)
+        self.stats = stats
+
+    def _new_pool(self, scheme, host, port, request_context=None):
+        pool = super()._new_pool(scheme, host, port, request_context)
+        stats = self.stats
+        new_conn = pool._new_conn
+
+        def _counted_new_conn():
+            conn = new_conn()
+            connect = conn.connect
+
+            # Cada llamada a connect() es un handshake nuevo, incluso cuando
+            # urllib3 reabre un socket caído sobre el mismo objeto conexión
+            def _counted_connect():
+                stats.record_connection(host)
+                return connect()
+
+            conn.connect = _counted_connect
+            return conn
+
+        pool._new_conn = _counted_new_conn
+        return pool
+
+
+class _PooledHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter con PoolManager instrumentado"""
+
+    def __init__(self, stats: ConnectionStats, **kwargs):
+        self.stats = stats
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        self._pool_connections = connections
+        self._pool_maxsize = maxsize
+        self._pool_block = block
+        self.poolmanager = _CountingPoolManager(
+            self.stats,
+            num_pools=connections,
+            maxsize=maxsize,
+            block=block,
+            **pool_kwargs
+        )
+
+    def send(self, request, **kwargs):
+        self.stats.record_request(requests.utils.urlparse(request.url).hostname or "")
+        return super().send(request, **kwargs)
+
+
+class SunatHTTPSession(requests.Session):
+    """
+    Sesión HTTP con pool de conexiones keep-alive para los endpoints de SUNAT.
+
+    Se comparte entre hilos: el pool de urllib3 entrega cada conexión a un
+    solo hilo a la vez y las estadísticas están protegidas por un lock.
+
+    Con flow_control=True cada endpoint (token, envio, validarcomprobante)
+    tiene su propio límite de concurrencia AIMD y su circuito: los 429, 5xx
+    y timeouts se reintentan con backoff exponencial y, si persisten, el
+    circuito se abre y las peticiones esperan en lugar de fallar.
+
+    Solo se repiten sin más las llamadas idempotentes (token, consulta de
+    ticket, validarcomprobante). Un envío (POST envio) puede haber llegado a
+    SUNAT aunque falle la respuesta, así que solo se repite si la conexión
+    no llegó a abrirse o si la respuesta es 429; en otro caso se devuelve
+    el fallo.
+    """
+
+    # Respuestas que indican saturación del servicio
+    OVERLOAD_STATUS = frozenset({429, 500, 502, 503, 504})
+
+    # Endpoints que se pueden repetir sin efectos secundarios
+    IDEMPOTENT_ENDPOINTS = frozenset({"token", "envios", "validarcomprobante"})
+
+    def __init__(
+        self,
+        pool_connections: int = 4,
+        pool_maxsize: int = 10,
+        pool_block: bool = False,
+        keep_alive: bool = True,
+        flow_control: bool = True,
+        max_retries: int = 4,
+        timeout: Tuple[float, float] = (10, 60),
+        max_pause: Optional[float] = None
+    ):
+        """
+        Inicializa la sesión
+
+        Args:
+            pool_connections: Número de hosts con pool propio (api-seguridad, api)
+            pool_maxsize: Conexiones máximas mantenidas por host
+            pool_block: Si es True, pool_maxsize es un límite estricto por host y
+                los hilos esperan una conexión libre en lugar de abrir otra
+            keep_alive: Si es False se envía "Connection: close" en cada petición
+            flow_control: Activa concurrencia adaptativa, reintentos y circuito
+            max_retries: Reintentos ante 429, 5xx o errores de conexión
+                (en los envíos, solo ante 429 o fallos al conectar)
+            timeout: Timeout (conexión, lectura) por defecto de cada petición
+            max_pause: Segundos máximos esperando a que se cierre un circuito
+                abierto (None espera indefinidamente o hasta cancel_event)
+        """
+        super().__init__()
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.pool_block = pool_block
+        self.keep_alive = keep_alive
+        self.flow_control = flow_control
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.max_pause = max_pause
+        # Si se activa, las esperas de circuito y backoff terminan en el acto
+        self.cancel_event: Optional[threading.Event] = None
+        self.stats = ConnectionStats()
+        self._endpoints: Dict[str, Tuple[AdaptiveLimiter, CircuitBreaker]] = {}
+        self._retries: Dict[str, int] = {}
+        self._endpoints_lock = threading.Lock()
+
+        adapter = _PooledHTTPAdapter(
+            self.stats,
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            pool_block=pool_block
+        )
+        self.mount("https://", adapter)
+        self.mount("http://", adapter)
+
+        self.headers["Connection"] = "keep-alive" if keep_alive else "close"
+
+        logger.debug(
+            f"Sesión HTTP creada (hosts={pool_connections}, por host={pool_maxsize}, "
+            f"block={pool_block}, keep_alive={keep_alive})"
+        )
+
+    def connection_stats(self) -> Dict[str, Any]:
+        """Estadísticas de reutilización de conexiones"""
+        return self.stats.snapshot()
+
+    def request(self, method, url, *args, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        if not self.flow_control:
+            return super().request(method, url, *args, **kwargs)
+
+        endpoint = self._endpoint_name(url)
+        limiter, breaker = self._endpoint(endpoint)
+        attempt = 0
+        while True:
+            breaker.wait_until_allowed(self.max_pause, self.cancel_event)
+
+            error = None
+            response = None
+            try:
+                with limiter:
+                    response = super().request(method, url, *args, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+            except Exception:
+                breaker.release_probe()
+                raise
+
+            if error is None and response.status_code not in self.OVERLOAD_STATUS:
+                limiter.on_success()
+                breaker.on_success()
+                return response
+
+            limiter.on_overload()
+            breaker.on_failure()
+            if attempt >= self.max_retries or not self._can_retry(method, endpoint, error, response):
+                if error is not None:
+                    raise error
+                return response
+
+            retry_after = self._retry_after(response) if response is not None else None
+            delay = backoff_delay(attempt, retry_after=retry_after)
+            reason = str(error) if error is not None else f"HTTP {response.status_code}"
+            logger.warning(
+                f"{endpoint}: {reason}; reintento {attempt + 1}/{self.max_retries} en {delay:.1f}s"
+            )
+            with self._endpoints_lock:
+                self._retries[endpoint] = self._retries.get(endpoint, 0) + 1
+
+            if self.cancel_event is not None:
+                if self.cancel_event.wait(delay):
+                    raise CircuitOpenError(f"{endpoint}: reintentos cancelados")
+            else:
+                time.sleep(delay)
+            attempt += 1
+
+    def transport_state(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Estado del control de flujo por endpoint
+
+        Returns:
+            Dict endpoint -> limit, in_flight, breaker, failures, reopens_in, retries
+        """
+        with self._endpoints_lock:
+            endpoints = dict(self._endpoints)
+            retries = dict(self._retries)
+
+        state = {}
+        for name, (limiter, breaker) in endpoints.items():
+            state[name] = dict(limiter.state(), **breaker.state(), retries=retries.get(name, 0))
+        return state
+
+    def _endpoint(self, name: str) -> Tuple[AdaptiveLimiter, CircuitBreaker]:
+        with self._endpoints_lock:
+            flow = self._endpoints.get(name)
+            if flow is None:
+                flow = self._endpoints[name] = (
+                    AdaptiveLimiter(name, initial=self.pool_maxsize, maximum=self.pool_maxsize),
+                    CircuitBreaker(name)
+                )
+            return flow
+
+    @staticmethod
+    def _endpoint_name(url: str) -> str:
+        """
+        Último segmento de la ruta: token, envio, validarcomprobante...
+
+        Si es un identificador numérico (envios/<ticket>) se usa el anterior
+        para que todas las consultas de ticket compartan límite y circuito.
+        """
+        segments = requests.utils.urlparse(url).path.rstrip("/").split("/")
+        if len(segments) > 1 and segments[-1].isdigit():
+            return segments[-2]
+        return segments[-1] or "/"
+
+    def _can_retry(self, method: str, endpoint: str, error: Optional[Exception],
+                   response: Optional[requests.Response]) -> bool:
+        """Si el fallo se puede reintentar sin riesgo de duplicar un envío"""
+        if method.upper() in ("GET", "HEAD", "OPTIONS") or endpoint in self.IDEMPOTENT_ENDPOINTS:
+            return True
+        if error is not None:
+            return self._connect_failed(error)
+        return response.status_code == 429
+
+    @staticmethod
+    def _connect_failed(error: Exception) -> bool:
+        """True si el error ocurrió al conectar, antes de enviar la petición"""
+        if isinstance(error, requests.ConnectTimeout):
+            return True
+        reason = getattr(error.args[0], "reason", None) if error.args else None
+        return isinstance(reason, NewConnectionError)
+
+    @staticmethod
+    def _retry_after(response: requests.Response) -> Optional[float]:
+        value = response.headers.get("Retry-After")
+        try:
+            return float(value) if value is not None else None
+        except ValueError:
+            # Las fechas HTTP se ignoran; se usa el backoff normal
+            return None
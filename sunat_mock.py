@@ -0,0 +1,397 @@
+"""
+Servidor local que imita los endpoints de SUNAT usados por SunatAPI.
+
+Implementa el token OAuth2 (api-seguridad), el envío de comprobantes
+(gem/comprobantes/envio), la consulta de tickets (gem/comprobantes/envios/
+<ticket>) y validarcomprobante, con latencia configurable por
+endpoint, errores 5xx aleatorios, límite de peticiones por segundo (429 con
+Retry-After) y generación de CDR. Sirve para pruebas de carga sin tocar
+producción.
+
+Uso:
+    python sunat_mock.py --port 8080 --latency lognormal:0.08:0.4 --error-rate 0.01 --rate-limit 50
+"""
+import argparse
+import base64
+import io
+import json
+import random
+import re
+import threading
+import time
+import uuid
+import zipfile
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, Optional, Tuple, Union
+from xml.sax.saxutils import escape
+
+ENDPOINTS = ("token", "envio", "ticket", "validarcomprobante")
+
+
+class LatencyModel:
+    """
+    Distribución de latencia a partir de una especificación de texto
+
+    Formatos (segundos):
+        fixed:0.05
+        uniform:0.02:0.2
+        normal:media:desviación
+        lognormal:mediana:sigma
+        exp:media
+    """
+
+    def __init__(self, spec: Union[str, float] = 0.0, rng: Optional[random.Random] = None):
+        if isinstance(spec, (int, float)):
+            spec = f"fixed:{spec}"
+        kind, *params = spec.split(":")
+        self.spec = spec
+        self.kind = kind
+        self.params = [float(p) for p in params]
+        self.rng = rng or random.Random()
+
+        expected = {"fixed": 1, "uniform": 2, "normal": 2, "lognormal": 2, "exp": 1}
+        if kind not in expected or len(self.params) != expected[kind]:
+            raise ValueError(f"Especificación de latencia no válida: {spec}")
+
+    def sample(self) -> float:
+        p = self.params
+        if self.kind == "fixed":
+            value = p[0]
+        elif self.kind == "uniform":
+            value = self.rng.uniform(p[0], p[1])
+        elif self.kind == "normal":
+            value = self.rng.gauss(p[0], p[1])
+        elif self.kind == "lognormal":
+            value = p[0] * self.rng.lognormvariate(0, p[1])
+        else:
+            value = self.rng.expovariate(1 / p[0]) if p[0] > 0 else 0.0
+        return max(value, 0.0)
+
+    def __repr__(self):
+        return f"LatencyModel({self.spec!r})"
+
+
+class MockConfig:
+    """Comportamiento del servidor simulado"""
+
+    def __init__(self, latency: Union[str, float, Dict[str, Union[str, float]]] = 0.0,
+                 error_rate: float = 0.0, rate_limit: float = 0.0, burst: Optional[int] = None,
+                 reject_rate: float = 0.0, generate_cdr: bool = True, ticket_delay: float = 0.0,
+                 token_ttl: int = 3600, require_auth: bool = True, seed: Optional[int] = None):
+        """
+        Args:
+            latency: Especificación de LatencyModel para todos los endpoints o
+                un dict por endpoint (token, envio, ticket, validarcomprobante)
+            error_rate: Fracción de peticiones que fallan con 500/503
+            rate_limit: Peticiones por segundo admitidas (0 sin límite); el
+                exceso recibe 429 con Retry-After
+            burst: Ráfaga máxima del límite (por defecto rate_limit)
+            reject_rate: Fracción de comprobantes con CDR de rechazo (código 2)
+            generate_cdr: Si es False el envío devuelve solo un ticket y el
+                CDR se obtiene consultándolo
+            ticket_delay: Segundos que un ticket responde "en proceso" (98)
+            token_ttl: expires_in de los tokens emitidos
+            require_auth: Exigir un token emitido por este servidor
+            seed: Semilla para reproducir una ejecución
+        """
+        self.rng = random.Random(seed)
+        if not isinstance(latency, dict):
+            latency = {endpoint: latency for endpoint in ENDPOINTS}
+        self.latency = {endpoint: LatencyModel(latency.get(endpoint, 0.0), self.rng) for endpoint in ENDPOINTS}
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.burst = burst or max(int(rate_limit), 1)
+        self.reject_rate = reject_rate
+        self.generate_cdr = generate_cdr
+        self.ticket_delay = ticket_delay
+        self.token_ttl = token_ttl
+        self.require_auth = require_auth
+
+
+class _TokenBucket:
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self) -> Tuple[bool, float]:
+        """(admitida, segundos hasta la próxima plaza)"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True, 0.0
+            return False, (1 - self.tokens) / self.rate
+
+
+class MockSunatHandler(BaseHTTPRequestHandler):
+    """Atiende token, envío, tickets y validarcomprobante según MockConfig"""
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_GET(self):
+        self._handle(b"")
+
+    def do_POST(self):
+        self._handle(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+
+    def _handle(self, body: bytes) -> None:
+        server: MockSunatServer = self.server
+        config = server.config
+        endpoint = self._endpoint()
+
+        if endpoint is None:
+            return self._reply(404, {"msg": "Recurso no encontrado"})
+
+        if server.bucket is not None:
+            allowed, wait = server.bucket.take()
+            if not allowed:
+                return self._reply(429, {"msg": "Too Many Requests"}, endpoint,
+                                   headers={"Retry-After": f"{max(wait, 0.001):.3f}"})
+
+        time.sleep(config.latency[endpoint].sample())
+
+        if config.error_rate and config.rng.random() < config.error_rate:
+            status = config.rng.choice((500, 503))
+            return self._reply(status, {"msg": "Error interno simulado"}, endpoint)
+
+        if endpoint == "token":
+            return self._reply(200, server.issue_token(), endpoint)
+
+        if config.require_auth and not server.valid_token(self.headers.get("Authorization", "")):
+            return self._reply(401, {"msg": "Token inválido o expirado"}, endpoint)
+
+        if endpoint == "envio":
+            status, payload = server.receive_document(body)
+        elif endpoint == "ticket":
+            status, payload = server.ticket_status(self.path.split("?", 1)[0].rstrip("/").rsplit("/", 1)[-1])
+        else:
+            status, payload = server.validate_document(body)
+        self._reply(status, payload, endpoint)
+
+    def _endpoint(self) -> Optional[str]:
+        path = self.path.split("?", 1)[0].rstrip("/")
+        if path.endswith("/oauth2/token") and self.command == "POST":
+            return "token"
+        if path.endswith("/gem/comprobantes/envio") and self.command == "POST":
+            return "envio"
+        if "/gem/comprobantes/envios/" in path and self.command == "GET":
+            return "ticket"
+        if path.endswith("/validarcomprobante") and self.command == "POST":
+            return "validarcomprobante"
+        return None
+
+    def _reply(self, status: int, payload: Dict[str, Any], endpoint: str = "otros",
+               headers: Optional[Dict[str, str]] = None) -> None:
+        self.server.record(endpoint, status)
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if self.close_connection:
+            self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MockSunatServer(ThreadingHTTPServer):
+    """
+    Servidor simulado de SUNAT
+
+    Cuenta las respuestas por endpoint y código (stats) y recuerda los
+    comprobantes recibidos para que validarcomprobante los informe como
+    aceptados.
+    """
+
+    request_queue_size = 128
+    daemon_threads = True
+
+    def __init__(self, config: Optional[MockConfig] = None, host: str = "127.0.0.1", port: int = 0):
+        super().__init__((host, port), MockSunatHandler)
+        self.config = config or MockConfig()
+        self.bucket = _TokenBucket(self.config.rate_limit, self.config.burst) if self.config.rate_limit else None
+        self.connections = 0
+        self.lock = threading.Lock()
+        self._tokens: Dict[str, float] = {}
+        self._documents: Dict[str, str] = {}
+        self._tickets: Dict[str, Tuple[str, str, str, float]] = {}
+        self._stats: Dict[Tuple[str, int], int] = {}
+
+    def start(self) -> "MockSunatServer":
+        threading.Thread(target=self.serve_forever, name="sunat-mock", daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address
+        return f"http://{host}:{port}"
+
+    def point(self, api: Any) -> None:
+        """Redirige las URLs de SunatAPI/AsyncSunatAPI a este servidor"""
+        api.token_url = f"{self.url}/v1/clientesextranet/{{}}/oauth2/token/"
+        api.base_url = f"{self.url}/v1/contribuyente/contribuyentes"
+
+    def record(self, endpoint: str, status: int) -> None:
+        with self.lock:
+            self._stats[(endpoint, status)] = self._stats.get((endpoint, status), 0) + 1
+
+    def stats(self) -> Dict[str, Dict[int, int]]:
+        """Respuestas enviadas: endpoint -> código HTTP -> cantidad"""
+        with self.lock:
+            items = list(self._stats.items())
+        result: Dict[str, Dict[int, int]] = {}
+        for (endpoint, status), count in sorted(items):
+            result.setdefault(endpoint, {})[status] = count
+        return result
+
+    def issue_token(self) -> Dict[str, Any]:
+        token = uuid.uuid4().hex
+        with self.lock:
+            now = time.time()
+            # Se descartan los tokens caducados para no crecer sin límite
+            self._tokens = {t: exp for t, exp in self._tokens.items() if exp > now}
+            self._tokens[token] = now + self.config.token_ttl
+        return {"access_token": token, "token_type": "JWT", "expires_in": self.config.token_ttl}
+
+    def valid_token(self, authorization: str) -> bool:
+        token = authorization[7:] if authorization.startswith("Bearer ") else ""
+        with self.lock:
+            return self._tokens.get(token, 0) > time.time()
+
+    def receive_document(self, body: bytes) -> Tuple[int, Dict[str, Any]]:
+        """Lee el ZIP enviado y responde con el CDR (o solo el ticket)"""
+        try:
+            with zipfile.ZipFile(io.BytesIO(body)) as zf:
+                xml_name = next(name for name in zf.namelist() if name.endswith(".xml"))
+                xml_content = zf.read(xml_name)
+        except (zipfile.BadZipFile, StopIteration):
+            return 400, {"cod": "0155", "msg": "El archivo ZIP está vacío o es inválido"}
+
+        doc_name = xml_name[:-4]
+        ticket = str(time.time_ns())
+        rejected = self.config.reject_rate and self.config.rng.random() < self.config.reject_rate
+        code = "2" if rejected else "0"
+
+        match = re.search(rb"<cbc:ID>([^<]+)</cbc:ID>", xml_content)
+        document_id = match.group(1).decode("latin-1") if match else doc_name
+        if not rejected:
+            with self.lock:
+                self._documents[doc_name] = ticket
+
+        payload: Dict[str, Any] = {"numTicket": ticket}
+        if self.config.generate_cdr:
+            payload["codRespuesta"] = code
+            payload["arcCdr"] = base64.b64encode(self._build_cdr(doc_name, document_id, code)).decode()
+        else:
+            with self.lock:
+                self._tickets[ticket] = (doc_name, document_id, code, time.time() + self.config.ticket_delay)
+        return 200, payload
+
+    def ticket_status(self, ticket: str) -> Tuple[int, Dict[str, Any]]:
+        """98 mientras el ticket está en proceso; luego el CDR (99 si fue rechazado)"""
+        with self.lock:
+            entry = self._tickets.get(ticket)
+        if entry is None:
+            return 404, {"cod": "0127", "msg": "El ticket no existe"}
+
+        doc_name, document_id, code, ready_at = entry
+        if time.time() < ready_at:
+            return 200, {"codRespuesta": "98"}
+
+        cdr = base64.b64encode(self._build_cdr(doc_name, document_id, code)).decode()
+        if code == "0":
+            return 200, {"codRespuesta": "0", "arcCdr": cdr, "indCdrGenerado": "1"}
+        return 200, {"codRespuesta": "99", "arcCdr": cdr, "indCdrGenerado": "1",
+                     "error": {"numError": "2", "desError": "Comprobante rechazado (simulado)"}}
+
+    def validate_document(self, body: bytes) -> Tuple[int, Dict[str, Any]]:
+        try:
+            data = json.loads(body)
+        except ValueError:
+            return 400, {"msg": "JSON inválido"}
+
+        doc_name = f"{data.get('numRuc')}-{data.get('codComp')}-{data.get('numeroSerie')}-{data.get('numero')}"
+        with self.lock:
+            known = doc_name in self._documents
+        return 200, {"success": True, "message": "Operation Success! ", "data": {
+            "estadoCp": "1" if known else "0",
+            "estadoRuc": "00",
+            "condDomiRuc": "00"
+        }}
+
+    @staticmethod
+    def _build_cdr(doc_name: str, document_id: str, code: str) -> bytes:
+        """ZIP R-<nombre>.zip con el ApplicationResponse que lee CDRHandler"""
+        description = (f"La Factura numero {document_id}, ha sido aceptada" if code == "0"
+                       else f"La Factura numero {document_id}, ha sido rechazada")
+        now = datetime.now()
+        xml = (
+            "<?xml version='1.0' encoding='UTF-8'?>"
+            "<ar:ApplicationResponse xmlns:ar=\"urn:sunat:cpe:see:gem:documentos:respuesta:1.0\">"
+            f"<ar:ResponseDate>{now:%Y-%m-%d}</ar:ResponseDate>"
+            f"<ar:ResponseTime>{now:%H:%M:%S}</ar:ResponseTime>"
+            f"<ar:ReferenceID>{escape(document_id)}</ar:ReferenceID>"
+            f"<ar:ResponseCode>{code}</ar:ResponseCode>"
+            f"<ar:Description>{escape(description)}</ar:Description>"
+            "</ar:ApplicationResponse>"
+        )
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w") as zf:
+            zf.writestr(f"R-{doc_name}.xml", xml)
+        return buffer.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor local que imita los endpoints de SUNAT")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", default="fixed:0", help="Latencia de todos los endpoints")
+    parser.add_argument("--envio-latency", help="Latencia del envío (sobrescribe --latency)")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="Peticiones/s (0 sin límite)")
+    parser.add_argument("--burst", type=int)
+    parser.add_argument("--reject-rate", type=float, default=0.0)
+    parser.add_argument("--no-cdr", action="store_true", help="Responder solo con ticket")
+    parser.add_argument("--ticket-delay", type=float, default=0.0, help="Segundos en proceso de cada ticket")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    latency = {endpoint: args.latency for endpoint in ENDPOINTS}
+    if args.envio_latency:
+        latency["envio"] = args.envio_latency
+    config = MockConfig(latency=latency, error_rate=args.error_rate, rate_limit=args.rate_limit,
+                        burst=args.burst, reject_rate=args.reject_rate, generate_cdr=not args.no_cdr,
+                        ticket_delay=args.ticket_delay, seed=args.seed)
+    server = MockSunatServer(config, args.host, args.port)
+    print(f"SUNAT simulado en {server.url} (Ctrl+C para terminar)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(json.dumps(server.stats(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
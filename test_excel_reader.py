@@ -0,0 +1,53 @@
+"""
+Pruebas del lector de comprobantes (excel_reader.py).
+
+Uso:
+    python -m pytest -q test_excel_reader.py
+"""
+import pandas as pd
+
+from excel_reader import ExcelReader
+from workbook_cache import WorkbookCache
+
+
+def write_sheet(path: str, rows: int = 45) -> None:
+    customers = ["20100070970", "20131312955", "12345678"]
+    pd.DataFrame({
+        "Invoice_Number": range(1, rows + 1),
+        "Customer_RUC": [customers[i % len(customers)] for i in range(rows)],
+        "Customer_Name": "CLIENTE",
+        "Product_Service": "ARROZ",
+        "Quantity": [i % 7 + 1 for i in range(rows)],
+        "Unit_Measure": "BG",
+        "Description": "ARROZ",
+        "Unit_Value": 1.44,
+        "Unit_Price": [1.44 + i / 100 for i in range(rows)],
+    }).to_csv(path, index=False)
+
+
+def summary(reader: ExcelReader):
+    return [(invoice.invoice_number, invoice.customer_ruc, len(invoice.products), invoice.total_cents)
+            for invoice in reader.invoices.values()]
+
+
+def test_cache_miss_packs_once_and_matches_uncached_load(tmp_path, monkeypatch):
+    path = str(tmp_path / "comprobantes.csv")
+    write_sheet(path)
+    plain = ExcelReader()
+    assert plain.load_excel(path)
+
+    calls = []
+    pack = ExcelReader._pack
+    monkeypatch.setattr(ExcelReader, "_pack", lambda self, df: calls.append(len(df)) or pack(self, df))
+    cache = WorkbookCache(str(tmp_path / "cache"))
+    cached = ExcelReader(cache=cache)
+
+    assert cached.load_excel(path)
+    assert calls == [45]
+    assert summary(cached) == summary(plain)
+    assert cached.packing_stats == plain.packing_stats
+
+    reopened = ExcelReader(cache=cache)
+    assert reopened.load_excel(path)
+    assert calls == [45]
+    assert summary(reopened) == summary(plain)
@@ -0,0 +1,37 @@
+"""
+Pruebas del reparto de filas en facturas (invoice_packing.py).
+
+Uso:
+    python -m pytest -q test_invoice_packing.py
+"""
+import numpy as np
+import pandas as pd
+
+from invoice_packing import InvoicePacker
+
+
+def rows(customers):
+    return pd.DataFrame({"Customer_RUC": customers, "Item": range(1, len(customers) + 1)})
+
+
+def test_interleaved_customers_save_invoices():
+    df = rows(["20100070970", "20512345678"] * 20)
+
+    packed, starts, stats = InvoicePacker(20).pack(df)
+
+    assert stats["documents"] == 2
+    assert stats["sequential_documents"] == 40
+    assert stats["documents_saved"] == 38
+    assert stats["mixed_documents"] == 2
+    for start, end in zip(starts, np.append(starts[1:], len(packed))):
+        assert packed["Customer_RUC"].iloc[start:end].nunique() == 1
+
+
+def test_single_customer_saves_nothing():
+    df = rows(["20100070970"] * 45)
+
+    _, starts, stats = InvoicePacker(20).pack(df)
+
+    assert starts.tolist() == [0, 20, 40]
+    assert stats["documents_saved"] == 0
+    assert stats["mixed_documents"] == 0
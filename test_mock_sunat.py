@@ -0,0 +1,326 @@
+"""
+Pruebas contra el servidor simulado de SUNAT (sunat_mock.py).
+
+Cubren los reintentos del envío, el registro de envíos, la reanudación
+con diario, los resúmenes diarios de boletas y la validación de la
+plantilla incluida. No usan la red ni credenciales reales.
+
+Uso:
+    python -m pytest -q test_mock_sunat.py
+"""
+import asyncio
+import io
+import json
+import os
+import zipfile
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+
+import sunat_http
+from async_sunat_api import AsyncSunatAPI
+from excel_reader import ExcelReader, Invoice, compute_line_amounts
+from row_validation import RowValidator
+from run_journal import RunJournal
+from submission_ledger import SubmissionLedger
+from sunat_api import SunatAPI
+from sunat_http import SunatHTTPSession
+from sunat_mock import MockConfig, MockSunatServer
+from token_manager import TokenManager
+from workbook_cache import WorkbookCache
+
+RUC = "20000000001"
+TEMPLATE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "resources", "comprobantes_template.xlsx")
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    """Reintentos sin espera para que las pruebas sean rápidas"""
+    monkeypatch.setattr(sunat_http, "backoff_delay", lambda attempt, retry_after=None: 0.0)
+
+
+@pytest.fixture
+def mock_server():
+    servers = []
+
+    def start(**config) -> MockSunatServer:
+        server = MockSunatServer(MockConfig(seed=1, **config)).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.stop()
+
+
+def make_api(server: MockSunatServer, **kwargs) -> SunatAPI:
+    api = SunatAPI(ruc=RUC, client_id="test", client_secret="test", **kwargs)
+    api.token_manager = TokenManager(api._request_token, api.client_id, cache_dir=None, background_refresh=False)
+    server.point(api)
+    return api
+
+
+def make_invoice(number: int, serie: str = "F001") -> SimpleNamespace:
+    """Comprobante mínimo con los atributos que usa SunatAPI._generate_xml"""
+    line_cents, igv_cents, total_cents = compute_line_amounts(10, 1.44)
+    product = SimpleNamespace(code="P1", description="PRODUCTO", unit_measure="NIU", quantity=10,
+                              unit_value=1.44, line_amount_cents=line_cents, igv_cents=igv_cents,
+                              line_total_cents=total_cents)
+    return SimpleNamespace(invoice_number=number, serie=serie, is_factura=True, currency="USD",
+                           emisor_name="EMISOR SAC", customer_ruc="20100070970", customer_name="CLIENTE SAC",
+                           products=[product], subtotal_cents=line_cents, igv_cents=igv_cents,
+                           total_cents=total_cents)
+
+
+def make_boleta(number: int, customer: str) -> Invoice:
+    boleta = Invoice(number, {"Customer_RUC": customer, "Customer_Name": "CLIENTE", "Currency": "SOL"})
+    boleta.add_product({"Item": "1", "Product": "ARROZ", "Unit": "BG", "Quantity": 2, "Unit_Price": 5})
+    return boleta
+
+
+def envio_zip(name: str = f"{RUC}-01-F001-1") -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as zf:
+        zf.writestr(f"{name}.xml", "<Invoice><cbc:ID>F001-1</cbc:ID></Invoice>")
+    return buffer.getvalue()
+
+
+def envio_url(server: MockSunatServer) -> str:
+    return f"{server.url}/v1/contribuyente/contribuyentes{SunatAPI.ENVIO_PATH}"
+
+
+# Reintentos (SunatHTTPSession)
+
+def test_envio_not_retried_after_server_error(mock_server):
+    server = mock_server(error_rate=1.0, require_auth=False)
+    session = SunatHTTPSession(max_retries=3)
+
+    response = session.post(envio_url(server), data=envio_zip())
+
+    assert response.status_code in (500, 503)
+    assert sum(server.stats()["envio"].values()) == 1
+
+
+def test_validation_retried_after_server_error(mock_server):
+    server = mock_server(error_rate=1.0, require_auth=False)
+    session = SunatHTTPSession(max_retries=3)
+
+    session.post(f"{server.url}/v1/contribuyente/contribuyentes/{RUC}/validarcomprobante", json={})
+
+    assert sum(server.stats()["validarcomprobante"].values()) == 4
+
+
+def test_envio_retried_after_429(mock_server, monkeypatch):
+    # Espera suficiente para que el límite de 50/s reponga una ficha
+    monkeypatch.setattr(sunat_http, "backoff_delay", lambda attempt, retry_after=None: 0.05)
+    server = mock_server(rate_limit=50, burst=1, require_auth=False)
+    session = SunatHTTPSession(max_retries=3)
+
+    session.post(envio_url(server), data=envio_zip())
+    response = session.post(envio_url(server), data=envio_zip())
+
+    assert response.status_code == 200
+    assert server.stats()["envio"][429] >= 1
+    assert session.transport_state()["envio"]["retries"] >= 1
+
+
+def test_envio_retried_when_connection_refused(mock_server):
+    server = mock_server()
+    url = envio_url(server)
+    server.stop()
+    session = SunatHTTPSession(max_retries=2)
+
+    with pytest.raises(Exception):
+        session.post(url, data=envio_zip())
+
+    assert session.transport_state()["envio"]["retries"] == 2
+
+
+# Registro de envíos
+
+def test_ledger_skips_accepted_invoice(mock_server, tmp_path):
+    server = mock_server()
+    api = make_api(server, ledger=SubmissionLedger(str(tmp_path / "ledger.db")))
+    invoices = [make_invoice(1), make_invoice(2)]
+
+    first = list(api.submit_batch(invoices, workers=2).results())
+    second = list(api.submit_batch(invoices, workers=2).results())
+    api.close()
+
+    assert all(item.success and not item.skipped for item in first)
+    assert all(item.skipped for item in second)
+    assert server.stats()["envio"] == {200: 2}
+
+
+# Reanudación con diario
+
+def test_resume_confirms_in_flight_sends(mock_server, tmp_path):
+    server = mock_server()
+    journal_path = str(tmp_path / "run.jsonl")
+    api = make_api(server)
+    received, lost = make_invoice(1), make_invoice(2)
+
+    # Primera ejecución: el envío de la 1 llega a SUNAT pero el proceso muere
+    # antes de anotar el resultado; la 2 se cae durante el envío
+    api.journal = RunJournal(journal_path)
+    assert api.create_invoice(received)["success"]
+    api.journal.close()
+    with open(journal_path, encoding="utf-8") as f:
+        records = [json.loads(line) for line in f]
+    sending = next(record for record in records if record["stage"] == RunJournal.SENDING)
+    with open(journal_path, "w", encoding="utf-8") as f:
+        for doc_id in (api._document_id(received), api._document_id(lost)):
+            f.write(json.dumps(dict(sending, doc=doc_id)) + "\n")
+
+    api.journal = RunJournal(journal_path, resume=True)
+    results = [item for item in api.submit_batch([received, lost], workers=1).results()]
+    api.journal.close()
+    api.close()
+
+    assert results[0].skipped and results[0].success
+    assert not results[1].skipped and results[1].success
+    assert server.stats()["envio"] == {200: 2}
+    assert server.stats()["validarcomprobante"] == {200: 2}
+
+
+def test_resume_holds_unverifiable_send(mock_server, tmp_path):
+    server = mock_server()
+    journal_path = str(tmp_path / "run.jsonl")
+    api = make_api(server)
+    invoice = make_invoice(1)
+    with open(journal_path, "w", encoding="utf-8") as f:
+        f.write(json.dumps({"doc": api._document_id(invoice), "stage": RunJournal.SENDING}) + "\n")
+
+    api.journal = RunJournal(journal_path, resume=True)
+    [item] = api.submit_batch([invoice], workers=1).results()
+    api.journal.close()
+    api.close()
+
+    assert not item.success and not item.skipped
+    assert "envio" not in server.stats()
+
+
+def test_async_resume_confirms_ticket(mock_server, tmp_path):
+    server = mock_server(generate_cdr=False)
+    journal_path = str(tmp_path / "run.jsonl")
+    boleta = make_boleta(1, "12345678")
+    api = make_api(server)
+    [summary] = api.send_daily_summary([boleta])
+    api.close()
+    # Solo el ticket: sin fecha ni monto no se puede consultar validarcomprobante
+    doc_id = f"{RUC}-03-B001-1"
+    with open(journal_path, "w", encoding="utf-8") as f:
+        f.write(json.dumps({"doc": doc_id, "stage": RunJournal.SENDING}) + "\n")
+        f.write(json.dumps({"doc": doc_id, "stage": RunJournal.SENT, "ticket": summary["ticket"]}) + "\n")
+
+    async def resume():
+        client = AsyncSunatAPI(ruc=RUC, client_id="test", client_secret="test",
+                               token_manager=TokenManager(None, "test", cache_dir=None, background_refresh=False))
+        server.point(client)
+        client.journal = RunJournal(journal_path, resume=True)
+        try:
+            return await client.create_invoices([boleta])
+        finally:
+            client.journal.close()
+            await client.close()
+
+    [result] = asyncio.run(resume())
+
+    assert result["success"] and result["skipped"]
+    assert server.stats()["envio"] == {200: 1}
+    assert server.stats()["ticket"] == {200: 1}
+
+
+def test_create_invoice_journals_every_stage(mock_server, tmp_path):
+    server = mock_server()
+    api = make_api(server)
+    api.signer = SimpleNamespace(sign_xml=lambda xml: xml)
+    api.journal = RunJournal(str(tmp_path / "run.jsonl"))
+
+    assert api.create_invoice(make_invoice(1))["success"]
+    api.journal.close()
+    api.close()
+
+    with open(api.journal.path, encoding="utf-8") as f:
+        stages = [json.loads(line)["stage"] for line in f]
+    assert stages == [RunJournal.GENERATED, RunJournal.SIGNED, RunJournal.SENDING,
+                      RunJournal.SENT, RunJournal.CDR]
+
+
+# Resumen diario de boletas
+
+def test_daily_summary_uses_b_series(mock_server, tmp_path):
+    server = mock_server()
+    ledger = SubmissionLedger(str(tmp_path / "ledger.db"))
+    api = make_api(server, ledger=ledger)
+    # Una boleta con DNI y otra a un cliente con RUC que el lector numera como factura
+    boletas = [make_boleta(1, "12345678"), make_boleta(2, "20100070970")]
+
+    [summary] = api.send_daily_summary(boletas)
+    rows = ledger.lookup_many([f"{RUC}-03-B001-1", f"{RUC}-03-B002-2"])
+    again = api.send_daily_summary(boletas)
+    api.close()
+
+    assert summary["success"]
+    assert summary["documents"] == ["B001-1", "B002-2"]
+    assert set(rows) == {f"{RUC}-03-B001-1", f"{RUC}-03-B002-2"}
+    assert again == []
+    assert server.stats()["envio"] == {200: 1}
+
+
+# Validación de filas
+
+def test_bundled_template_passes_validation():
+    df = pd.read_excel(TEMPLATE, sheet_name="Comprobantes")
+    required = [column for column in df.columns if column != "Total"]
+
+    report = RowValidator(required).validate(df)
+
+    assert report.ok, report.messages()
+
+
+def test_template_units_and_foreign_customers_pass_validation():
+    df = pd.DataFrame({
+        "Customer_RUC": ["US-99887766", "20100070970", "12345678", "AR-30712345671"],
+        "Unit": ["BAG", "KG", "PKT", "PCS"],
+        "Quantity": [100, 5, 2, 1],
+        "Unit_Price": [1.44, 2.0, 3.5, 10.0],
+    })
+
+    report = RowValidator(list(df.columns)).validate(df)
+
+    assert report.ok, report.messages()
+
+
+def test_validation_still_rejects_bad_ruc_and_unknown_unit():
+    df = pd.DataFrame({"Customer_RUC": ["20100070971"], "Unit": ["XYZ"]})
+
+    report = RowValidator(list(df.columns)).validate(df)
+
+    assert {issue["code"] for issue in report.issues} == {"ruc_check_digit", "unknown_unit"}
+
+
+def test_validation_rejects_numeric_ids_of_wrong_length():
+    # RUC sin un dígito y DNI con uno de más: no pasan como clientes del exterior
+    df = pd.DataFrame({"Customer_RUC": ["2010007097", "123456789"]})
+
+    report = RowValidator(list(df.columns)).validate(df)
+
+    assert [(issue["row"], issue["code"]) for issue in report.issues] == [
+        (2, "document_length"), (3, "document_length")]
+
+
+def test_cached_unvalidated_workbook_is_validated_later(tmp_path):
+    path = str(tmp_path / "comprobantes.csv")
+    row = {"Invoice_Number": 1, "Customer_RUC": "20100070971", "Customer_Name": "CLIENTE",
+           "Product_Service": "ARROZ", "Quantity": 2, "Unit_Measure": "BG", "Description": "ARROZ",
+           "Unit_Value": 5}
+    pd.DataFrame([row]).to_csv(path, index=False)
+    cache = WorkbookCache(str(tmp_path / "cache"))
+
+    assert ExcelReader(cache=cache, validate=False).load_excel(path)
+    reader = ExcelReader(cache=cache)
+
+    assert not reader.load_excel(path)
+    assert reader.validation_report.issues[0]["code"] == "ruc_check_digit"
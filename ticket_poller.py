@@ -0,0 +1,176 @@
+import logging
+import random
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from cdr_handler import CDRHandler
+from run_journal import RunJournal
+from submission_ledger import SubmissionLedger
+
+logger = logging.getLogger(__name__)
+
+
+class TicketPoller:
+    """
+    Seguimiento en segundo plano de los tickets de SUNAT.
+
+    Los envíos asíncronos (resúmenes diarios, bajas, envíos diferidos)
+    quedan en el registro de envíos como pendientes con su ticket; esa tabla
+    es la cola persistente, así que los tickets sobreviven a un reinicio. Un
+    hilo consulta por tandas los tickets vencidos, respetando un máximo de
+    consultas por segundo, y reprograma cada ticket en proceso con backoff
+    exponencial propio. Los CDR recibidos se entregan a CDRHandler.process_cdr
+    y el estado final se guarda en el registro. Los envíos nuevos no esperan
+    a este hilo.
+    """
+
+    def __init__(self, api: Any, ledger: Optional[SubmissionLedger] = None,
+                 cdr_handler: Optional[CDRHandler] = None, rate: float = 2.0, batch_size: int = 20,
+                 base_delay: float = 5.0, max_delay: float = 600.0, max_attempts: int = 40,
+                 idle_interval: float = 30.0):
+        """
+        Inicializa el consultor de tickets
+
+        Args:
+            api: SunatAPI con consultar_ticket
+            ledger: Registro de envíos (por defecto el de api)
+            cdr_handler: Procesador de CDR (por defecto CDRHandler())
+            rate: Consultas por segundo como máximo
+            batch_size: Tickets consultados por tanda
+            base_delay: Espera tras la primera respuesta "en proceso"
+            max_delay: Espera máxima entre consultas de un mismo ticket
+            max_attempts: Consultas antes de dar el ticket por perdido
+            idle_interval: Espera máxima sin tickets pendientes
+        """
+        self.api = api
+        self.ledger = ledger or api.ledger
+        if self.ledger is None:
+            raise ValueError("TicketPoller necesita un registro de envíos")
+        self.cdr_handler = cdr_handler or CDRHandler()
+        self.min_interval = 1.0 / rate if rate > 0 else 0.0
+        self.batch_size = batch_size
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_attempts = max_attempts
+        self.idle_interval = idle_interval
+
+        self.polled = 0
+        self.completed = 0
+        self.failed = 0
+        self._last_request = 0.0
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "TicketPoller":
+        """Inicia el hilo de consulta"""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="ticket-poller", daemon=True)
+            self._thread.start()
+            logger.info("Consulta de tickets iniciada")
+        return self
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Detiene el hilo; la tanda en curso termina antes"""
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def notify(self) -> None:
+        """Avisa de que hay tickets nuevos para no esperar al siguiente ciclo"""
+        self._wakeup.set()
+
+    def poll_once(self) -> int:
+        """
+        Consulta una tanda de tickets vencidos
+
+        Returns:
+            int: Tickets consultados
+        """
+        tickets = self.ledger.due_tickets(self.batch_size)
+        for entry in tickets:
+            if self._stop.is_set():
+                break
+            self._throttle()
+            self._poll(entry)
+        return len(tickets)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "polled": self.polled,
+            "completed": self.completed,
+            "failed": self.failed,
+            "running": self._thread is not None and self._thread.is_alive()
+        }
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                if self.poll_once():
+                    continue
+                next_poll = self.ledger.next_ticket_poll()
+            except Exception as e:
+                logger.error(f"Error en la consulta de tickets: {str(e)}")
+                next_poll = None
+
+            wait = self.idle_interval
+            if next_poll is not None:
+                wait = min(max(next_poll - time.time(), 0.05), self.idle_interval)
+            self._wakeup.wait(wait)
+            self._wakeup.clear()
+
+    def _throttle(self) -> None:
+        wait = self._last_request + self.min_interval - time.monotonic()
+        if wait > 0:
+            self._stop.wait(wait)
+        self._last_request = time.monotonic()
+
+    def _poll(self, entry: Dict[str, Any]) -> None:
+        ticket = entry["ticket"]
+        attempts = entry["attempts"] + 1
+        result = self.api.consultar_ticket(ticket)
+        self.polled += 1
+
+        if result["success"] and result["status"] != SubmissionLedger.PENDING:
+            self._complete(entry, result)
+            return
+
+        if attempts >= self.max_attempts:
+            logger.error(f"Ticket {ticket} sin respuesta final tras {attempts} consultas")
+            self.ledger.complete_ticket(ticket, SubmissionLedger.ERROR,
+                                        message=f"Ticket sin respuesta tras {attempts} consultas")
+            self.failed += 1
+            return
+
+        # Backoff exponencial por ticket con ±20 % de jitter
+        delay = min(self.base_delay * (2 ** entry["attempts"]), self.max_delay) * random.uniform(0.8, 1.2)
+        if not result["success"]:
+            logger.warning(f"Consulta del ticket {ticket} fallida: {result['error']}; reintento en {delay:.0f}s")
+        else:
+            logger.debug(f"Ticket {ticket} en proceso; nueva consulta en {delay:.0f}s")
+        self.ledger.reschedule_ticket(ticket, time.time() + delay)
+
+    def _complete(self, entry: Dict[str, Any], result: Dict[str, Any]) -> None:
+        ticket = entry["ticket"]
+        status = result["status"]
+        code = result["cdr_code"]
+        message = result.get("message")
+
+        if result.get("cdr"):
+            cdr = self.cdr_handler.process_cdr(result["cdr"], entry["doc_id"])
+            if cdr["status"] != "ERROR":
+                code = cdr["code"]
+                message = cdr["message"]
+                # 0 aceptado, 1 aceptado con observaciones
+                status = SubmissionLedger.ACCEPTED if code in ("0", "1") else SubmissionLedger.REJECTED
+
+        self.ledger.complete_ticket(ticket, status, code, message)
+        journal = getattr(self.api, "journal", None)
+        if journal is not None:
+            journal.mark(entry["doc_id"], RunJournal.CDR, code=code, ticket=ticket)
+        self.completed += 1
+        logger.info(f"Ticket {ticket} ({entry['doc_id']}): {status} [{code}] {message or ''}".rstrip())
@@ -0,0 +1,321 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.sunat_automation', 'tokens')
+
+
+class TokenError(Exception):
+    """Excepción para errores obteniendo el token OAuth"""
+    pass
+
+
+class _FileLock:
+    """Lock exclusivo entre procesos sobre un archivo .lock"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fd = None
+
+    def __enter__(self):
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        if os.name == 'nt':
+            import msvcrt
+            # LK_LOCK reintenta durante ~10s; se repite hasta obtener el lock
+            while True:
+                try:
+                    msvcrt.locking(self._fd, msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue
+        else:
+            import fcntl
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if os.name == 'nt':
+                import msvcrt
+                os.lseek(self._fd, 0, os.SEEK_SET)
+                msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+        finally:
+            os.close(self._fd)
+            self._fd = None
+
+
+class TokenManager:
+    """
+    Caché del token OAuth de SUNAT con control de expiración.
+
+    - Renueva el token en segundo plano antes de que expire.
+    - Las llamadas concurrentes esperan una única renovación (single-flight).
+    - Persiste el token en disco bajo un lock de archivo para que procesos
+      paralelos con el mismo client_id lo reutilicen.
+    """
+
+    def __init__(
+        self,
+        fetch_token: Optional[Callable[[], Dict[str, Any]]],
+        client_id: str,
+        cache_dir: Optional[str] = DEFAULT_CACHE_DIR,
+        refresh_margin: float = 300,
+        expiry_skew: float = 30,
+        background_refresh: bool = True
+    ):
+        """
+        Inicializa el manejador de tokens
+
+        Args:
+            fetch_token: Función que solicita un token nuevo y devuelve la
+                respuesta del endpoint (access_token, expires_in). Puede ser
+                None si los tokens se registran con update()
+            client_id: Client ID de la aplicación; identifica la caché en disco
+            cache_dir: Directorio de la caché en disco (None la desactiva)
+            refresh_margin: Segundos antes de la expiración en que se renueva
+                en segundo plano (se limita al 20% de la vida del token)
+            expiry_skew: Segundos antes de la expiración en que el token deja
+                de entregarse aunque no se haya podido renovar
+            background_refresh: Programar la renovación anticipada en un hilo
+        """
+        self.fetch_token = fetch_token
+        self.client_id = client_id or ''
+        self.cache_dir = cache_dir
+        self.refresh_margin = refresh_margin
+        self.expiry_skew = expiry_skew
+        self.background_refresh = background_refresh
+
+        self._cond = threading.Condition()
+        self._refreshing = False
+        self._token: Optional[str] = None
+        self._issued_at = 0.0
+        self._expires_at = 0.0
+        self._timer: Optional[threading.Timer] = None
+        self._closed = False
+
+        self.cache_path = None
+        if cache_dir:
+            key = hashlib.sha256(self.client_id.encode()).hexdigest()[:16]
+            self.cache_path = os.path.join(cache_dir, f"token_{key}.json")
+
+    @property
+    def token(self) -> Optional[str]:
+        """Token actual en memoria si sigue vigente (no hace peticiones)"""
+        with self._cond:
+            return self._token if self._is_valid() else None
+
+    @property
+    def expires_at(self) -> float:
+        return self._expires_at
+
+    def get_token(self, force: bool = False) -> str:
+        """
+        Devuelve un token vigente, renovándolo si es necesario
+
+        Args:
+            force: Ignorar el token en memoria y renovarlo. Si ya hay una
+                renovación en curso se espera a esa en lugar de iniciar otra.
+
+        Returns:
+            str: access_token
+
+        Raises:
+            TokenError: Si no se pudo obtener el token
+        """
+        with self._cond:
+            if self._refreshing:
+                while self._refreshing:
+                    self._cond.wait()
+                if self._is_valid():
+                    return self._token
+            elif not force and self._is_valid():
+                return self._token
+            self._refreshing = True
+
+        try:
+            return self._refresh(reject=self._token if force else None)
+        finally:
+            with self._cond:
+                self._refreshing = False
+                self._cond.notify_all()
+
+    def invalidate(self, token: Optional[str] = None) -> None:
+        """
+        Marca el token como inválido (p.ej. tras un 401)
+
+        Args:
+            token: Token rechazado. Si ya fue reemplazado por otro hilo no se
+                invalida el token nuevo.
+        """
+        with self._cond:
+            if token is None or token == self._token:
+                self._expires_at = 0.0
+
+        if self.cache_path and os.path.exists(self.cache_path):
+            with _FileLock(self.cache_path + '.lock'):
+                self._write_cache(token_rejected=token)
+
+    def close(self) -> None:
+        """Cancela la renovación en segundo plano"""
+        with self._cond:
+            self._closed = True
+            if self._timer:
+                self._timer.cancel()
+                self._timer = None
+
+    def _is_valid(self) -> bool:
+        return bool(self._token) and time.time() < self._expires_at - self.expiry_skew
+
+    def _refresh_at(self, issued_at: float, expires_at: float) -> float:
+        margin = min(self.refresh_margin, (expires_at - issued_at) * 0.2)
+        return expires_at - margin
+
+    def _refresh(self, reject: Optional[str] = None) -> str:
+        """Obtiene el token de la caché en disco o del endpoint de SUNAT"""
+        if not self.cache_path:
+            return self._store(self._fetch())
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with _FileLock(self.cache_path + '.lock'):
+            cached = self._usable_cache(reject)
+            if cached:
+                logger.debug("Token reutilizado desde la caché en disco")
+                return self._store(cached)
+
+            data = self._fetch()
+            self._write_cache(data)
+            return self._store(data)
+
+    def load_cached(self, reject: Optional[str] = None) -> Optional[str]:
+        """
+        Carga un token vigente desde la caché en disco sin hacer peticiones
+
+        Pensado para clientes que solicitan el token por su cuenta (como
+        AsyncSunatAPI) y luego lo registran con update().
+
+        Args:
+            reject: Token a ignorar aunque siga vigente en disco
+
+        Returns:
+            Optional[str]: access_token o None si no hay uno reutilizable
+        """
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return None
+
+        with _FileLock(self.cache_path + '.lock'):
+            cached = self._usable_cache(reject)
+            return self._store(cached) if cached else None
+
+    def update(self, response: Dict[str, Any]) -> str:
+        """
+        Registra un token obtenido fuera del manejador y lo persiste en disco
+
+        Args:
+            response: Respuesta del endpoint de token (access_token, expires_in)
+        """
+        data = self._parse(response)
+        if self.cache_path:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with _FileLock(self.cache_path + '.lock'):
+                self._write_cache(data)
+        return self._store(data)
+
+    @property
+    def refresh_at(self) -> float:
+        """Momento (epoch) en que conviene renovar el token actual"""
+        return self._refresh_at(self._issued_at, self._expires_at)
+
+    def _usable_cache(self, reject: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        cached = self._read_cache()
+        if cached and cached['access_token'] != reject and \
+                time.time() < self._refresh_at(cached['issued_at'], cached['expires_at']):
+            return cached
+        return None
+
+    def _fetch(self) -> Dict[str, Any]:
+        if self.fetch_token is None:
+            raise TokenError("No hay función para solicitar el token")
+        return self._parse(self.fetch_token())
+
+    def _parse(self, response: Dict[str, Any]) -> Dict[str, Any]:
+        if not response or 'access_token' not in response:
+            raise TokenError("Respuesta de token sin access_token")
+
+        issued_at = time.time()
+        expires_in = float(response.get('expires_in') or 3600)
+        logger.info(f"Token obtenido, expira en {int(expires_in)} segundos")
+        return {
+            'access_token': response['access_token'],
+            'issued_at': issued_at,
+            'expires_at': issued_at + expires_in
+        }
+
+    def _store(self, data: Dict[str, Any]) -> str:
+        with self._cond:
+            self._token = data['access_token']
+            self._issued_at = data['issued_at']
+            self._expires_at = data['expires_at']
+        self._schedule_refresh()
+        return self._token
+
+    def _schedule_refresh(self) -> None:
+        if not self.background_refresh:
+            return
+
+        with self._cond:
+            if self._closed:
+                return
+            if self._timer:
+                self._timer.cancel()
+            delay = max(self._refresh_at(self._issued_at, self._expires_at) - time.time(), 0)
+            self._timer = threading.Timer(delay, self._background_refresh)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _background_refresh(self) -> None:
+        try:
+            self.get_token(force=True)
+            logger.debug("Token renovado en segundo plano")
+        except Exception as e:
+            logger.error(f"Error renovando token en segundo plano: {str(e)}")
+
+    def _read_cache(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self.cache_path, 'r') as f:
+                data = json.load(f)
+            if data.get('client_id') != self.client_id or not data.get('access_token'):
+                return None
+            return data
+        except (OSError, ValueError):
+            return None
+
+    def _write_cache(self, data: Optional[Dict[str, Any]] = None,
+                     token_rejected: Optional[str] = None) -> None:
+        """Escribe la caché de forma atómica (requiere el lock de archivo)"""
+        if not self.cache_path:
+            return
+
+        try:
+            if data is None:
+                # Invalidación: solo se borra si el token en disco es el rechazado
+                cached = self._read_cache()
+                if not cached or (token_rejected and cached['access_token'] != token_rejected):
+                    return
+                data = dict(cached, expires_at=0.0)
+
+            tmp_path = f"{self.cache_path}.{os.getpid()}.tmp"
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, 'w') as f:
+                json.dump(dict(data, client_id=self.client_id), f)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            logger.warning(f"No se pudo escribir la caché de token: {str(e)}")
@@ -0,0 +1,132 @@
+import threading
+import xml.etree.ElementTree as ET
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Tuple
+from xml.sax.saxutils import escape
+
+from row_validation import identity_document_type
+
+_SENTINEL = "\x01"
+
+
+class UBLInvoiceTemplate:
+    """
+    Generador UBL 2.1 basado en fragmentos precompilados.
+
+    Las etiquetas, la raíz con sus namespaces y el emisor se serializan una
+    sola vez con ElementTree; los bloques AccountingCustomerParty se guardan
+    por cliente en una caché LRU. Por comprobante solo se rellenan el ID, las
+    fechas, las líneas y los totales. La salida es byte a byte igual a la de
+    SunatDocumentBuilder._build_xml_tree.
+    """
+
+    def __init__(self, builder: Any, max_customers: int = 10000):
+        """
+        Inicializa la plantilla
+
+        Args:
+            builder: SunatDocumentBuilder del que se toman el RUC, los
+                namespaces y el cálculo de importes
+            max_customers: Fragmentos de cliente mantenidos en caché
+        """
+        self.builder = builder
+        self.ruc = builder.ruc
+        self.max_customers = max_customers
+        self._tags: Dict[Tuple, Tuple[str, str]] = {}
+        self._suppliers: Dict[str, str] = {}
+        self._customers: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        root_open, _ = self._tag("Invoice", **builder.XML_NAMESPACES)
+        self._head = (
+            "<?xml version='1.0' encoding='ISO-8859-1'?>\n" + root_open +
+            self._element("cbc:UBLVersionID", "2.1") +
+            self._element("cbc:CustomizationID", "2.0")
+        )
+        self._tail = "</Invoice>"
+
+    def render(self, invoice: Any, issued_at: datetime) -> bytes:
+        """Genera el XML del comprobante"""
+        builder = self.builder
+        currency = invoice.currency
+        element = self._element
+
+        parts: List[str] = [
+            self._head,
+            element("cbc:ID", f"{invoice.serie}-{invoice.invoice_number}"),
+            element("cbc:IssueDate", issued_at.strftime("%Y-%m-%d")),
+            element("cbc:IssueTime", issued_at.strftime("%H:%M:%S")),
+            element("cbc:InvoiceTypeCode", "01" if invoice.is_factura else "03"),
+            element("cbc:DocumentCurrencyCode", "PEN" if currency == "SOL" else "USD"),
+            self._supplier(invoice.emisor_name),
+            self._customer(invoice.customer_ruc),
+            "<cac:TaxTotal>",
+            element("cbc:TaxAmount", str(builder._tax_total_amount(invoice)), currencyID=currency),
+            "</cac:TaxTotal>"
+        ]
+
+        for idx, product in enumerate(invoice.products, 1):
+            parts.append("<cac:InvoiceLine>")
+            parts.append(element("cbc:ID", str(idx)))
+            parts.append(element("cbc:InvoicedQuantity", str(product.quantity), unitCode=product.unit_measure))
+            parts.append("<cac:Price>")
+            parts.append(element("cbc:PriceAmount", str(product.unit_value), currencyID=currency))
+            parts.append("</cac:Price><cac:TaxTotal>")
+            parts.append(element("cbc:TaxAmount", str(builder._line_tax_amount(product)), currencyID=currency))
+            parts.append("</cac:TaxTotal><cac:Item>")
+            parts.append(element("cbc:Description", product.description))
+            parts.append("</cac:Item></cac:InvoiceLine>")
+
+        parts.append(self._tail)
+        return "".join(parts).encode("iso-8859-1", "xmlcharrefreplace")
+
+    def _tag(self, tag: str, **attrib: str) -> Tuple[str, str]:
+        """Etiquetas de apertura y cierre serializadas por ElementTree"""
+        key = (tag, *attrib.items())
+        tags = self._tags.get(key)
+        if tags is None:
+            element = ET.Element(tag, attrib)
+            element.text = _SENTINEL
+            open_tag, close_tag = ET.tostring(element, encoding="unicode").split(_SENTINEL)
+            tags = self._tags[key] = (open_tag, close_tag)
+        return tags
+
+    def _element(self, tag: str, text: Any, **attrib: str) -> str:
+        open_tag, close_tag = self._tag(tag, **attrib)
+        if not text:
+            # ElementTree usa la forma corta para elementos sin texto
+            return open_tag[:-1] + " />"
+        return open_tag + escape(text) + close_tag
+
+    def _supplier(self, emisor_name: str) -> str:
+        fragment = self._suppliers.get(emisor_name)
+        if fragment is None:
+            fragment = self._suppliers[emisor_name] = (
+                "<cac:AccountingSupplierParty><cac:Party><cac:PartyIdentification>" +
+                self._element("cbc:ID", self.ruc, schemeID="6") +
+                "</cac:PartyIdentification><cac:PartyName>" +
+                self._element("cbc:Name", emisor_name) +
+                "</cac:PartyName></cac:Party></cac:AccountingSupplierParty>"
+            )
+        return fragment
+
+    def _customer(self, customer_ruc: str) -> str:
+        with self._lock:
+            fragment = self._customers.get(customer_ruc)
+            if fragment is not None:
+                self._customers.move_to_end(customer_ruc)
+                return fragment
+
+        doc_type = identity_document_type(customer_ruc)
+        fragment = (
+            "<cac:AccountingCustomerParty><cac:Party><cac:PartyIdentification>" +
+            self._element("cbc:ID", customer_ruc, schemeID=doc_type) +
+            "</cac:PartyIdentification></cac:Party></cac:AccountingCustomerParty>"
+        )
+
+        with self._lock:
+            self._customers[customer_ruc] = fragment
+            if len(self._customers) > self.max_customers:
+                self._customers.popitem(last=False)
+        return fragment
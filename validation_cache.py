@@ -0,0 +1,150 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser('~'), '.sunat_automation', 'validation_cache.json')
+
+HOUR = 3600
+DAY = 24 * HOUR
+
+
+class ValidationCache:
+    """
+    Caché persistente de resultados de validarcomprobante.
+
+    La clave es (tipo, serie, numero, fecha, monto). Cada resultado vive
+    según su estadoCp: un comprobante aceptado o anulado no vuelve a cambiar,
+    mientras que "no existe" caduca pronto porque puede estar en camino.
+    """
+
+    # Segundos de vida por estadoCp
+    DEFAULT_TTLS = {
+        "0": 10 * 60,   # NO EXISTE
+        "1": 30 * DAY,  # ACEPTADO
+        "2": 30 * DAY,  # ANULADO
+        "3": 30 * DAY,  # AUTORIZADO
+        "4": DAY        # NO AUTORIZADO
+    }
+    DEFAULT_TTL = HOUR
+
+    def __init__(self, path: Optional[str] = DEFAULT_CACHE_PATH, max_entries: int = 50000,
+                 ttls: Optional[Dict[str, float]] = None, autosave_every: int = 100):
+        """
+        Inicializa la caché
+
+        Args:
+            path: Archivo JSON de persistencia (None para solo memoria)
+            max_entries: Entradas máximas; se descartan las menos usadas
+            ttls: Vida en segundos por estadoCp (sobrescribe DEFAULT_TTLS)
+            autosave_every: Guardar en disco cada N resultados nuevos
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.ttls = dict(self.DEFAULT_TTLS, **(ttls or {}))
+        self.autosave_every = autosave_every
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evicted = 0
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._unsaved = 0
+        self._load()
+
+    @staticmethod
+    def make_key(tipo: str, serie: str, numero: str, fecha: str, monto: float) -> str:
+        """Clave normalizada del comprobante"""
+        return "|".join([str(tipo), str(serie), str(numero), str(fecha), f"{float(monto):.2f}"])
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Devuelve el resultado en caché si sigue vigente"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry["expires_at"] <= time.time():
+                del self._entries[key]
+                self.expired += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(entry["result"])
+
+    def put(self, key: str, result: Dict[str, Any]) -> None:
+        """Guarda un resultado exitoso con la vida que corresponde a su estado"""
+        if not result.get("success"):
+            return
+
+        ttl = self.ttls.get(str(result.get("estado_cp")), self.DEFAULT_TTL)
+        with self._lock:
+            self._entries[key] = {"result": dict(result), "expires_at": time.time() + ttl}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evicted += 1
+            self._unsaved += 1
+            save = self.path and self._unsaved >= self.autosave_every
+
+        if save:
+            self.save()
+
+    def invalidate(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        """Contadores de aciertos y fallos"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "expired": self.expired,
+                "evicted": self.evicted,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+    def save(self) -> None:
+        """Escribe la caché en disco (atómicamente) omitiendo entradas caducadas"""
+        if not self.path:
+            return
+
+        now = time.time()
+        with self._lock:
+            entries = [[key, entry] for key, entry in self._entries.items() if entry["expires_at"] > now]
+            self._unsaved = 0
+
+        try:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(entries, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"No se pudo guardar la caché de validación: {str(e)}")
+
+    def _load(self) -> None:
+        if not self.path or not os.path.exists(self.path):
+            return
+
+        try:
+            with open(self.path, 'r') as f:
+                entries = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Caché de validación ilegible, se ignora: {str(e)}")
+            return
+
+        now = time.time()
+        for key, entry in entries[-self.max_entries:]:
+            if entry.get("expires_at", 0) > now:
+                self._entries[key] = entry
+        logger.info(f"Caché de validación cargada: {len(self._entries)} entradas")
@@ -0,0 +1,146 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.sunat_automation', 'workbooks')
+
+
+class WorkbookCache:
+    """
+    Caché en disco de libros Excel ya leídos.
+
+    La clave combina el hash del contenido del archivo con los parámetros
+    de lectura (productos por factura, tasa de IGV, versión del formato),
+    así que un libro modificado o una configuración distinta vuelven a
+    leerse sin intervención. Cada entrada es un .npz sin comprimir con las
+    columnas de un InvoiceBatch: cargarla es copiar arrays, sin volver a
+    interpretar el xlsx. El tamaño total se limita descartando las entradas
+    usadas hace más tiempo (la fecha de modificación se renueva en cada
+    acierto).
+    """
+
+    SUFFIX = ".npz"
+
+    def __init__(self, directory: str = DEFAULT_CACHE_DIR, max_bytes: int = 512 * 1024 * 1024):
+        """
+        Inicializa la caché
+
+        Args:
+            directory: Carpeta de las entradas
+            max_bytes: Tamaño máximo en disco; se descartan las menos usadas
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(file_path: str, settings: Dict[str, Any]) -> str:
+        """Clave de un libro: sha256 del contenido y de los parámetros de lectura"""
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+        digest.update(json.dumps(settings, sort_keys=True).encode())
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, np.ndarray]]:
+        """Columnas guardadas para la clave, o None si no están"""
+        path = self._path(key)
+        try:
+            with np.load(path, allow_pickle=False) as entry:
+                arrays = {name: entry[name] for name in entry.files}
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Entrada de caché ilegible, se descarta: {str(e)}")
+            self._remove(path)
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return arrays
+
+    def put(self, key: str, arrays: Dict[str, np.ndarray]) -> None:
+        """Guarda las columnas de un libro (atómicamente) y aplica el límite de tamaño"""
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(tmp_path, 'wb') as f:
+                np.savez(f, **arrays)
+            if os.path.getsize(tmp_path) > self.max_bytes:
+                logger.info("Libro demasiado grande para la caché, no se guarda")
+                self._remove(tmp_path)
+                return
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"No se pudo guardar el libro en caché: {str(e)}")
+            self._remove(tmp_path)
+            return
+        self._evict()
+
+    def stats(self) -> Dict[str, Any]:
+        """Contadores de aciertos, fallos y descartes"""
+        entries = self._entries()
+        with self._lock:
+            return {
+                "entries": len(entries),
+                "bytes": sum(size for _, size, _ in entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evicted": self.evicted
+            }
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + self.SUFFIX)
+
+    def _entries(self):
+        """(ruta, tamaño, última modificación) de cada entrada"""
+        entries = []
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return entries
+        for name in names:
+            if not name.endswith(self.SUFFIX):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def _evict(self) -> None:
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+            with self._lock:
+                self.evicted += 1
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -3,8 +3,10 @@ from cryptography.x509 import load_pem_x509_certificate
 from cryptography.hazmat.primitives import serialization
 import logging
 import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
-from typing import Optional, Union
+from typing import Iterable, List, Optional, Union
 from lxml import etree
 
 logger = logging.getLogger(__name__)
@@ -13,7 +15,17 @@ class XMLSignerError(Exception):
     """Excepción específica para errores de firma XML"""
     pass
 
+XMLContent = Union[str, bytes, etree._Element]
+
 class SunatXMLSigner:
+    """
+    Firma XML enveloped RSA-SHA256 con el certificado del emisor.
+    
+    El XMLSigner de signxml se configura una vez por hilo y se reutiliza en
+    cada firma. sign_many firma lotes en un pool de procesos que carga el
+    certificado y la llave una sola vez por proceso.
+    """
+    
     def __init__(self, cert_path: str, key_path: str, password: Optional[str] = None):
         """
         Inicializa el firmador XML
@@ -26,6 +38,10 @@ class SunatXMLSigner:
         self.cert_path = cert_path
         self.key_path = key_path
         self.password = password.encode() if password else None
+        self._local = threading.local()
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_workers = 0
+        self._pool_lock = threading.Lock()
         self._load_certificate()
         
     def _load_certificate(self):
@@ -46,7 +62,37 @@ class SunatXMLSigner:
             logger.error(f"Error cargando certificado: {str(e)}")
             raise XMLSignerError(f"Error cargando certificado: {str(e)}")
     
-    def sign_xml(self, xml_content: Union[str, bytes, etree._Element]) -> str:
+    def _signer(self) -> XMLSigner:
+        """XMLSigner configurado (y parser lxml) del hilo actual"""
+        signer = getattr(self._local, "signer", None)
+        if signer is None:
+            signer = XMLSigner(
+                method=methods.enveloped,
+                signature_algorithm="rsa-sha256",
+                digest_algorithm="sha256",
+                c14n_algorithm="http://www.w3.org/2001/10/xml-exc-c14n#"
+            )
+            self._local.parser = etree.XMLParser(resolve_entities=False)
+            self._local.signer = signer
+        return signer
+    
+    def sign_tree(self, root: Union[bytes, etree._Element]) -> etree._Element:
+        """
+        Firma y devuelve el árbol lxml firmado, sin serializar
+        
+        Args:
+            root: Árbol lxml o XML en bytes
+        """
+        try:
+            signer = self._signer()
+            if isinstance(root, bytes):
+                root = etree.fromstring(root, self._local.parser)
+            return signer.sign(root, key=self.private_key, cert=[self.certificate])
+        except Exception as e:
+            logger.error(f"Error firmando XML: {str(e)}")
+            raise XMLSignerError(f"Error firmando XML: {str(e)}")
+    
+    def sign_xml(self, xml_content: XMLContent) -> XMLContent:
         """
         Firma el XML usando el certificado digital
         
@@ -54,40 +100,85 @@ class SunatXMLSigner:
             xml_content: Contenido XML a firmar (str, bytes o ElementTree)
             
         Returns:
-            str: XML firmado
+            XML firmado del mismo tipo que la entrada: bytes UTF-8 con
+            declaración para bytes, str para str y árbol lxml para árboles
         """
-        try:
-            # Convertir el contenido a ElementTree si es necesario
-            if isinstance(xml_content, str):
-                xml_content = etree.fromstring(xml_content.encode())
-            elif isinstance(xml_content, bytes):
-                xml_content = etree.fromstring(xml_content)
-            
-            # Crear el firmador
-            signer = XMLSigner(
-                method=methods.enveloped,
-                signature_algorithm="rsa-sha256",
-                digest_algorithm="sha256",
-                c14n_algorithm="http://www.w3.org/2001/10/xml-exc-c14n#"
-            )
-            
-            # Firmar el XML
-            signed_root = signer.sign(
-                xml_content,
-                key=self.private_key,
-                cert=self.certificate
-            )
-            
-            # Convertir a string
-            signed_xml = etree.tostring(
-                signed_root,
-                encoding='UTF-8',
-                xml_declaration=True
-            ).decode()
+        if isinstance(xml_content, etree._Element):
+            return self.sign_tree(xml_content)
+        data = xml_content.encode() if isinstance(xml_content, str) else xml_content
+        signed_xml = etree.tostring(self.sign_tree(data), encoding='UTF-8', xml_declaration=True)
+        logger.debug("XML firmado exitosamente")
+        return signed_xml.decode() if isinstance(xml_content, str) else signed_xml
+    
+    def sign_many(self, documents: Iterable[XMLContent], workers: int = 1,
+                  chunksize: int = 16) -> List[XMLContent]:
+        """
+        Firma un lote de XML
+        
+        Con workers > 1 los documentos se reparten en grupos de chunksize
+        entre procesos que cargan el certificado y la llave una vez (el pool
+        se conserva entre llamadas hasta close()). Los árboles lxml viajan
+        serializados y se devuelven como árboles.
+        
+        Args:
+            documents: XML a firmar (bytes, str o árboles lxml)
+            workers: Procesos firmantes; 1 firma en este proceso
+            chunksize: Documentos por envío a un proceso
             
-            logger.info("XML firmado exitosamente")
-            return signed_xml
+        Returns:
+            List con cada XML firmado, en el orden y del tipo de la entrada
             
+        Raises:
+            XMLSignerError: Si algún documento no se puede firmar
+        """
+        documents = list(documents)
+        if workers <= 1 or len(documents) <= chunksize:
+            return [self.sign_xml(document) for document in documents]
+        
+        payload = [etree.tostring(document) if isinstance(document, etree._Element)
+                   else document.encode() if isinstance(document, str) else document
+                   for document in documents]
+        chunks = [payload[start:start + chunksize] for start in range(0, len(payload), chunksize)]
+        try:
+            signed = [xml for chunk in self._process_pool(workers).map(_sign_chunk, chunks) for xml in chunk]
+        except XMLSignerError:
+            raise
         except Exception as e:
-            logger.error(f"Error firmando XML: {str(e)}")
-            raise XMLSignerError(f"Error firmando XML: {str(e)}")
\ No newline at end of file
+            logger.error(f"Error en el pool de firma: {str(e)}")
+            raise XMLSignerError(f"Error en el pool de firma: {str(e)}")
+        
+        return [etree.fromstring(xml) if isinstance(document, etree._Element)
+                else xml.decode() if isinstance(document, str) else xml
+                for document, xml in zip(documents, signed)]
+    
+    def _process_pool(self, workers: int) -> ProcessPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None or self._pool_workers != workers:
+                if self._pool is not None:
+                    self._pool.shutdown()
+                self._pool = ProcessPoolExecutor(
+                    max_workers=workers, initializer=_init_worker,
+                    initargs=(self.cert_path, self.key_path, self.password)
+                )
+                self._pool_workers = workers
+            return self._pool
+    
+    def close(self) -> None:
+        """Termina el pool de procesos de sign_many"""
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+
+
+# Firmador de cada proceso del pool de sign_many
+_worker_signer: Optional[SunatXMLSigner] = None
+
+
+def _init_worker(cert_path: str, key_path: str, password: Optional[bytes]) -> None:
+    global _worker_signer
+    _worker_signer = SunatXMLSigner(cert_path, key_path, password.decode() if password else None)
+
+
+def _sign_chunk(documents: List[bytes]) -> List[bytes]:
+    return [_worker_signer.sign_xml(document) for document in documents]
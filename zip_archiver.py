@@ -0,0 +1,75 @@
+import logging
+import os
+import queue
+import threading
+from typing import Union
+
+logger = logging.getLogger(__name__)
+
+
+class ZipArchiver:
+    """
+    Archivo en disco de los ZIP enviados, escrito en segundo plano.
+
+    El envío no espera la escritura: los paquetes se encolan y un hilo los
+    guarda en output_dir. La cola es acotada para no acumular memoria si el
+    disco es más lento que la red.
+    """
+
+    def __init__(self, output_dir: str, max_pending: int = 256):
+        """
+        Inicializa el archivador
+
+        Args:
+            output_dir: Directorio donde se guardan los ZIP
+            max_pending: Paquetes en cola antes de que submit() espere
+        """
+        self.output_dir = output_dir
+        os.makedirs(output_dir, exist_ok=True)
+        self.written = 0
+        self.errors = 0
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_pending)
+        self._thread = threading.Thread(target=self._worker, name="zip-archiver", daemon=True)
+        self._thread.start()
+
+    def submit(self, filename: str, content: Union[bytes, memoryview]) -> None:
+        """
+        Encola un paquete para guardarlo
+
+        Args:
+            filename: Nombre del archivo (sin directorio)
+            content: Contenido del ZIP; no debe modificarse después
+        """
+        self._queue.put((filename, content))
+
+    def flush(self) -> None:
+        """Espera a que se escriban todos los paquetes encolados"""
+        self._queue.join()
+
+    def close(self) -> None:
+        """Escribe lo pendiente y detiene el hilo"""
+        self._queue.put(None)
+        self._thread.join()
+
+    def _worker(self) -> None:
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                self._write(*item)
+            finally:
+                self._queue.task_done()
+
+    def _write(self, filename: str, content: Union[bytes, memoryview]) -> None:
+        path = os.path.join(self.output_dir, filename)
+        # Nombre temporal único para que ejecuciones paralelas no se pisen
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+            self.written += 1
+        except OSError as e:
+            self.errors += 1
+            logger.error(f"Error archivando {filename}: {str(e)}")